@@ -0,0 +1,96 @@
+from functools import lru_cache
+from typing import Any, Callable, List, Optional, Tuple
+
+from pv_registry import PV_REGISTRY
+
+PV_OBJ_SUFFIX = "_pv_obj"
+
+
+class AutoPV:
+    """
+    Declares an automation PV on an AutoLinacObject subclass:
+
+        start_pv_obj = AutoPV("SETUPSTRT")
+        ssa_cal_requested_pv_obj = AutoPV("SETUP_SSAREQ", bool)
+
+    gives the class
+    - start_pv: the PV name, built from the object's AUTO: prefix on access
+    - start_pv_obj: the PV, looked up in PV_REGISTRY on first access and
+      kept in the _start_pv_obj slot (added to __slots__ by AutoPVMeta)
+    - ssa_cal_requested: with a value type, the PV's value converted to it
+      on get, and a put on set
+
+    and registers the PV so it is included in auto_pv_fields(), e.g. for
+    batch connects, snapshots and puts.
+    """
+
+    def __init__(
+        self, suffix: str, value_type: Optional[Callable[[Any], Any]] = None
+    ):
+        self.suffix = suffix
+        self.value_type = value_type
+        self.name: Optional[str] = None
+        self.storage: Optional[str] = None
+
+    def __set_name__(self, owner, name: str):
+        if not name.endswith(PV_OBJ_SUFFIX):
+            raise TypeError(f"AutoPV attribute {name} must end in {PV_OBJ_SUFFIX}")
+        self.name = name
+        self.storage = f"_{name}"
+        stem = name[: -len(PV_OBJ_SUFFIX)]
+        suffix = self.suffix
+
+        setattr(owner, f"{stem}_pv", property(lambda obj: obj.auto_pv_addr(suffix)))
+        if self.value_type is not None:
+            setattr(owner, stem, property(self.get_value, self.set_value))
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        pv = getattr(obj, self.storage)
+        if not pv:
+            pv = PV_REGISTRY.get_pv(obj.auto_pv_addr(self.suffix))
+            setattr(obj, self.storage, pv)
+        return pv
+
+    def __set__(self, obj, pv):
+        setattr(obj, self.storage, pv)
+
+    def get_value(self, obj):
+        return self.value_type(self.__get__(obj).get())
+
+    def set_value(self, obj, value):
+        self.__get__(obj).put(value)
+
+
+class AutoPVMeta(type):
+    """
+    Metaclass adding the storage slot of every AutoPV declared in a class
+    body to its __slots__, so declaring a PV stays one line. Classes without
+    __slots__ keep the storage in their __dict__.
+    """
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        if "__slots__" in namespace:
+            slots = namespace["__slots__"]
+            slots = (slots,) if isinstance(slots, str) else tuple(slots)
+            namespace["__slots__"] = slots + tuple(
+                f"_{attr}"
+                for attr, value in namespace.items()
+                if isinstance(value, AutoPV) and f"_{attr}" not in slots
+            )
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def auto_pv_fields(cls) -> Tuple[str, ...]:
+    """
+    :return: the *_pv_obj attribute names of every AutoPV on the class, base
+             classes first, in declaration order
+    """
+    fields: List[str] = []
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, AutoPV) and name not in fields:
+                fields.append(name)
+    return tuple(fields)
@@ -0,0 +1,87 @@
+"""
+Headless start-up cost of the setup GUI: time to construct SetupGUI and draw
+the first frame, and the number of channels open at that point, with every
+cryomodule tab built up front (the old behaviour) versus built on first
+show. Channels are the PyDM connections plus the PVs in the PV registry,
+which includes the status table's monitors once its subscription (started
+from the event loop on a worker thread) is done; that total is reported
+separately.
+
+Runs each mode in a fresh process with the offscreen Qt platform. CA is
+pointed at an unused local address, so channels are counted but never
+connect. Run from the repository root:
+    python -m benchmarks.gui_startup_benchmark --runs 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import mean
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GUI_ENV = {
+    "QT_QPA_PLATFORM": "offscreen",
+    "EPICS_CA_ADDR_LIST": "127.0.0.1:1",
+    "EPICS_CA_AUTO_ADDR_LIST": "NO",
+}
+
+STARTUP_SNIPPET = """
+import json, time
+start = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+from pydm.data_plugins import plugin_modules
+app = QApplication([])
+from pv_registry import PV_REGISTRY
+from setup_gui import SetupGUI
+gui = SetupGUI()
+if {eager}:
+    for linac in gui.linac_widgets:
+        for index in range(linac.cm_tab_widget.count()):
+            linac.show_cm_tab(index)
+constructed = time.perf_counter()
+gui.show()
+app.processEvents()
+drawn = time.perf_counter()
+def channels():
+    pydm = sum(len(plugin.connections) for plugin in plugin_modules.values())
+    return pydm + len(PV_REGISTRY)
+first_frame_channels = channels()
+while gui.status_subscription is None:
+    app.processEvents()
+gui.status_subscription.result()
+print(json.dumps(dict(
+    construct=constructed - start,
+    first_frame=drawn - start,
+    channels=first_frame_channels,
+    subscribed_channels=channels(),
+)))
+"""
+
+
+def time_startup(eager: bool) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_SNIPPET.format(eager=eager)],
+        cwd=REPO_ROOT,
+        env={**os.environ, **GUI_ENV},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", "-n", type=int, default=3)
+    args = parser.parse_args()
+
+    for eager, label in ((True, "eager"), (False, "lazy")):
+        samples = [time_startup(eager) for _ in range(args.runs)]
+        print(
+            f"{label:>6}: construct mean {mean(s['construct'] for s in samples):.2f} s,"
+            f" first frame mean {mean(s['first_frame'] for s in samples):.2f} s,"
+            f" channels {samples[-1]['channels']}"
+            f" ({samples[-1]['subscribed_channels']} with the status table)"
+        )
@@ -0,0 +1,77 @@
+"""
+Memory held by a fully built SetupMachine (every cryomodule and cavity, as
+the GUI and the setup engine build it), measured with tracemalloc, next to
+the plain lcls_tools Machine it extends. The difference is what the
+automation layer (AUTO: PV names, PV object slots, setup state) costs per
+cavity.
+
+Each measurement runs in a fresh interpreter so that nothing is shared
+between them.
+
+Run from the repository root:
+    python -m benchmarks.memory_benchmark
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE_SNIPPET = """
+import gc
+import tracemalloc
+{imports}
+gc.collect()
+tracemalloc.start()
+machine = {build}
+gc.collect()
+current, _ = tracemalloc.get_traced_memory()
+cavities = sum(len(cm.cavities) for cm in machine.cryomodules.values())
+print(current, cavities)
+"""
+
+MACHINES = {
+    "lcls_tools Machine": (
+        "from lcls_tools.superconducting.sc_linac import Machine",
+        "Machine()",
+    ),
+    "SetupMachine": (
+        "from setup_linac import SetupMachine",
+        "SetupMachine(lazy=False)",
+    ),
+}
+
+
+def measure(imports: str, build: str):
+    """
+    :return: bytes allocated while building the machine and its cavity count
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_SNIPPET.format(imports=imports, build=build)],
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    current, cavities = output.strip().splitlines()[-1].split()
+    return int(current), int(cavities)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.parse_args()
+
+    results = {name: measure(*snippets) for name, snippets in MACHINES.items()}
+    for name, (current, cavities) in results.items():
+        print(
+            f"{name:>20}: {current / 2**20:7.2f} MiB for {cavities} cavities,"
+            f" {current / cavities / 1024:6.1f} KiB per cavity"
+        )
+
+    base, cavities = results["lcls_tools Machine"]
+    setup, _ = results["SetupMachine"]
+    print(
+        f"{'automation overhead':>20}: {(setup - base) / 2**20:7.2f} MiB,"
+        f" {(setup - base) / cavities / 1024:6.1f} KiB per cavity"
+    )
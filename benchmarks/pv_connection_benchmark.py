@@ -0,0 +1,82 @@
+"""
+Connection latency for a cryomodule's worth of AUTO: PVs against a local
+caproto soft IOC: one PV at a time (the old lazy-property behaviour) versus a
+single PVRegistry batch.
+
+Run from the repository root:
+    python -m benchmarks.pv_connection_benchmark --read_latency 0.005
+"""
+import argparse
+from time import perf_counter
+from typing import List
+
+from benchmarks.sim_ioc import SimulatedIOC
+
+AUTO_SUFFIXES = [
+    "ABORT",
+    "OFFSTOP",
+    "OFFSTRT",
+    "SETUPSTRT",
+    "SETUPSTOP",
+    "SETUP_SSAREQ",
+    "SETUP_TUNEREQ",
+    "SETUP_CHARREQ",
+    "SETUP_RAMPREQ",
+    "PROG",
+    "STATUS",
+    "MSG",
+    "NOTE",
+]
+
+
+def auto_pv_names(cm_name: str) -> List[str]:
+    from setup_linac import SETUP_MACHINE
+
+    return [
+        cavity.auto_pv_addr(suffix)
+        for cavity in SETUP_MACHINE.cryomodules[cm_name].cavities.values()
+        for suffix in AUTO_SUFFIXES
+    ]
+
+
+def serial(pvnames: List[str]) -> float:
+    from lcls_tools.common.controls.pyepics.utils import PV
+
+    start = perf_counter()
+    for pvname in pvnames:
+        PV(pvname).get()
+    return perf_counter() - start
+
+
+def batched(pvnames: List[str]) -> float:
+    from pv_registry import PVRegistry
+
+    start = perf_counter()
+    PVRegistry().get_many(pvnames)
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serial_cryomodule", default="02")
+    parser.add_argument("--batched_cryomodule", default="03")
+    parser.add_argument("--read_latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    serial_pvs = auto_pv_names(args.serial_cryomodule)
+    batched_pvs = auto_pv_names(args.batched_cryomodule)
+
+    with SimulatedIOC(
+        {pvname: 0.0 for pvname in serial_pvs + batched_pvs},
+        read_latency=args.read_latency,
+    ):
+        # Separate channel names for each mode since pyepics caches channels
+        for label, func, pvnames in (
+            ("serial", serial, serial_pvs),
+            ("batched", batched, batched_pvs),
+        ):
+            elapsed = func(pvnames)
+            print(
+                f"{label:>8}: {len(pvnames)} PVs connected and read in"
+                f" {elapsed * 1000:.1f} ms ({elapsed / len(pvnames) * 1000:.2f} ms/PV)"
+            )
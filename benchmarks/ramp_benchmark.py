@@ -0,0 +1,135 @@
+"""
+Time to ramp N cavities to ACON and the peak summed ramp rate (MV/s) for:
+
+- serial: one walk_amp after another, the old cavity by cavity behaviour
+- threads: every cavity running its own walk_amp at once, nothing limits the
+  summed rate
+- engine: one RampEngine stepping all cavities in lockstep under --max_rate
+  and --max_active
+
+Runs against in-process simulated hardware (see benchmarks.sim_hardware),
+tick lengths are scaled by --time_scale and rates are reported in nominal
+(unscaled) MV/s.
+
+Run from the repository root:
+    python -m benchmarks.ramp_benchmark --cavities 37 --max_rate 20
+"""
+import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter, sleep
+from typing import Dict, List
+
+from benchmarks.setup_benchmark import install_cavities
+from benchmarks.sim_hardware import SimulatedHardware
+from ramp_engine import DEFAULT_STEP_SIZE, DEFAULT_TICK, RampEngine
+from setup_linac import SetupCavity, SetupMachine
+
+
+class RateRecorder:
+    """
+    Sums the ADES change of every put into windows of ten nominal ticks
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.start = perf_counter()
+        self.changes: Dict[int, float] = defaultdict(float)
+        self._last: Dict[str, float] = {}
+        self._lock = Lock()
+
+    def watch(self, cavity: SetupCavity):
+        self._last[cavity.ades_pv_obj.pvname] = cavity.ades_pv_obj.get()
+        cavity.ades_pv_obj.add_callback(self.on_put)
+
+    def on_put(self, pvname: str = None, value: float = None, **kwargs):
+        with self._lock:
+            bucket = int((perf_counter() - self.start) / self.window)
+            self.changes[bucket] += abs(value - self._last[pvname])
+            self._last[pvname] = value
+
+    @property
+    def peak_rate(self) -> float:
+        return max(self.changes.values(), default=0.0) / self.window
+
+
+def walk_amp(cavity: SetupCavity, target: float, tick: float):
+    """
+    Same loop as Cavity.walk_amp
+    """
+    while cavity.ades_pv_obj.get() <= target - DEFAULT_STEP_SIZE:
+        cavity.check_abort()
+        cavity.ades_pv_obj.put(cavity.ades_pv_obj.get() + DEFAULT_STEP_SIZE)
+        sleep(tick)
+    if cavity.ades_pv_obj.get() != target:
+        cavity.ades_pv_obj.put(target)
+
+
+def run_serial(cavities: List[SetupCavity], target: float, tick: float, args):
+    for cavity in cavities:
+        walk_amp(cavity, target, tick)
+
+
+def run_threads(cavities: List[SetupCavity], target: float, tick: float, args):
+    with ThreadPoolExecutor(max_workers=len(cavities)) as executor:
+        list(executor.map(lambda cavity: walk_amp(cavity, target, tick), cavities))
+
+
+def run_engine(cavities: List[SetupCavity], target: float, tick: float, args):
+    engine = RampEngine(
+        max_rate=args.max_rate / args.time_scale if args.max_rate else None,
+        max_active=args.max_active,
+        tick=tick,
+    )
+    errors = engine.ramp_all({cavity: target for cavity in cavities})
+    failed = [cavity for cavity, error in errors.items() if error]
+    if failed:
+        print(f"  {len(failed)} ramps failed")
+
+
+MODES = {"serial": run_serial, "threads": run_threads, "engine": run_engine}
+
+
+def benchmark(mode: str, args):
+    hardware = SimulatedHardware(
+        get_latency=args.get_latency,
+        put_latency=args.put_latency,
+        time_scale=args.time_scale,
+    )
+    _, cavities = install_cavities(
+        SetupMachine(), hardware, args.cavities, requests=True
+    )
+    tick = DEFAULT_TICK * args.time_scale
+    recorder = RateRecorder(window=10 * tick)
+    for cavity in cavities:
+        cavity.ades_pv_obj.value = args.start
+        recorder.watch(cavity)
+
+    start = perf_counter()
+    MODES[mode](cavities, args.target, tick, args)
+    duration = (perf_counter() - start) / args.time_scale
+
+    print(
+        f"{mode:>8}: {duration:8.1f} s nominal for {len(cavities)} cavities"
+        f" {args.start} -> {args.target} MV, peak"
+        f" {recorder.peak_rate * args.time_scale:6.1f} MV/s,"
+        f" {hardware.counters.puts} ADES puts"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cavities", type=int, default=37)
+    parser.add_argument("--modes", nargs="+", choices=MODES.keys(), default=MODES)
+    parser.add_argument("--start", type=float, default=5.0)
+    parser.add_argument("--target", type=float, default=16.0)
+    parser.add_argument("--max_rate", type=float, default=None, help="MV/s")
+    parser.add_argument("--max_active", type=int, default=None)
+    parser.add_argument("--get_latency", type=float, default=0.001)
+    parser.add_argument("--put_latency", type=float, default=0.002)
+    parser.add_argument("--time_scale", type=float, default=0.05)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        benchmark(mode, args)
@@ -0,0 +1,99 @@
+"""
+Latency and Channel Access traffic of the SELA wait in the ramp stage: the old
+0.5 s polling loop versus the monitor-driven PVCondition, against a local
+caproto soft IOC whose RF mode switches to SELA after a random delay.
+
+Run from the repository root:
+    python -m benchmarks.sela_wait_benchmark --runs 10
+"""
+import argparse
+import random
+from statistics import mean
+from threading import Timer
+from time import perf_counter, sleep
+from typing import Tuple
+
+from benchmarks.sim_ioc import SimulatedIOC
+
+RF_MODE_SELA = 4
+RF_MODE_SELAP = 0
+POLL_PERIOD = 0.5
+
+RF_MODE_PV = "SIM:L0B:0110:RFMODE"
+ABORT_PV = "SIM:L0B:0110:AUTO:ABORT"
+MSG_PV = "SIM:L0B:0110:AUTO:MSG"
+
+
+def polling_wait(rf_mode_pv, abort_pv, msg_pv) -> int:
+    """
+    Mirrors the old loop: re-read the RF mode, re-check abort and re-put the
+    status message every pass
+    :return: number of CA requests made
+    """
+    requests = 0
+    while True:
+        requests += 1
+        if rf_mode_pv.get(use_monitor=False) == RF_MODE_SELA:
+            return requests
+        requests += 2
+        abort_pv.get(use_monitor=False)
+        msg_pv.put("Waiting for cavity to be in SELA", wait=True)
+        sleep(POLL_PERIOD)
+
+
+def monitor_wait(rf_mode_pv, abort_pv, msg_pv) -> int:
+    from pv_wait import AbortToken, PVCondition
+
+    PVCondition(
+        rf_mode_pv,
+        lambda rf_mode: rf_mode == RF_MODE_SELA,
+        abort_token=AbortToken(abort_pv),
+    ).wait(timeout=30)
+    # Initial get of both PVs (from the monitor cache) and no message re-puts
+    return 0
+
+
+def run_once(wait, pvs, delay: float) -> Tuple[float, int]:
+    rf_mode_pv, abort_pv, msg_pv = pvs
+    rf_mode_pv.put(RF_MODE_SELAP, wait=True)
+    # Let the monitor for the reset value arrive before timing
+    sleep(0.1)
+
+    switched_at = []
+
+    def switch():
+        switched_at.append(perf_counter())
+        rf_mode_pv.put(RF_MODE_SELA)
+
+    Timer(delay, switch).start()
+    requests = wait(rf_mode_pv, abort_pv, msg_pv)
+    return perf_counter() - switched_at[0], requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", "-n", type=int, default=10)
+    parser.add_argument("--max_delay", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with SimulatedIOC({RF_MODE_PV: RF_MODE_SELAP, ABORT_PV: 0, MSG_PV: ""}):
+        from epics import PV
+
+        pvs = (PV(RF_MODE_PV), PV(ABORT_PV), PV(MSG_PV))
+        for pv in pvs:
+            pv.wait_for_connection(timeout=5)
+
+        for label, wait in (("polling", polling_wait), ("monitor", monitor_wait)):
+            rng = random.Random(args.seed)
+            samples = [
+                run_once(wait, pvs, rng.uniform(0.05, args.max_delay))
+                for _ in range(args.runs)
+            ]
+            latencies = [sample[0] for sample in samples]
+            print(
+                f"{label:>8}: detection latency mean {mean(latencies) * 1000:.1f} ms,"
+                f" max {max(latencies) * 1000:.1f} ms,"
+                f" CA requests in wait loop mean"
+                f" {mean(sample[1] for sample in samples):.1f}"
+            )
@@ -0,0 +1,139 @@
+"""
+Throughput of the full cavity setup sequence against simulated hardware (see
+benchmarks.sim_hardware): setups per minute, per-stage latency distribution
+and CA round-trips for 1, 8, 37 and 296 cavities.
+
+The engine mode runs the cavities through SetupEngine in this process; the
+daemon mode puts each cavity's SETUPSTRT like the launchers do and lets a
+SetupDaemon serve the requests. Routine durations are scaled by --time_scale
+while CA latencies are not.
+
+Run from the repository root:
+    python -m benchmarks.setup_benchmark --sizes 1 8 37 296 --fault_rate 0.01
+"""
+import argparse
+from collections import defaultdict
+from statistics import median, quantiles
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+from benchmarks.sim_hardware import SimulatedHardware
+from setup_engine import SetupEngine
+from setup_linac import STATUS_ERROR_VALUE, SetupCavity, SetupMachine
+from srf_setup_daemon import SetupDaemon
+
+DEFAULT_SIZES = [1, 8, 37, 296]
+
+
+def install_cavities(
+    machine: SetupMachine, hardware: SimulatedHardware, count: int, requests: bool
+) -> Tuple[List[str], List[SetupCavity]]:
+    """
+    :return: names of the cryomodules used and the first count cavities
+    """
+    cm_names: List[str] = []
+    cavities: List[SetupCavity] = []
+    for cm_name, cryomodule in machine.cryomodules.items():
+        if len(cavities) >= count:
+            break
+        cm_names.append(cm_name)
+        for cavity in cryomodule.cavities.values():
+            hardware.install(cavity, requests=requests)
+            if len(cavities) < count:
+                cavities.append(cavity)
+    return cm_names, cavities
+
+
+def run_engine(machine, cavities: List[SetupCavity], cm_names: List[str], args):
+    SetupEngine(max_workers=args.workers, max_per_cryomodule=args.max_per_cm).run(
+        cavities
+    )
+
+
+def run_daemon(machine, cavities: List[SetupCavity], cm_names: List[str], args):
+    daemon = SetupDaemon(
+        cm_names=cm_names,
+        max_workers=args.workers,
+        max_per_cryomodule=args.max_per_cm,
+        machine=machine,
+    )
+    daemon.start()
+    for cavity in cavities:
+        cavity.start_pv_obj.put(1)
+    daemon.wait_idle()
+    daemon.stop()
+
+
+MODES = {"engine": run_engine, "daemon": run_daemon}
+
+
+def stage_latencies(cavities: List[SetupCavity]) -> Dict[str, List[float]]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    for cavity in cavities:
+        if cavity.stage_timer is None:
+            continue
+        for stage in cavity.stage_timer.stages:
+            latencies[stage.name].append(stage.duration)
+    return latencies
+
+
+def describe(samples: List[float]) -> str:
+    # Inclusive, so the p95 of a few samples stays within their range
+    p95 = samples[0]
+    if len(samples) > 1:
+        p95 = quantiles(samples, n=20, method="inclusive")[-1]
+    return (
+        f"p50 {median(samples) * 1000:8.1f} ms  p95 {p95 * 1000:8.1f} ms"
+        f"  max {max(samples) * 1000:8.1f} ms"
+    )
+
+
+def benchmark(count: int, args):
+    hardware = SimulatedHardware(
+        get_latency=args.get_latency,
+        put_latency=args.put_latency,
+        time_scale=args.time_scale,
+        fault_rate=args.fault_rate,
+        seed=args.seed,
+    )
+    machine = SetupMachine()
+    cm_names, cavities = install_cavities(
+        machine, hardware, count, requests=not args.no_requests
+    )
+
+    start = perf_counter()
+    MODES[args.mode](machine, cavities, cm_names, args)
+    duration = perf_counter() - start
+
+    failed = sum(cavity.status == STATUS_ERROR_VALUE for cavity in cavities)
+    print(
+        f"\n{len(cavities)} cavities ({args.mode}): {duration:.2f} s,"
+        f" {len(cavities) / duration * 60:.1f} setups/min, {failed} failed,"
+        f" {hardware.counters.round_trips} CA round-trips"
+        f" ({hardware.counters.round_trips / len(cavities):.0f} per cavity,"
+        f" {hardware.counters.cached_gets} monitor cache reads)"
+    )
+    for stage, samples in stage_latencies(cavities).items():
+        print(f"  {stage:>16}: {describe(samples)}  (n={len(samples)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--mode", choices=MODES.keys(), default="engine")
+    parser.add_argument("--workers", "-w", type=int, default=64)
+    parser.add_argument("--max_per_cm", type=int, default=None)
+    parser.add_argument("--get_latency", type=float, default=0.001)
+    parser.add_argument("--put_latency", type=float, default=0.002)
+    parser.add_argument("--time_scale", type=float, default=0.01)
+    parser.add_argument("--fault_rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no_requests",
+        action="store_true",
+        help="Skip SSA cal, tuning, characterization and ramp",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        benchmark(size, args)
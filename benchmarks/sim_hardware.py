@@ -0,0 +1,207 @@
+"""
+In-process stand-in for the cavity hardware: fake PVs with configurable CA
+latencies and simulated lcls_tools hardware routines (SSA, tuner, piezo,
+characterization, ramp) with configurable durations and fault rates.
+
+SimulatedHardware.install swaps a SetupCavity's PV objects and hardware
+routines for simulated ones, the setup sequence itself runs unmodified.
+"""
+import dataclasses
+import random
+from threading import Lock, Timer
+from time import sleep
+from typing import Any, Callable, Dict, Optional, Type
+
+from lcls_tools.superconducting import sc_linac_utils
+
+import stage_timer
+from pv_backends import InMemoryPV
+from setup_linac import STATUS_READY_VALUE, SetupCavity
+
+
+@dataclasses.dataclass
+class CACounters:
+    gets: int = 0
+    cached_gets: int = 0
+    puts: int = 0
+
+    @property
+    def round_trips(self) -> int:
+        return self.gets + self.puts
+
+
+class FakePV(InMemoryPV):
+    """
+    In-memory PV with CA costs: monitored gets are served from the cached
+    value, uncached gets and puts sleep for the configured latency and count
+    as one CA round-trip (on a background thread for puts without wait)
+    """
+
+    def __init__(self, pvname: str, value: Any, hardware: "SimulatedHardware"):
+        super().__init__(pvname, value)
+        self.hardware = hardware
+
+    def get(self, use_monitor: bool = True, as_string: bool = False, **kwargs):
+        if use_monitor:
+            self.hardware.count("cached_gets")
+        else:
+            self.hardware.round_trip(self.pvname, "get", self.hardware.get_latency)
+        return super().get(as_string=as_string)
+
+    def put(self, value, wait: bool = True, callback: Callable = None, **kwargs):
+        if not wait:
+            # Like CA, the put goes out and completes in the background
+            Timer(0, self.put, args=(value,), kwargs={"callback": callback}).start()
+            return 1
+        self.hardware.round_trip(self.pvname, "put", self.hardware.put_latency)
+        return super().put(value, wait=wait, callback=callback)
+
+
+@dataclasses.dataclass
+class Operation:
+    """
+    A simulated hardware routine
+    :param duration: nominal duration in seconds on the real machine
+    :param round_trips: CA round-trips the real routine makes
+    :param error: raised with probability fault_rate
+    """
+
+    duration: float
+    round_trips: int
+    error: Optional[Type[Exception]] = None
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "turn_off": Operation(1, 2),
+    "ssa_on": Operation(10, 4, sc_linac_utils.SSAFaultError),
+    "reset_interlocks": Operation(3, 3),
+    "ssa_cal": Operation(60, 20, sc_linac_utils.SSACalibrationError),
+    "tune": Operation(60, 40, sc_linac_utils.DetuneError),
+    "characterize": Operation(30, 10, sc_linac_utils.CavityQLoadedCalibrationError),
+    "piezo_feedback": Operation(1, 2),
+    "turn_on": Operation(2, 2),
+    "set_sela": Operation(5, 2),
+    "walk_amp": Operation(30, 30, sc_linac_utils.QuenchError),
+    "center_piezo": Operation(20, 20, sc_linac_utils.DetuneError),
+    "set_selap": Operation(1, 2),
+}
+
+
+class SimulatedHardware:
+    """
+    :param time_scale: factor applied to the nominal routine durations, e.g.
+                       0.01 runs a ~4 minute setup in ~2.4 s
+    :param fault_rate: probability that a routine that can fail does
+    """
+
+    def __init__(
+        self,
+        get_latency: float = 0.001,
+        put_latency: float = 0.002,
+        time_scale: float = 0.01,
+        fault_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.get_latency = get_latency
+        self.put_latency = put_latency
+        self.time_scale = time_scale
+        self.fault_rate = fault_rate
+        self.counters = CACounters()
+
+        self._pvs: Dict[str, FakePV] = {}
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def get_pv(self, pvname: str, value: Any = 0) -> FakePV:
+        with self._lock:
+            if pvname not in self._pvs:
+                self._pvs[pvname] = FakePV(pvname, value, self)
+            return self._pvs[pvname]
+
+    def count(self, counter: str):
+        with self._lock:
+            setattr(self.counters, counter, getattr(self.counters, counter) + 1)
+
+    def round_trip(self, pvname: str, operation: str, latency: float):
+        sleep(latency)
+        self.count(operation + "s")
+        stage_timer.record_round_trip(pvname, operation, latency)
+
+    def faulted(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.fault_rate
+
+    def operation(self, cavity: SetupCavity, name: str) -> Callable:
+        op = OPERATIONS[name]
+        pv = self.get_pv(cavity.pv_addr(f"SIM:{name.upper()}"))
+
+        def run(*args, **kwargs):
+            for _ in range(op.round_trips):
+                pv.put(1)
+            sleep(op.duration * self.time_scale)
+            if op.error and self.faulted():
+                raise op.error(f"Simulated {name} fault on {cavity}")
+
+        return run
+
+    def install(
+        self,
+        cavity: SetupCavity,
+        acon: float = 16.0,
+        requests: bool = True,
+        sela_delay: float = 5.0,
+    ):
+        """
+        Points every PV object of the cavity (and its SSA, piezo and stepper)
+        at fake PVs and replaces the hardware routines with simulated ones
+        :param requests: value of the SSA cal/tune/characterize/ramp requests
+        :param sela_delay: nominal seconds for the RF mode to report SELA
+        """
+        for obj in (cavity, cavity.ssa, cavity.piezo, cavity.stepper_tuner):
+            # dir() rather than vars() to also catch the AUTO: PV names, which
+            # are class level properties backed by slots
+            for attr in dir(obj):
+                if attr.endswith("_pv") and hasattr(obj, f"_{attr}_obj"):
+                    value = getattr(obj, attr)
+                    if isinstance(value, str):
+                        setattr(obj, f"_{attr}_obj", self.get_pv(value))
+        cavity._timing_pv_objs = {
+            stage: self.get_pv(pvname) for stage, pvname in cavity.timing_pvs.items()
+        }
+        cavity._abort_token = None
+
+        cavity.hw_mode_pv_obj.value = sc_linac_utils.HW_MODE_ONLINE_VALUE
+        cavity.rf_mode_pv_obj.value = sc_linac_utils.RF_MODE_SELAP
+        cavity.status_pv_obj.value = STATUS_READY_VALUE
+        cavity.acon_pv_obj.value = acon
+        cavity.ades_pv_obj.value = acon
+        for pv in cavity.setup_option_pv_objs:
+            pv.value = requests
+
+        cavity.turn_off = self.operation(cavity, "turn_off")
+        cavity.ssa.turn_on = self.operation(cavity, "ssa_on")
+        cavity.reset_interlocks = self.operation(cavity, "reset_interlocks")
+        cavity.ssa.calibrate = self.operation(cavity, "ssa_cal")
+        cavity.characterize = self.operation(cavity, "characterize")
+        cavity.piezo.enable_feedback = self.operation(cavity, "piezo_feedback")
+        cavity.turn_on = self.operation(cavity, "turn_on")
+        cavity.walk_amp = self.operation(cavity, "walk_amp")
+        cavity.set_selap_mode = self.operation(cavity, "set_selap")
+
+        tune = self.operation(cavity, "tune")
+        center_piezo = self.operation(cavity, "center_piezo")
+        cavity.move_to_resonance = lambda use_sela=False: (
+            center_piezo() if use_sela else tune()
+        )
+
+        set_sela = self.operation(cavity, "set_sela")
+
+        def set_sela_mode():
+            set_sela()
+            Timer(
+                sela_delay * self.time_scale,
+                cavity.rf_mode_pv_obj.put,
+                args=(sc_linac_utils.RF_MODE_SELA,),
+            ).start()
+
+        cavity.set_sela_mode = set_sela_mode
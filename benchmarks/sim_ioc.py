@@ -0,0 +1,101 @@
+"""
+Local caproto soft IOC used as a stand-in for the real AUTO: PVs. Each PV can
+be given an artificial read and write latency. bytes values are served as
+char waveforms, like the AUTO:MSG PVs.
+"""
+import asyncio
+import multiprocessing
+import os
+from typing import Any, Dict
+
+CA_ENV = {
+    "EPICS_CA_ADDR_LIST": "127.0.0.1",
+    "EPICS_CA_AUTO_ADDR_LIST": "NO",
+    "EPICS_CAS_INTF_ADDR_LIST": "127.0.0.1",
+}
+
+
+def _make_pvdb(pv_values: Dict[str, Any], read_latency: float, write_latency: float):
+    from caproto import ChannelChar, ChannelDouble, ChannelString
+
+    class LatencyMixin:
+        async def read(self, data_type):
+            await asyncio.sleep(read_latency)
+            return await super().read(data_type)
+
+        async def verify_value(self, data):
+            await asyncio.sleep(write_latency)
+            return await super().verify_value(data)
+
+    class LatencyDouble(LatencyMixin, ChannelDouble):
+        pass
+
+    class LatencyString(LatencyMixin, ChannelString):
+        pass
+
+    class LatencyChar(LatencyMixin, ChannelChar):
+        pass
+
+    def make_channel(value: Any):
+        if isinstance(value, bytes):
+            return LatencyChar(value=value.decode("latin-1"), max_length=256)
+        if isinstance(value, str):
+            return LatencyString(value=value)
+        return LatencyDouble(value=value)
+
+    return {pvname: make_channel(value) for pvname, value in pv_values.items()}
+
+
+def _serve(pv_values, read_latency, write_latency, ready):
+    from caproto.asyncio.server import run
+
+    os.environ.update(CA_ENV)
+
+    async def startup_hook(async_lib):
+        ready.set()
+
+    run(
+        _make_pvdb(pv_values, read_latency, write_latency),
+        interfaces=["127.0.0.1"],
+        startup_hook=startup_hook,
+    )
+
+
+class SimulatedIOC:
+    """
+    Context manager that serves pv_values from a child process and points
+    this process' Channel Access client at it. Enter it before pyepics makes
+    its first CA call, since libca only reads the environment once.
+    """
+
+    def __init__(
+        self,
+        pv_values: Dict[str, Any],
+        read_latency: float = 0.0,
+        write_latency: float = 0.0,
+        startup_timeout: float = 10.0,
+    ):
+        self.pv_values = pv_values
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.startup_timeout = startup_timeout
+        self._process = None
+
+    def __enter__(self):
+        os.environ.update(CA_ENV)
+        ctx = multiprocessing.get_context("spawn")
+        ready = ctx.Event()
+        self._process = ctx.Process(
+            target=_serve,
+            args=(self.pv_values, self.read_latency, self.write_latency, ready),
+            daemon=True,
+        )
+        self._process.start()
+        if not ready.wait(self.startup_timeout):
+            self._process.terminate()
+            raise RuntimeError("Simulated IOC did not start")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,85 @@
+"""
+Time to read the automation state (status, progress, message and the four
+setup requests) of every cavity in a linac against a local caproto soft IOC:
+property by property on each SetupCavity versus one SetupMachine.snapshot.
+
+Run from the repository root:
+    python -m benchmarks.snapshot_benchmark --read_latency 0.005
+"""
+import argparse
+from time import perf_counter
+from typing import Dict, List
+
+from benchmarks.sim_ioc import SimulatedIOC
+
+SERIAL_PROPERTIES = [
+    "status",
+    "progress",
+    "status_message",
+    "ssa_cal_requested",
+    "auto_tune_requested",
+    "cav_char_requested",
+    "rf_ramp_requested",
+]
+
+
+def linac_cavities(machine, linac: int) -> List:
+    return [
+        cavity
+        for cm in machine.linacs[linac].cryomodules.values()
+        for cavity in cm.cavities.values()
+    ]
+
+
+def pv_values(machine, linacs: List[int]) -> Dict[str, object]:
+    from setup_linac import SNAPSHOT_PVS
+
+    values: Dict[str, object] = {}
+    for linac in linacs:
+        for cavity in linac_cavities(machine, linac):
+            for field, attr in SNAPSHOT_PVS.items():
+                # status_pv_obj -> status_pv, the PV name
+                pvname = getattr(cavity, attr[: -len("_obj")])
+                values[pvname] = b"Ready" if field == "status_message" else 0.0
+    return values
+
+
+def serial(machine, linac: int) -> float:
+    start = perf_counter()
+    for cavity in linac_cavities(machine, linac):
+        for prop in SERIAL_PROPERTIES:
+            getattr(cavity, prop)
+    return perf_counter() - start
+
+
+def snapshot(machine, linac: int) -> float:
+    start = perf_counter()
+    machine.snapshot(linac=linac)
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serial_linac", type=int, default=2)
+    parser.add_argument("--snapshot_linac", type=int, default=3)
+    parser.add_argument("--read_latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from setup_linac import SetupMachine
+
+    machine = SetupMachine()
+    with SimulatedIOC(
+        pv_values(machine, [args.serial_linac, args.snapshot_linac]),
+        read_latency=args.read_latency,
+    ):
+        # Separate linacs for each mode since pyepics caches channels
+        for label, func, linac in (
+            ("serial", serial, args.serial_linac),
+            ("snapshot", snapshot, args.snapshot_linac),
+        ):
+            cavities = len(linac_cavities(machine, linac))
+            elapsed = func(machine, linac)
+            print(
+                f"{label:>8}: {cavities} cavities read in {elapsed * 1000:.1f} ms"
+                f" ({elapsed / cavities * 1000:.2f} ms/cavity)"
+            )
@@ -0,0 +1,68 @@
+"""
+Cold-start time for a single cavity launch, i.e. what srf_cavity_setup_launcher.py
+pays before it can do any work: interpreter start, imports, machine construction
+and the cavity lookup.
+
+Run from the repository root:
+    python -m benchmarks.startup_benchmark --runs 5
+"""
+import argparse
+import os
+import subprocess
+import sys
+from statistics import mean, median
+from time import perf_counter
+from typing import Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAUNCH_SNIPPET = """
+import time
+start = time.perf_counter()
+from setup_linac import SetupMachine
+machine = SetupMachine(lazy={lazy})
+machine.cryomodules["{cm_name}"].cavities[{cav_num}]
+print(time.perf_counter() - start)
+"""
+
+
+def time_launch(lazy: bool, cm_name: str, cav_num: int) -> Tuple[float, float]:
+    """
+    :return: (wall clock time of the whole process, time spent in python
+             from the first import to the cavity lookup)
+    """
+    snippet = LAUNCH_SNIPPET.format(lazy=lazy, cm_name=cm_name, cav_num=cav_num)
+    start = perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=REPO_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    wall_time = perf_counter() - start
+    return wall_time, float(output.strip().splitlines()[-1])
+
+
+def report(label: str, samples):
+    wall = [sample[0] for sample in samples]
+    build = [sample[1] for sample in samples]
+    print(
+        f"{label:>6}: process mean {mean(wall):.3f} s, median {median(wall):.3f} s"
+        f" | import+build+lookup mean {mean(build):.3f} s,"
+        f" median {median(build):.3f} s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", "-n", type=int, default=5)
+    parser.add_argument("--cryomodule", "-cm", default="01")
+    parser.add_argument("--cavity", "-cav", type=int, default=1)
+    args = parser.parse_args()
+
+    for lazy, label in ((False, "eager"), (True, "lazy")):
+        report(
+            label,
+            [time_launch(lazy, args.cryomodule, args.cavity) for _ in range(args.runs)],
+        )
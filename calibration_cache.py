@@ -0,0 +1,367 @@
+import argparse
+import dataclasses
+import glob
+import json
+import os
+from collections import Counter
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, List, Optional
+
+from lcls_tools.superconducting.sc_linac_utils import ALL_CRYOMODULES
+
+from checkpoint import write_json
+
+# Directory holding one calibration cache file per cavity, unset to disable
+# the cache (every requested calibration runs)
+CALIBRATION_CACHE_DIR_ENV = "SRF_SETUP_CALIBRATION_CACHE_DIR"
+
+CALIBRATIONS = ("ssa_cal", "characterize")
+
+
+# How long a rule waits for its PV to connect, the PVs are only created when
+# the first lookup asks for them
+RULE_CONNECTION_TIMEOUT = 2.0
+
+
+@dataclasses.dataclass
+class CachedCalibration:
+    completed: float
+    results: Dict[str, Any]
+    # What the rules recorded when the calibration completed
+    conditions: Dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+class ValidityRule:
+    """
+    Decides whether a cached calibration still holds for a cavity
+    """
+
+    def before_setup(self, cavity) -> Dict[str, Any]:
+        """
+        :return: what to read at the start of a setup, before the setup
+                 itself changes it (e.g. resets the interlocks)
+        """
+        return {}
+
+    def conditions(self, cavity) -> Dict[str, Any]:
+        """
+        :return: what to record with a new calibration for later lookups to
+                 compare against
+        """
+        return {}
+
+    def invalid_reason(
+        self,
+        cavity,
+        calibration: str,
+        cached: CachedCalibration,
+        setup_state: Dict[str, Any],
+    ) -> Optional[str]:
+        """
+        :param setup_state: what before_setup read at the start of the setup
+        :return: why the cached result can not be used, None if it can
+        """
+        raise NotImplementedError
+
+
+@dataclasses.dataclass
+class MaxAge(ValidityRule):
+    max_ages: Dict[str, float]
+
+    def invalid_reason(
+        self,
+        cavity,
+        calibration: str,
+        cached: CachedCalibration,
+        setup_state: Dict[str, Any],
+    ) -> Optional[str]:
+        age = time() - cached.completed
+        if age > self.max_ages[calibration]:
+            return f"{age / 3600:.1f} h old"
+        return None
+
+
+@dataclasses.dataclass
+class PVRule(ValidityRule):
+    name: str
+    pv_obj: Callable[[Any], Any]
+    timeout: float = RULE_CONNECTION_TIMEOUT
+
+    def connected_pv(self, cavity):
+        """
+        :return: the PV, None if it did not connect in time
+        """
+        pv = self.pv_obj(cavity)
+        return pv if pv.wait_for_connection(timeout=self.timeout) else None
+
+
+@dataclasses.dataclass
+class NotWrittenSince(PVRule):
+    """
+    Invalid once the PV's record timestamp differs from the one recorded
+    when the calibration completed. Only for passive records, whose
+    timestamp moves when they are written (e.g. HW mode to maintenance and
+    back, which reads ONLINE again by the next setup), not on a scan.
+    """
+
+    def timestamp(self, cavity) -> Optional[float]:
+        pv = self.connected_pv(cavity)
+        if pv is None:
+            return None
+        # The timestamp comes with the value
+        pv.get()
+        return pv.timestamp
+
+    def conditions(self, cavity) -> Dict[str, Any]:
+        return {self.name: self.timestamp(cavity)}
+
+    def invalid_reason(
+        self,
+        cavity,
+        calibration: str,
+        cached: CachedCalibration,
+        setup_state: Dict[str, Any],
+    ) -> Optional[str]:
+        recorded = cached.conditions.get(self.name)
+        if recorded is None:
+            return f"{self.name} not recorded"
+        timestamp = self.timestamp(cavity)
+        if timestamp is None:
+            return f"{self.name} unknown"
+        if timestamp != recorded:
+            return f"{self.name} written since"
+        return None
+
+
+@dataclasses.dataclass
+class NotLatched(PVRule):
+    """
+    Invalid if the latch was set when the setup started. The setup resets
+    the interlocks before it calibrates, so a latch set then means a trip
+    since the last reset, which at the latest was the setup that calibrated.
+    Read from the PV when looked up outside of a setup.
+    """
+
+    def read(self, cavity) -> Any:
+        pv = self.connected_pv(cavity)
+        return None if pv is None else pv.get()
+
+    def before_setup(self, cavity) -> Dict[str, Any]:
+        return {self.name: self.read(cavity)}
+
+    def invalid_reason(
+        self,
+        cavity,
+        calibration: str,
+        cached: CachedCalibration,
+        setup_state: Dict[str, Any],
+    ) -> Optional[str]:
+        if self.name in setup_state:
+            latched = setup_state[self.name]
+        else:
+            latched = self.read(cavity)
+        if latched is None:
+            return f"{self.name} unknown"
+        if latched:
+            return f"{self.name} latched since"
+        return None
+
+
+DEFAULT_RULES: List[ValidityRule] = [
+    MaxAge({"ssa_cal": 24 * 3600, "characterize": 24 * 3600}),
+    NotWrittenSince("HW mode", lambda cavity: cavity.hw_mode_pv_obj),
+    NotLatched("quench interlock", lambda cavity: cavity.quench_latch_pv_obj),
+]
+
+
+class CalibrationCache:
+    """
+    Last SSA calibration and cavity characterization results of one cavity,
+    kept in a JSON file along with how often they were used (hits) or had to
+    be redone (misses). A cached result is only used while every validity
+    rule passes.
+    """
+
+    def __init__(self, path: str, rules: Optional[List[ValidityRule]] = None):
+        self.path = path
+        self.rules: List[ValidityRule] = DEFAULT_RULES if rules is None else rules
+        self.entries: Dict[str, CachedCalibration] = {}
+        # What the rules read at the start of the latest setup
+        self.setup_state: Dict[str, Any] = {}
+        self.hits: Counter = Counter()
+        self.misses: Counter = Counter()
+        self._lock = Lock()
+        self.load()
+
+    @classmethod
+    def for_cavity(
+        cls, cavity, directory: Optional[str] = None
+    ) -> Optional["CalibrationCache"]:
+        """
+        :return: None when no directory is given and the cache is not
+                 enabled through SRF_SETUP_CALIBRATION_CACHE_DIR
+        """
+        directory = directory or os.environ.get(CALIBRATION_CACHE_DIR_ENV)
+        if not directory:
+            return None
+        return cls(cache_path(directory, cavity.cryomodule.name, cavity.number))
+
+    def load(self):
+        data = read_cache(self.path)
+        with self._lock:
+            self.entries = {
+                calibration: CachedCalibration(**entry)
+                for calibration, entry in data.get("entries", {}).items()
+            }
+            self.hits = Counter(data.get("hits", {}))
+            self.misses = Counter(data.get("misses", {}))
+
+    def save(self):
+        with self._lock:
+            data = {
+                "entries": {
+                    calibration: dataclasses.asdict(entry)
+                    for calibration, entry in self.entries.items()
+                },
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+        write_json(self.path, data)
+
+    def setup_started(self, cavity):
+        """
+        Called at the start of a setup, before it resets anything
+        """
+        setup_state: Dict[str, Any] = {}
+        for rule in self.rules:
+            setup_state.update(rule.before_setup(cavity))
+        self.setup_state = setup_state
+
+    def lookup(self, cavity, calibration: str) -> Optional[CachedCalibration]:
+        """
+        Counts a hit or a miss
+        :return: the cached result if it is still valid
+        """
+        with self._lock:
+            cached = self.entries.get(calibration)
+
+        reason: Optional[str] = "nothing cached"
+        if cached is not None:
+            for rule in self.rules:
+                reason = rule.invalid_reason(
+                    cavity, calibration, cached, self.setup_state
+                )
+                if reason:
+                    break
+
+        with self._lock:
+            if reason is None:
+                self.hits[calibration] += 1
+            else:
+                self.misses[calibration] += 1
+        self.save()
+
+        if reason is not None:
+            print(f"{cavity} {calibration} cache miss: {reason}")
+            return None
+        return cached
+
+    def store(self, cavity, calibration: str, results: Dict[str, Any]):
+        conditions: Dict[str, Any] = {}
+        for rule in self.rules:
+            conditions.update(rule.conditions(cavity))
+        with self._lock:
+            self.entries[calibration] = CachedCalibration(
+                completed=time(), results=results, conditions=conditions
+            )
+        self.save()
+
+    def invalidate(self, calibration: Optional[str] = None):
+        """
+        Operator override: the next setup redoes the calibration (all of them
+        if None) whatever the rules say
+        """
+        with self._lock:
+            if calibration is None:
+                self.entries = {}
+            else:
+                self.entries.pop(calibration, None)
+        self.save()
+
+
+def cache_path(directory: str, cm_name: str, cav_num: int) -> str:
+    return os.path.join(directory, f"{cm_name}_{cav_num}.json")
+
+
+def read_cache(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as e:
+        print(f"Ignoring unreadable calibration cache {path}: {e}")
+        return {}
+
+
+def hit_rates(directory: str) -> Dict[str, Dict[str, float]]:
+    """
+    :return: hits, misses and hit rate per calibration over every cavity in
+             the cache directory
+    """
+    hits: Counter = Counter()
+    misses: Counter = Counter()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        data = read_cache(path)
+        hits.update(data.get("hits", {}))
+        misses.update(data.get("misses", {}))
+
+    rates: Dict[str, Dict[str, float]] = {}
+    for calibration in CALIBRATIONS:
+        total = hits[calibration] + misses[calibration]
+        rates[calibration] = {
+            "hits": hits[calibration],
+            "misses": misses[calibration],
+            "hit_rate": hits[calibration] / total if total else 0.0,
+        }
+    return rates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Report calibration cache hit rates or force recalibration"
+    )
+    parser.add_argument(
+        "--directory",
+        default=os.environ.get(CALIBRATION_CACHE_DIR_ENV),
+        help=f"Cache directory, defaults to ${CALIBRATION_CACHE_DIR_ENV}",
+    )
+    parser.add_argument(
+        "--invalidate",
+        action="store_true",
+        help="Drop the cached results of the selected cavities",
+    )
+    parser.add_argument("--cryomodule", "-cm", choices=ALL_CRYOMODULES)
+    parser.add_argument("--cavity", "-cav", choices=range(1, 9), type=int)
+    parser.add_argument("--calibration", choices=CALIBRATIONS)
+
+    args = parser.parse_args()
+    if not args.directory:
+        parser.error(f"Pass --directory or set {CALIBRATION_CACHE_DIR_ENV}")
+
+    if args.invalidate:
+        cm_names = [args.cryomodule] if args.cryomodule else ALL_CRYOMODULES
+        cav_nums = [args.cavity] if args.cavity else range(1, 9)
+        for cm_name in cm_names:
+            for cav_num in cav_nums:
+                path = cache_path(args.directory, cm_name, cav_num)
+                if os.path.exists(path):
+                    CalibrationCache(path).invalidate(args.calibration)
+        print(f"Invalidated {args.calibration or 'all calibrations'}")
+    else:
+        for calibration, stats in hit_rates(args.directory).items():
+            print(
+                f"{calibration:>12}: {stats['hits']} hits, {stats['misses']} misses,"
+                f" {stats['hit_rate']:.0%} hit rate"
+            )
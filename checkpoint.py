@@ -0,0 +1,127 @@
+import dataclasses
+import json
+import os
+import tempfile
+from threading import Lock
+from time import time
+from typing import Any, Dict, Optional
+
+# Directory holding one checkpoint file per cavity
+CHECKPOINT_DIR_ENV = "SRF_SETUP_CHECKPOINT_DIR"
+DEFAULT_CHECKPOINT_DIR = os.path.join(
+    os.path.expanduser("~"), ".srf_auto_setup", "checkpoints"
+)
+
+# Stages a resumed setup may skip and for how long (seconds) a completed one
+# stays valid. The tuning only holds until the cavity drifts, the
+# calibrations hold much longer.
+CHECKPOINT_MAX_AGES: Dict[str, float] = {
+    "ssa_cal": 8 * 3600,
+    "tune": 10 * 60,
+    "characterize": 8 * 3600,
+}
+
+
+def write_json(path: str, data: Dict[str, Any]):
+    """
+    Writes to a temporary file and renames it over path, so a crash never
+    leaves half a file behind
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@dataclasses.dataclass
+class StageCheckpoint:
+    completed: float
+    inputs: Dict[str, Any]
+
+
+class CavityCheckpoint:
+    """
+    Record of the setup stages a cavity last completed, with when and the
+    inputs they ran with, kept in a JSON file so it outlives the process
+    (each launcher run is a new process).
+
+    A stage is still valid if it is younger than its max age, ran with the
+    same inputs and completed after every stage before it, so redoing an
+    SSA calibration invalidates the characterization that followed it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages: Dict[str, StageCheckpoint] = {}
+        self._lock = Lock()
+        self.load()
+
+    @classmethod
+    def for_cavity(
+        cls, cavity, directory: Optional[str] = None
+    ) -> "CavityCheckpoint":
+        directory = directory or os.environ.get(
+            CHECKPOINT_DIR_ENV, DEFAULT_CHECKPOINT_DIR
+        )
+        return cls(
+            os.path.join(directory, f"{cavity.cryomodule.name}_{cavity.number}.json")
+        )
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                stages = json.load(file)["stages"]
+        except FileNotFoundError:
+            stages = {}
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            stages = {}
+
+        with self._lock:
+            self.stages = {
+                name: StageCheckpoint(**checkpoint)
+                for name, checkpoint in stages.items()
+            }
+
+    def save(self):
+        with self._lock:
+            data = {
+                "stages": {
+                    name: dataclasses.asdict(checkpoint)
+                    for name, checkpoint in self.stages.items()
+                }
+            }
+        write_json(self.path, data)
+
+    def record(self, stage: str, inputs: Dict[str, Any]):
+        with self._lock:
+            self.stages[stage] = StageCheckpoint(completed=time(), inputs=inputs)
+        self.save()
+
+    def clear(self):
+        with self._lock:
+            self.stages = {}
+        self.save()
+
+    def is_valid(self, stage: str, inputs: Dict[str, Any]) -> bool:
+        with self._lock:
+            checkpoint = self.stages.get(stage)
+            if checkpoint is None or checkpoint.inputs != inputs:
+                return False
+            if time() - checkpoint.completed > CHECKPOINT_MAX_AGES[stage]:
+                return False
+
+            order = list(CHECKPOINT_MAX_AGES)
+            earlier = order[: order.index(stage)]
+            return all(
+                self.stages[name].completed <= checkpoint.completed
+                for name in earlier
+                if name in self.stages
+            )
@@ -0,0 +1,70 @@
+import fcntl
+import os
+from typing import IO, Optional
+
+# Lock file held by a running srf_setup_daemon.py. The IOC keeps starting
+# srf_cavity_setup_launcher.py on the same SETUPSTRT/OFFSTRT PVs the daemon
+# monitors, so the launcher checks it and leaves those requests to the daemon.
+DAEMON_LOCK_ENV = "SRF_SETUP_DAEMON_LOCK"
+DEFAULT_DAEMON_LOCK = os.path.join(
+    os.path.expanduser("~"), ".srf_auto_setup", "daemon.lock"
+)
+
+
+class DaemonLockError(RuntimeError):
+    pass
+
+
+def daemon_lock_path() -> str:
+    return os.environ.get(DAEMON_LOCK_ENV, DEFAULT_DAEMON_LOCK)
+
+
+class DaemonLock:
+    """
+    Advisory (flock) lock, released by the OS when the holding process dies,
+    so a crashed daemon never leaves the launchers disabled
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or daemon_lock_path()
+        self._file: Optional[IO] = None
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self):
+        """
+        :raise DaemonLockError: if another process holds the lock
+        """
+        if self.held:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        file = open(self.path, "a")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            file.close()
+            raise DaemonLockError(f"A setup daemon already holds {self.path}")
+        self._file = file
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+def daemon_running(path: Optional[str] = None) -> bool:
+    """
+    :return: True if a setup daemon on this host holds the lock at path
+    """
+    lock = DaemonLock(path)
+    if not os.path.exists(lock.path):
+        return False
+    try:
+        lock.acquire()
+    except DaemonLockError:
+        return True
+    lock.release()
+    return False
@@ -0,0 +1,71 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtWidgets import QAbstractButton
+
+DEFAULT_MAX_WORKERS = 4
+
+
+class ActionRunner(QObject):
+    """
+    Runs actions started from the GUI (which block on PV I/O) on a thread
+    pool so the GUI thread never waits on a slow or disconnected IOC.
+
+    The outcome comes back through the finished signal: emitted on the worker
+    thread, it is queued to the receivers on the GUI thread, where the
+    button that started the action is re-enabled and the on_done callback is
+    run with the action's result (or the exception it raised).
+    """
+
+    # button, button text before the action, on_done, result or exception
+    finished = pyqtSignal(object, str, object, object)
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, parent: QObject = None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gui_action"
+        )
+        self.finished.connect(self._on_finished)
+
+    def run(
+        self,
+        button: Optional[QAbstractButton],
+        func: Callable[[], Any],
+        on_done: Optional[Callable[[Any], None]] = None,
+        busy_text: str = "Working...",
+    ) -> Future:
+        """
+        :param button: disabled and relabelled with busy_text until func
+                       returns, so the same action can not be started twice
+                       (None for actions started without a button)
+        :param on_done: called on the GUI thread with func's return value or
+                        the exception it raised
+        """
+        text = ""
+        if button is not None:
+            text = button.text()
+            button.setEnabled(False)
+            button.setText(busy_text)
+
+        future = self.executor.submit(func)
+        future.add_done_callback(
+            lambda done: self.finished.emit(
+                button,
+                text,
+                on_done,
+                done.exception() if done.exception() else done.result(),
+            )
+        )
+        return future
+
+    @staticmethod
+    def _on_finished(button, text: str, on_done, outcome):
+        if button is not None:
+            button.setText(text)
+            button.setEnabled(True)
+        if on_done:
+            on_done(outcome)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,244 @@
+import os
+from abc import ABC, abstractmethod
+from threading import Lock
+from time import perf_counter, time
+from typing import Any, Callable, Dict, Optional
+
+from lcls_tools.common.controls.pyepics.utils import PV
+from stage_timer import record_round_trip
+
+# Selects the backend PV_REGISTRY starts with: pyepics (default), caproto
+# or memory
+PV_BACKEND_ENV = "SRF_SETUP_PV_BACKEND"
+
+
+class PVBackend(ABC):
+    """
+    Creates the PV objects handed out by PVRegistry. Whatever it returns
+    needs the subset of the pyepics PV interface this repo uses: pvname,
+    connected, timestamp (of the last value change), wait_for_connection,
+    get, put (with wait and callback) and add_callback/remove_callback with
+    monitor semantics.
+    """
+
+    @abstractmethod
+    def create_pv(self, pvname: str):
+        pass
+
+
+class TimedPV(PV):
+    """
+    Reports how long each get/put takes to the stage timer (if any) running
+    on the calling thread
+    """
+
+    def get(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return super().get(*args, **kwargs)
+        finally:
+            record_round_trip(self.pvname, "get", perf_counter() - start)
+
+    def put(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return super().put(*args, **kwargs)
+        finally:
+            record_round_trip(self.pvname, "put", perf_counter() - start)
+
+
+class PyEpicsBackend(PVBackend):
+    def create_pv(self, pvname: str) -> TimedPV:
+        return TimedPV(pvname)
+
+
+class CallbackMixin:
+    """
+    pyepics style monitor callbacks: callback(pvname=..., value=...)
+    """
+
+    def __init__(self):
+        self._callbacks: Dict[int, Callable] = {}
+        self._next_index = 0
+        self._callback_lock = Lock()
+
+    def add_callback(self, callback: Callable, **kwargs) -> int:
+        with self._callback_lock:
+            self._next_index += 1
+            self._callbacks[self._next_index] = callback
+            return self._next_index
+
+    def remove_callback(self, index: int):
+        with self._callback_lock:
+            self._callbacks.pop(index, None)
+
+    def run_callbacks(self, value: Any):
+        with self._callback_lock:
+            callbacks = list(self._callbacks.values())
+        for callback in callbacks:
+            callback(pvname=self.pvname, value=value)
+
+
+class InMemoryPV(CallbackMixin):
+    """
+    PV backed by a plain attribute: always connected, puts complete
+    immediately and notify the monitor callbacks
+    """
+
+    def __init__(self, pvname: str, value: Any = 0):
+        super().__init__()
+        self.pvname = pvname
+        self.value = value
+        self.timestamp = time()
+        self.connected = True
+
+    def __repr__(self):
+        return f"InMemoryPV({self.pvname!r}, {self.value!r})"
+
+    def wait_for_connection(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+    def get(self, as_string: bool = False, **kwargs):
+        return str(self.value) if as_string else self.value
+
+    def put(self, value, wait: bool = True, callback: Callable = None, **kwargs):
+        self.value = value
+        self.timestamp = time()
+        self.run_callbacks(value)
+        if callback:
+            callback(pvname=self.pvname)
+        return 1
+
+
+class InMemoryBackend(PVBackend):
+    """
+    Dictionary store of InMemoryPVs for tests, simulations and dry runs
+    :param values: initial values by PV name, anything else starts at default
+    """
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None, default: Any = 0):
+        self.default = default
+        self.pvs: Dict[str, InMemoryPV] = {}
+        self._values = dict(values or {})
+        self._lock = Lock()
+
+    def create_pv(self, pvname: str) -> InMemoryPV:
+        with self._lock:
+            if pvname not in self.pvs:
+                self.pvs[pvname] = InMemoryPV(
+                    pvname, self._values.get(pvname, self.default)
+                )
+            return self.pvs[pvname]
+
+    def __getitem__(self, pvname: str) -> Any:
+        return self.create_pv(pvname).value
+
+    def __setitem__(self, pvname: str, value: Any):
+        """
+        Sets a value as if it came from the IOC, i.e. monitors fire
+        """
+        self.create_pv(pvname).put(value)
+
+
+class CaprotoPV(CallbackMixin):
+    """
+    Adapts a caproto threading client PV to the pyepics interface, with
+    a subscription keeping a monitor cache like pyepics' auto_monitor
+    """
+
+    def __init__(self, pv):
+        super().__init__()
+        self.pvname: str = pv.name
+        self._pv = pv
+        self._value: Any = None
+        self.timestamp: Optional[float] = None
+        self._subscription = pv.subscribe(data_type="time")
+        self._subscription.add_callback(self._on_update)
+
+    @property
+    def connected(self) -> bool:
+        return self._pv.connected
+
+    def wait_for_connection(self, timeout: Optional[float] = None) -> bool:
+        try:
+            self._pv.wait_for_connection(timeout=timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    @staticmethod
+    def _unpack(data, as_string: bool = False) -> Any:
+        if len(data) and isinstance(data[0], bytes):
+            return data[0].decode()
+        if as_string:
+            # Char waveforms (e.g. AUTO:MSG) come back as arrays of codes
+            return bytes(data).rstrip(b"\0").decode()
+        return data[0] if len(data) == 1 else data
+
+    def get(
+        self,
+        use_monitor: bool = True,
+        as_string: bool = False,
+        timeout: Optional[float] = None,
+        **kwargs,
+    ):
+        if use_monitor and self._value is not None:
+            data = self._value
+        else:
+            data = self._pv.read(timeout=timeout or 2.0).data
+        return self._unpack(data, as_string=as_string)
+
+    def put(
+        self,
+        value,
+        wait: bool = True,
+        callback: Callable = None,
+        timeout: float = 30.0,
+        **kwargs,
+    ):
+        on_complete = None
+        if callback:
+
+            def on_complete(response):
+                callback(pvname=self.pvname)
+
+        self._pv.write(value, wait=wait, callback=on_complete, timeout=timeout)
+        return 1
+
+    def _on_update(self, subscription, response):
+        self._value = response.data
+        self.timestamp = response.metadata.timestamp
+        self.run_callbacks(self._unpack(response.data))
+
+
+class CaprotoBackend(PVBackend):
+    """
+    Pure python Channel Access client, requires caproto
+    """
+
+    def __init__(self):
+        try:
+            from caproto.threading.client import Context
+        except ImportError as e:
+            raise ImportError("The caproto PV backend requires caproto") from e
+        self.context = Context()
+
+    def create_pv(self, pvname: str) -> CaprotoPV:
+        (pv,) = self.context.get_pvs(pvname)
+        return CaprotoPV(pv)
+
+
+BACKENDS: Dict[str, Callable[[], PVBackend]] = {
+    "pyepics": PyEpicsBackend,
+    "caproto": CaprotoBackend,
+    "memory": InMemoryBackend,
+}
+
+
+def backend_from_env() -> PVBackend:
+    name = os.environ.get(PV_BACKEND_ENV, "pyepics")
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown {PV_BACKEND_ENV} {name}, expected one of {', '.join(BACKENDS)}"
+        )
+    return BACKENDS[name]()
@@ -0,0 +1,170 @@
+from threading import Event, Lock
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from lcls_tools.common.controls.pyepics.utils import PV, PVInvalidError
+from pv_backends import PVBackend, backend_from_env
+
+DEFAULT_CONNECTION_TIMEOUT = 2.0
+DEFAULT_PUT_TIMEOUT = 30.0
+
+PVLike = Union[str, PV]
+
+
+class PVRegistry:
+    """
+    Pool of PV objects shared by every object that points at the same channel.
+
+    Creating a PV only sends the search request, so asking for a batch of PVs
+    and then waiting on all of them costs one round-trip instead of one per PV.
+    The PV objects themselves come from a PVBackend (pyepics by default).
+    """
+
+    def __init__(
+        self,
+        connection_timeout: float = DEFAULT_CONNECTION_TIMEOUT,
+        backend: Optional[PVBackend] = None,
+    ):
+        self.connection_timeout = connection_timeout
+        self.backend: PVBackend = backend if backend else backend_from_env()
+        self._pvs: Dict[str, PV] = {}
+        self._lock = Lock()
+
+    def set_backend(self, backend: PVBackend):
+        """
+        Switches backend and drops the PVs made by the old one. Objects that
+        already looked up their PVs keep them, so set this before building
+        the SetupMachine hierarchy (or use a fresh SetupMachine).
+        """
+        with self._lock:
+            self.backend = backend
+            self._pvs = {}
+
+    def __contains__(self, pvname: str) -> bool:
+        return pvname in self._pvs
+
+    def __len__(self) -> int:
+        return len(self._pvs)
+
+    def get_pv(self, pvname: str) -> PV:
+        try:
+            return self._pvs[pvname]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if pvname not in self._pvs:
+                self._pvs[pvname] = self.backend.create_pv(pvname)
+            return self._pvs[pvname]
+
+    def pv_objs(self, pvs: Iterable[PVLike]) -> List[PV]:
+        """
+        Accepts PV names or PV objects (e.g. ones created by lcls_tools) so
+        callers can batch over whatever they already hold
+        """
+        return [self.get_pv(pv) if isinstance(pv, str) else pv for pv in pvs]
+
+    def connect(
+        self, pvs: Iterable[PVLike], timeout: Optional[float] = None
+    ) -> List[str]:
+        """
+        Creates (or reuses) every PV first so all the searches are in flight,
+        then waits for them against one shared deadline
+        :return: names of the PVs that did not connect in time
+        """
+        pv_objs = self.pv_objs(pvs)
+        deadline = monotonic() + (
+            self.connection_timeout if timeout is None else timeout
+        )
+
+        unconnected: List[str] = []
+        for pv in pv_objs:
+            if not pv.wait_for_connection(timeout=max(deadline - monotonic(), 0)):
+                unconnected.append(pv.pvname)
+        return unconnected
+
+    def get_many(
+        self, pvs: Iterable[PVLike], timeout: Optional[float] = None
+    ) -> List[Any]:
+        pv_objs = self.pv_objs(pvs)
+        unconnected = self.connect(pv_objs, timeout=timeout)
+        if unconnected:
+            raise PVInvalidError(f"{', '.join(unconnected)} not connected")
+
+        # Connected PVs are auto monitored, so these are served from the
+        # monitor cache rather than one network round-trip each
+        return [pv.get() for pv in pv_objs]
+
+    def put_many(
+        self,
+        values: Dict[PVLike, Any],
+        wait: bool = True,
+        timeout: float = DEFAULT_PUT_TIMEOUT,
+    ):
+        """
+        Issues every put before waiting on any of them so the completions
+        come back together
+        """
+        pv_objs = self.pv_objs(values.keys())
+        unconnected = self.connect(pv_objs)
+        if unconnected:
+            raise PVInvalidError(f"{', '.join(unconnected)} not connected")
+
+        incomplete = self._put_all(pv_objs, list(values.values()), wait, timeout)
+        if incomplete:
+            raise PVInvalidError(f"Puts to {', '.join(incomplete)} did not complete")
+
+    def try_put_many(
+        self, values: Dict[PVLike, Any], timeout: float = DEFAULT_PUT_TIMEOUT
+    ) -> Dict[str, str]:
+        """
+        Like put_many (with wait) but carries on past PVs that fail, for
+        callers that report failures per PV
+        :return: why each failed put failed by PV name, empty if all completed
+        """
+        pv_objs = self.pv_objs(values.keys())
+        unconnected = set(self.connect(pv_objs))
+        failures = {pvname: "not connected" for pvname in unconnected}
+
+        connected = [
+            (pv, value)
+            for pv, value in zip(pv_objs, values.values())
+            if pv.pvname not in unconnected
+        ]
+        for pvname in self._put_all(
+            [pv for pv, _ in connected],
+            [value for _, value in connected],
+            wait=True,
+            timeout=timeout,
+        ):
+            failures[pvname] = "put did not complete"
+        return failures
+
+    @staticmethod
+    def _put_all(
+        pv_objs: List[PV], values: List[Any], wait: bool, timeout: float
+    ) -> List[str]:
+        """
+        :return: names of the PVs whose puts did not complete in time
+        """
+        completions: Dict[str, Event] = {}
+
+        def on_complete(pvname=None, **kwargs):
+            completions[pvname].set()
+
+        for pv, value in zip(pv_objs, values):
+            if wait:
+                completions[pv.pvname] = Event()
+                pv.put(value, wait=False, callback=on_complete)
+            else:
+                pv.put(value, wait=False)
+
+        deadline = monotonic() + timeout
+        return [
+            pvname
+            for pvname, completion in completions.items()
+            if not completion.wait(timeout=max(deadline - monotonic(), 0))
+        ]
+
+
+PV_REGISTRY = PVRegistry()
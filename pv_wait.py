@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Optional
+
+from epics import PV
+
+
+class PVWaitTimeoutError(Exception):
+    pass
+
+
+class PVWaitAbortedError(Exception):
+    pass
+
+
+class AbortToken:
+    """
+    Local copy of an abort PV kept current by its monitor, so checking for an
+    abort is a memory read instead of a CA get. Listeners are called (from
+    the CA callback thread) as soon as an abort comes in, which lets long
+    running steps be interrupted without waiting for their next check.
+    """
+
+    def __init__(self, pv: PV):
+        self.pv = pv
+        self._requested = Event()
+        self._listeners: Dict[int, Callable[[], None]] = {}
+        self._next_listener_id = 0
+        self._callback_index = None
+        self._lock = Lock()
+
+    def __str__(self):
+        return f"{self.pv.pvname} abort token"
+
+    def subscribe(self):
+        with self._lock:
+            if self._callback_index is not None:
+                return
+            self._callback_index = self.pv.add_callback(self._on_value)
+        self._on_value(value=self.pv.get())
+
+    def unsubscribe(self):
+        with self._lock:
+            if self._callback_index is not None:
+                self.pv.remove_callback(self._callback_index)
+                self._callback_index = None
+
+    @property
+    def is_set(self) -> bool:
+        self.subscribe()
+        return self._requested.is_set()
+
+    def clear(self):
+        """
+        Only clears the local flag, the caller is responsible for the PV
+        """
+        self._requested.clear()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        self.subscribe()
+        return self._requested.wait(timeout=timeout)
+
+    def add_listener(self, listener: Callable[[], None]) -> int:
+        with self._lock:
+            self._next_listener_id += 1
+            self._listeners[self._next_listener_id] = listener
+            return self._next_listener_id
+
+    def remove_listener(self, listener_id: int):
+        with self._lock:
+            self._listeners.pop(listener_id, None)
+
+    def _on_value(self, value=None, **kwargs):
+        if not value:
+            self._requested.clear()
+            return
+
+        self._requested.set()
+        with self._lock:
+            listeners = list(self._listeners.values())
+        for listener in listeners:
+            listener()
+
+
+class PVCondition:
+    """
+    Waits for condition(value) to hold on a PV using its monitor callbacks
+    rather than by polling. The result is exposed as a concurrent Future so it
+    can be waited on from a thread, awaited from asyncio or given a callback.
+
+    If abort_token is given the wait ends as soon as an abort comes in. The
+    waiter then calls abort_check (outside the CA callback thread) so it can
+    raise its own error, e.g. CavityAbortError, else PVWaitAbortedError is
+    raised.
+    """
+
+    def __init__(
+        self,
+        pv: PV,
+        condition: Callable[[Any], bool],
+        abort_token: Optional[AbortToken] = None,
+        abort_check: Optional[Callable[[], None]] = None,
+    ):
+        self.pv = pv
+        self.condition = condition
+        self.abort_token = abort_token
+        self.abort_check = abort_check
+        self.future: Future = Future()
+
+        self._callback_index = None
+        self._abort_listener_id = None
+
+    def __str__(self):
+        return f"{self.pv.pvname} condition"
+
+    def start(self) -> Future:
+        if self._callback_index is not None or self.future.done():
+            return self.future
+
+        self._callback_index = self.pv.add_callback(self._on_value)
+        if self.abort_token is not None:
+            self._abort_listener_id = self.abort_token.add_listener(self._on_abort)
+        self.future.add_done_callback(self._remove_callbacks)
+
+        # Monitors only fire on change, so check where we already are
+        if self.abort_token is not None and self.abort_token.is_set:
+            self._on_abort()
+        self._on_value(value=self.pv.get())
+        return self.future
+
+    def add_done_callback(self, callback: Callable[[Future], None]):
+        self.start().add_done_callback(callback)
+
+    def cancel(self):
+        self.future.cancel()
+
+    def _on_value(self, value=None, **kwargs):
+        if self.future.done():
+            return
+        try:
+            if self.condition(value):
+                self.future.set_result(value)
+        except Exception as e:
+            self.future.set_exception(e)
+
+    def _on_abort(self):
+        if self.future.done():
+            return
+        self.future.set_exception(
+            PVWaitAbortedError(f"Abort requested while waiting for {self}")
+        )
+
+    def _remove_callbacks(self, future: Future):
+        self.pv.remove_callback(self._callback_index)
+        if self._abort_listener_id is not None:
+            self.abort_token.remove_listener(self._abort_listener_id)
+
+    def wait(self, timeout: Optional[float] = None):
+        try:
+            return self.start().result(timeout=timeout)
+        except FutureTimeoutError:
+            self.cancel()
+            raise PVWaitTimeoutError(f"Timed out waiting for {self}")
+        except PVWaitAbortedError:
+            if self.abort_check:
+                self.abort_check()
+            raise
+
+    async def wait_async(self, timeout: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.start)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.cancel()
+            raise PVWaitTimeoutError(f"Timed out waiting for {self}")
+        except PVWaitAbortedError:
+            if self.abort_check:
+                await loop.run_in_executor(None, self.abort_check)
+            raise
+
+
+def wait_for_pv(
+    pv: PV,
+    condition: Callable[[Any], bool],
+    timeout: Optional[float] = None,
+    abort_token: Optional[AbortToken] = None,
+    abort_check: Optional[Callable[[], None]] = None,
+):
+    """
+    Blocks until condition(value) holds on pv
+    :return: the value that satisfied the condition
+    """
+    return PVCondition(
+        pv, condition, abort_token=abort_token, abort_check=abort_check
+    ).wait(timeout=timeout)
@@ -0,0 +1,199 @@
+import dataclasses
+from collections import deque
+from concurrent.futures import Future
+from threading import Condition, Thread
+from time import monotonic, sleep
+from typing import Deque, Dict, Iterable, List, Optional
+
+from lcls_tools.common.controls.pyepics.utils import PVInvalidError
+from lcls_tools.superconducting import sc_linac_utils
+
+from pv_registry import PV_REGISTRY
+from setup_linac import SetupCavity
+
+# Same step and pacing as Cavity.walk_amp, which keeps a single cavity at
+# about 1 MV/s so it does not trip the sensitive interlocks
+DEFAULT_STEP_SIZE = 0.1
+DEFAULT_TICK = 0.1
+
+
+@dataclasses.dataclass(eq=False)
+class Ramp:
+    cavity: SetupCavity
+    target: float
+    amplitude: float
+    future: Future = dataclasses.field(default_factory=Future)
+
+    @property
+    def remaining(self) -> float:
+        return self.target - self.amplitude
+
+
+class RampEngine:
+    """
+    Walks many cavities' ADES to their targets together. Every tick each
+    ramping cavity takes at most one walk_amp sized step and all the steps go
+    out as one batch of puts, so N cavities ramp in about the time one does.
+
+    :param max_rate: limit on the summed amplitude change of all ramping
+                     cavities in MV/s, the steps that do not fit in a tick
+                     wait for the next one
+    :param max_active: limit on the number of cavities ramping at once, the
+                       rest wait in the order they were requested
+    """
+
+    def __init__(
+        self,
+        max_rate: Optional[float] = None,
+        max_active: Optional[int] = None,
+        step_size: float = DEFAULT_STEP_SIZE,
+        tick: float = DEFAULT_TICK,
+    ):
+        self.max_rate = max_rate
+        self.max_active = max_active
+        self.step_size = step_size
+        self.tick = tick
+
+        self.ticks = 0
+        self.peak_rate = 0.0
+
+        self._queued: Deque[Ramp] = deque()
+        self._active: List[Ramp] = []
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def active(self) -> int:
+        with self._condition:
+            return len(self._active)
+
+    @property
+    def queued(self) -> int:
+        with self._condition:
+            return len(self._queued)
+
+    def attach(self, cavities: Iterable[SetupCavity]):
+        """
+        Makes the cavities' ramp stage go through this engine instead of
+        ramping on their own with walk_amp
+        """
+        for cavity in cavities:
+            cavity.ramp_engine = self
+
+    def ramp(self, cavity: SetupCavity, target: float) -> Future:
+        """
+        :return: future that resolves once the cavity's ADES is at target, or
+                 holds the error that stopped it (abort, quench, PV errors)
+        """
+        ramp = Ramp(cavity=cavity, target=target, amplitude=cavity.ades)
+        self._queue([ramp])
+        return ramp.future
+
+    def walk_amp(self, cavity: SetupCavity, target: float):
+        """
+        Blocking drop-in for cavity.walk_amp(target, step_size)
+        """
+        self.ramp(cavity, target).result()
+
+    def ramp_all(
+        self, targets: Dict[SetupCavity, float]
+    ) -> Dict[SetupCavity, Optional[BaseException]]:
+        """
+        :return: the error for every cavity, None for the ones that made it
+        """
+        ramps = [
+            Ramp(cavity=cavity, target=target, amplitude=cavity.ades)
+            for cavity, target in targets.items()
+        ]
+        # Queued together so they all start ramping on the same tick
+        self._queue(ramps)
+        return {ramp.cavity: ramp.future.exception() for ramp in ramps}
+
+    def _queue(self, ramps: List[Ramp]):
+        with self._condition:
+            self._queued.extend(ramps)
+            self._start()
+            self._condition.notify_all()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="ramp engine", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queued or self._active)
+                while self._queued and (
+                    self.max_active is None or len(self._active) < self.max_active
+                ):
+                    self._active.append(self._queued.popleft())
+                ramps = list(self._active)
+
+            start = monotonic()
+            done = self._step(ramps)
+            self.ticks += 1
+
+            with self._condition:
+                for ramp in done:
+                    self._active.remove(ramp)
+
+            sleep(max(self.tick - (monotonic() - start), 0))
+
+    def _step(self, ramps: List[Ramp]) -> List[Ramp]:
+        """
+        Moves every ramp one step (one tick)
+        :return: the ramps that finished or failed
+        """
+        done: List[Ramp] = []
+        stepping: List[Ramp] = []
+        for ramp in ramps:
+            try:
+                ramp.cavity.check_abort()
+                if ramp.cavity.is_quenched:
+                    raise sc_linac_utils.QuenchError(f"{ramp.cavity} quenched")
+                if not ramp.cavity.ades_pv_obj.connected:
+                    raise PVInvalidError(f"{ramp.cavity} ADES not connected")
+            except Exception as e:
+                ramp.future.set_exception(e)
+                done.append(ramp)
+                continue
+            stepping.append(ramp)
+
+        # Within the rate budget the longest running ramps step first, so
+        # the budget goes on whole steps (fewer puts) and ramps finish early
+        budget = self.max_rate * self.tick if self.max_rate is not None else None
+        moving: List[Ramp] = []
+        moved = 0.0
+        for ramp in stepping:
+            step = max(min(ramp.remaining, self.step_size), -self.step_size)
+            if budget is not None:
+                if budget < 1e-9:
+                    break
+                step = max(min(step, budget), -budget)
+                budget -= abs(step)
+            # Land exactly on target rather than a float sum next to it
+            if abs(ramp.remaining - step) < 1e-9:
+                ramp.amplitude = ramp.target
+            else:
+                ramp.amplitude += step
+            moved += abs(step)
+            moving.append(ramp)
+        self.peak_rate = max(self.peak_rate, moved / self.tick)
+
+        try:
+            PV_REGISTRY.put_many(
+                {ramp.cavity.ades_pv_obj: ramp.amplitude for ramp in moving}
+            )
+        except Exception as e:
+            # Failing the ramps rather than the engine thread keeps the other
+            # waiters from hanging
+            for ramp in stepping:
+                ramp.future.set_exception(e)
+            return done + stepping
+
+        for ramp in stepping:
+            if ramp.amplitude == ramp.target:
+                ramp.future.set_result(ramp.target)
+                done.append(ramp)
+        return done
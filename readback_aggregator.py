@@ -0,0 +1,71 @@
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from epics import PV
+
+DEFAULT_REFRESH_RATE = 5.0
+
+
+class ReadbackAggregator(QObject):
+    """
+    Keeps a running sum of several monitored PVs. Monitor callbacks (on the
+    CA thread) only update the cached value and the sum; the total is sent
+    through the updated signal by a timer on the GUI thread, at most
+    refresh_rate times a second and only if something changed.
+    """
+
+    updated = pyqtSignal(float)
+
+    def __init__(
+        self,
+        pvs: Iterable[PV],
+        refresh_rate: float = DEFAULT_REFRESH_RATE,
+        parent: QObject = None,
+    ):
+        super().__init__(parent)
+        self.pvs: List[PV] = list(pvs)
+
+        self._values: Dict[str, float] = {}
+        self._total: float = 0.0
+        self._dirty: bool = False
+        self._lock = Lock()
+        self._subscriptions: List[Tuple[PV, int]] = []
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(1000 / refresh_rate))
+        self._timer.timeout.connect(self.emit_if_changed)
+
+    @property
+    def total(self) -> float:
+        with self._lock:
+            return self._total
+
+    def start(self):
+        for pv in self.pvs:
+            self._subscriptions.append((pv, pv.add_callback(self.on_value)))
+            if pv.connected:
+                self.on_value(pvname=pv.pvname, value=pv.get())
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        for pv, index in self._subscriptions:
+            pv.remove_callback(index)
+        self._subscriptions = []
+
+    def on_value(self, pvname: str = None, value: float = None, **kwargs):
+        if value is None:
+            return
+        with self._lock:
+            self._total += value - self._values.get(pvname, 0.0)
+            self._values[pvname] = value
+            self._dirty = True
+
+    def emit_if_changed(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            total = self._total
+        self.updated.emit(total)
@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import dataclasses
+from collections import defaultdict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Event, RLock
+from time import perf_counter
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from lcls_tools.superconducting.sc_linac_utils import (
+    ALL_CRYOMODULES,
+    ALL_CRYOMODULES_NO_HL,
+    LINAC_CM_DICT,
+)
+
+from pv_registry import PV_REGISTRY
+from ramp_engine import RampEngine
+from setup_linac import (
+    SETUP_MACHINE,
+    STATUS_ERROR_VALUE,
+    STATUS_READY_VALUE,
+    SetupCavity,
+    stage_executor,
+)
+
+DEFAULT_MAX_WORKERS = 32
+
+
+def run_cavity(
+    cavity: SetupCavity, shutdown: bool = False, resume: bool = False
+) -> Tuple[int, str]:
+    """
+    Runs the setup (or shutdown) for one cavity in this process
+    :param resume: skip the setup stages whose checkpoints are still valid
+    :return: the cavity's final status and status message
+    """
+    if shutdown:
+        cavity.shut_down()
+    else:
+        cavity.resume = resume
+        cavity.setup()
+    return cavity.status, cavity.status_msg_pv_obj.get(as_string=True)
+
+
+def _run_cavity_by_name(cm_name: str, cav_num: int, shutdown: bool, resume: bool):
+    # Cavity objects do not pickle, so process workers look them up in
+    # their own copy of the machine
+    return run_cavity(
+        SETUP_MACHINE.cryomodules[cm_name].cavities[cav_num], shutdown, resume
+    )
+
+
+@dataclasses.dataclass
+class CavityResult:
+    cm_name: str
+    cav_num: int
+    status: int
+    message: str
+    duration: float
+    error: Optional[BaseException] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None and self.status == STATUS_READY_VALUE
+
+
+@dataclasses.dataclass
+class SetupReport:
+    results: List[CavityResult]
+    duration: float
+
+    @property
+    def succeeded(self) -> List[CavityResult]:
+        return [result for result in self.results if result.succeeded]
+
+    @property
+    def failed(self) -> List[CavityResult]:
+        return [result for result in self.results if not result.succeeded]
+
+    def summary(self) -> str:
+        lines = [
+            f"{len(self.succeeded)}/{len(self.results)} cavities succeeded"
+            f" in {self.duration:.1f} s"
+        ]
+        for result in sorted(self.failed, key=lambda r: (r.cm_name, r.cav_num)):
+            lines.append(
+                f"CM{result.cm_name} cavity {result.cav_num}:"
+                f" {result.error or result.message}"
+            )
+        return "\n".join(lines)
+
+
+class SetupEngine:
+    """
+    Runs SetupCavity.setup()/shut_down() for many cavities on one worker pool.
+    Admission happens here rather than in the workers so the per cryomodule
+    limit holds for thread and process pools alike.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_per_cryomodule: Optional[int] = None,
+        use_processes: bool = False,
+        resume: bool = False,
+    ):
+        """
+        :param max_workers: size of the worker pool
+        :param max_per_cryomodule: how many cavities in one cryomodule may run
+                                   at once (e.g. for cryoplant heat load or RF
+                                   station limits), unlimited if None
+        :param use_processes: run on a process pool instead of threads
+        :param resume: skip setup stages whose checkpoints are still valid
+        """
+        self.max_workers = max_workers
+        self.max_per_cryomodule = max_per_cryomodule
+        self.use_processes = use_processes
+        self.resume = resume
+
+    def _make_executor(self) -> Executor:
+        if self.use_processes:
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+    def _submit(
+        self, executor: Executor, cavity: SetupCavity, shutdown: bool
+    ) -> Future:
+        if self.use_processes:
+            return executor.submit(
+                _run_cavity_by_name,
+                cavity.cryomodule.name,
+                cavity.number,
+                shutdown,
+                self.resume,
+            )
+        return executor.submit(run_cavity, cavity, shutdown, self.resume)
+
+    def run(self, cavities: Iterable[SetupCavity], shutdown=False) -> SetupReport:
+        pending: Dict[str, Deque[SetupCavity]] = defaultdict(deque)
+        for cavity in cavities:
+            pending[cavity.cryomodule.name].append(cavity)
+
+        total = sum(len(queue) for queue in pending.values())
+        results: List[CavityResult] = []
+        if not total:
+            return SetupReport(results=results, duration=0)
+
+        finished = Event()
+        lock = RLock()
+        start = perf_counter()
+
+        if not self.use_processes:
+            PV_REGISTRY.connect(
+                [
+                    pv
+                    for queue in pending.values()
+                    for cavity in queue
+                    for pv in cavity.auto_pv_objs
+                ]
+            )
+
+        with self._make_executor() as executor:
+
+            def add_result(result: CavityResult):
+                results.append(result)
+                if len(results) == total:
+                    finished.set()
+
+            def submit_next(cm_name: str):
+                # A cavity that can not be submitted (e.g. the pool is broken)
+                # fails straight away and its slot goes to the next one.
+                # Raising here would be lost in a done callback and leave
+                # finished unset.
+                while pending[cm_name]:
+                    cavity = pending[cm_name].popleft()
+                    submitted = perf_counter()
+                    try:
+                        future = self._submit(executor, cavity, shutdown)
+                    except Exception as e:
+                        add_result(self._failed_result(cavity, submitted, e))
+                        continue
+                    future.add_done_callback(
+                        lambda f: on_done(cm_name, cavity, submitted, f)
+                    )
+                    return
+
+            def on_done(cm_name: str, cavity: SetupCavity, submitted, future):
+                with lock:
+                    add_result(self._result(cavity, submitted, future))
+                    submit_next(cm_name)
+
+            with lock:
+                for cm_name, queue in pending.items():
+                    limit = self.max_per_cryomodule or len(queue)
+                    # A cavity that finishes straight away submits the next
+                    # one itself, so check the queue on every iteration
+                    for _ in range(limit):
+                        if not queue:
+                            break
+                        submit_next(cm_name)
+
+            finished.wait()
+
+        return SetupReport(results=results, duration=perf_counter() - start)
+
+    @classmethod
+    def _result(cls, cavity: SetupCavity, submitted: float, future: Future):
+        try:
+            status, message = future.result()
+        except Exception as e:
+            return cls._failed_result(cavity, submitted, e)
+        return CavityResult(
+            cm_name=cavity.cryomodule.name,
+            cav_num=cavity.number,
+            status=status,
+            message=message,
+            duration=perf_counter() - submitted,
+        )
+
+    @staticmethod
+    def _failed_result(cavity: SetupCavity, submitted: float, error: Exception):
+        return CavityResult(
+            cm_name=cavity.cryomodule.name,
+            cav_num=cavity.number,
+            status=STATUS_ERROR_VALUE,
+            message=str(error),
+            duration=perf_counter() - submitted,
+            error=error,
+        )
+
+    async def run_async(
+        self, cavities: Iterable[SetupCavity], shutdown=False
+    ) -> SetupReport:
+        """
+        Drives every cavity's async setup/shutdown from the running event loop.
+        Blocking hardware calls go to setup_linac.stage_executor, so at most
+        STAGE_WORKERS cavities are in a stage at once and max_workers does not
+        apply here.
+        """
+        cavities = list(cavities)
+        limits: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.max_per_cryomodule or len(cavities))
+        )
+        loop = asyncio.get_running_loop()
+        start = perf_counter()
+
+        async def run_one(cavity: SetupCavity):
+            if shutdown:
+                await cavity.async_shut_down()
+            else:
+                cavity.resume = self.resume
+                await cavity.async_setup()
+            return await loop.run_in_executor(
+                stage_executor(),
+                lambda: (cavity.status, cavity.status_msg_pv_obj.get(as_string=True)),
+            )
+
+        async def admit(cavity: SetupCavity) -> CavityResult:
+            async with limits[cavity.cryomodule.name]:
+                submitted = perf_counter()
+                task = asyncio.ensure_future(run_one(cavity))
+                await asyncio.wait([task])
+                return self._result(cavity, submitted, task)
+
+        results = await asyncio.gather(*(admit(cavity) for cavity in cavities))
+        return SetupReport(results=list(results), duration=perf_counter() - start)
+
+    def run_cryomodules(self, cm_names: Iterable[str], shutdown=False) -> SetupReport:
+        return self.run(
+            (
+                cavity
+                for cm_name in cm_names
+                for cavity in SETUP_MACHINE.cryomodules[cm_name].cavities.values()
+            ),
+            shutdown=shutdown,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument(
+        "--cryomodule",
+        "-cm",
+        choices=ALL_CRYOMODULES,
+        help=f"Cryomodule name as a string",
+    )
+    scope.add_argument(
+        "--linac", "-l", choices=range(4), type=int, help=f"Linac number as an int"
+    )
+    scope.add_argument(
+        "--machine", "-m", action="store_true", help="Set up the whole machine"
+    )
+    parser.add_argument(
+        "--no_hl", "-no_hl", action="store_true", help="Exclude HLs from setup script"
+    )
+    parser.add_argument(
+        "--shutdown", "-off", action="store_true", help="Turn off cavity and SSA"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=DEFAULT_MAX_WORKERS, help="Pool size"
+    )
+    parser.add_argument(
+        "--max_per_cm",
+        type=int,
+        default=None,
+        help="Maximum number of cavities per cryomodule running at once",
+    )
+    parser.add_argument(
+        "--max_ramp_rate",
+        type=float,
+        default=None,
+        help="Ramp cavities together, limiting the summed ramp rate to this MV/s",
+    )
+    parser.add_argument(
+        "--max_ramping",
+        type=int,
+        default=None,
+        help="Ramp cavities together, at most this many at once",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip setup stages still valid from an earlier (failed) run",
+    )
+    parser.add_argument(
+        "--processes", action="store_true", help="Use a process pool instead of threads"
+    )
+
+    args = parser.parse_args()
+    print(args)
+
+    if args.cryomodule:
+        cryomodules = [args.cryomodule]
+    elif args.linac is not None:
+        cryomodules = LINAC_CM_DICT[args.linac]
+    else:
+        cryomodules = ALL_CRYOMODULES_NO_HL if args.no_hl else ALL_CRYOMODULES
+
+    if args.max_ramp_rate or args.max_ramping:
+        if args.processes:
+            parser.error("Coordinated ramping needs the cavities in one process")
+        RampEngine(max_rate=args.max_ramp_rate, max_active=args.max_ramping).attach(
+            cavity
+            for cm_name in cryomodules
+            for cavity in SETUP_MACHINE.cryomodules[cm_name].cavities.values()
+        )
+
+    engine = SetupEngine(
+        max_workers=args.workers,
+        max_per_cryomodule=args.max_per_cm,
+        use_processes=args.processes,
+        resume=args.resume,
+    )
+    print(engine.run_cryomodules(cryomodules, shutdown=args.shutdown).summary())
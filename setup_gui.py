@@ -1,13 +1,16 @@
 import dataclasses
-from typing import Dict, List, Optional
+from concurrent.futures import Future
+from functools import partial
+from typing import Any, Dict, List, Optional
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (
     QCheckBox,
     QGridLayout,
     QGroupBox,
     QHBoxLayout,
     QLabel,
+    QMessageBox,
     QPushButton,
     QSizePolicy,
     QTabWidget,
@@ -15,16 +18,30 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 from edmbutton import PyDMEDMDisplayButton
-from epics import camonitor
 from pydm import Display
 from pydm.widgets import PyDMLabel
+from pydm.widgets.base import PyDMWidget
 from pydm.widgets.analog_indicator import PyDMAnalogIndicator
 from pydm.widgets.display_format import DisplayFormat
 
-from lcls_tools.common.controls.pyepics.utils import PV
 from lcls_tools.common.frontend.display.util import ERROR_STYLESHEET
 from lcls_tools.superconducting import sc_linac_utils
-from setup_linac import SETUP_MACHINE, SetupCavity, SetupCryomodule, SetupLinac
+from gui_actions import ActionRunner
+from pv_registry import PV_REGISTRY
+from readback_aggregator import ReadbackAggregator
+from setup_linac import (
+    SETUP_MACHINE,
+    AutoLinacObject,
+    SetupCavity,
+    SetupCryomodule,
+    SetupLinac,
+    capture_acons,
+)
+from status_summary import StatusSummaryWidget
+from status_table import StatusTable
+
+# Disconnect the channels of cryomodule tabs that are not on screen
+PAUSE_HIDDEN_TABS_ARG = "--pause_hidden_tabs"
 
 
 @dataclasses.dataclass
@@ -33,6 +50,61 @@ class Settings:
     auto_tune_checkbox: QCheckBox
     cav_char_checkbox: QCheckBox
     rf_ramp_checkbox: QCheckBox
+    pause_hidden_tabs: bool = False
+    # Run the button actions off the GUI thread, aborts on their own pool so
+    # they never queue behind actions stuck on a slow IOC
+    action_runner: ActionRunner = dataclasses.field(default_factory=ActionRunner)
+    abort_runner: ActionRunner = dataclasses.field(default_factory=ActionRunner)
+
+    def setup_options(self) -> Dict[str, bool]:
+        """
+        Read on the GUI thread, the checkboxes are not safe to touch from the
+        action threads
+        :return: requested setup stages keyed by their AUTO: PV field
+        """
+        return {
+            "ssa_cal_requested_pv_obj": self.ssa_cal_checkbox.isChecked(),
+            "auto_tune_requested_pv_obj": self.auto_tune_checkbox.isChecked(),
+            "cav_char_requested_pv_obj": self.cav_char_checkbox.isChecked(),
+            "rf_ramp_requested_pv_obj": self.rf_ramp_checkbox.isChecked(),
+        }
+
+
+def report_failure(parent: QWidget, action: str, outcome: Any):
+    """
+    on_done for actions without a result: only an exception is reported
+    """
+    if isinstance(outcome, Exception):
+        print(f"{action} failed: {outcome}")
+        QMessageBox.warning(parent, action, f"{action} failed: {outcome}")
+
+
+def start_setup(obj: AutoLinacObject, options: Dict[str, bool]):
+    """
+    Writes the requested setup stages and triggers the setup, run as an action
+    """
+    obj.put_auto_pvs(options)
+    obj.trigger_setup()
+
+
+def report_acon_capture(parent: QWidget, name: str, outcome: Any):
+    """
+    on_done for an ACON capture: outcome is the capture's per cavity failures
+    or the exception it raised
+    """
+    if isinstance(outcome, Exception):
+        report_failure(parent, f"{name} ACON capture", outcome)
+        return
+    elif outcome:
+        details = "\n".join(f"{cavity}: {reason}" for cavity, reason in outcome.items())
+    else:
+        print(f"{name} ACON captured")
+        return
+
+    print(f"{name} ACON capture failed:\n{details}")
+    QMessageBox.warning(
+        parent, f"{name} ACON capture", f"ACON not captured for:\n{details}"
+    )
 
 
 @dataclasses.dataclass
@@ -101,8 +173,23 @@ class GUICavity:
         self.note_label.alarmSensitiveBorder = True
         self.note_label.alarmSensitiveContent = True
     
+    @property
+    def pydm_widgets(self) -> List[PyDMWidget]:
+        return [
+            self.aact_readback_label,
+            self.acon_label,
+            self.status_label,
+            self.progress_bar,
+            self.note_label,
+        ]
+    
     def request_stop(self):
-        self.cavity.request_abort()
+        self.settings.abort_runner.run(
+            self.abort_button,
+            self.cavity.request_abort,
+            on_done=partial(report_failure, self.parent, f"{self.cavity} abort"),
+            busy_text="Aborting...",
+        )
     
     @property
     def cavity(self) -> SetupCavity:
@@ -113,12 +200,34 @@ class GUICavity:
         return self._cavity
     
     def trigger_shutdown(self):
+        self.settings.action_runner.run(
+            self.shutdown_button,
+            self.start_shutdown,
+            on_done=partial(report_failure, self.parent, f"{self.cavity} shutdown"),
+            busy_text="Turning Off...",
+        )
+    
+    def trigger_setup(self):
+        self.settings.action_runner.run(
+            self.setup_button,
+            partial(self.start_setup, self.settings.setup_options()),
+            on_done=partial(report_failure, self.parent, f"{self.cavity} setup"),
+            busy_text="Starting...",
+        )
+    
+    def start_shutdown(self):
+        """
+        Runs on an action thread
+        """
         if self.cavity.script_is_running:
             self.cavity.status_message = f"{self.cavity} script already running"
             return
         self.cavity.trigger_shutdown()
     
-    def trigger_setup(self):
+    def start_setup(self, options: Dict[str, bool]):
+        """
+        Runs on an action thread
+        """
         if self.cavity.script_is_running:
             self.cavity.status_message = f"{self.cavity} script already running"
             return
@@ -126,14 +235,7 @@ class GUICavity:
             self.cavity.status_message = f"{self.cavity} not online, skipping"
             return
         else:
-            self.cavity.ssa_cal_requested = self.settings.ssa_cal_checkbox.isChecked()
-            self.cavity.auto_tune_requested = (
-                self.settings.auto_tune_checkbox.isChecked()
-            )
-            self.cavity.cav_char_requested = self.settings.cav_char_checkbox.isChecked()
-            self.cavity.rf_ramp_requested = self.settings.rf_ramp_checkbox.isChecked()
-            
-            self.cavity.trigger_setup()
+            start_setup(self.cavity, options)
 
 
 @dataclasses.dataclass
@@ -178,16 +280,52 @@ class GUICryomodule:
                     parent=self.parent,
             )
             self.gui_cavities[cav_num] = gui_cavity
+        
+        self._channels_connected: bool = True
+    
+    def set_channels_connected(self, connected: bool):
+        """
+        Disconnects (or reconnects) the CA channels of this cryomodule's
+        widgets, used to pause tabs that are not on screen
+        """
+        if connected == self._channels_connected:
+            return
+        self._channels_connected = connected
+        
+        pydm_widgets: List[PyDMWidget] = [self.readback_label]
+        for gui_cavity in self.gui_cavities.values():
+            pydm_widgets.extend(gui_cavity.pydm_widgets)
+        
+        for widget in pydm_widgets:
+            for channel in widget.channels() or []:
+                if connected:
+                    channel.connect()
+                else:
+                    channel.disconnect()
     
     def capture_acon(self):
-        for cavity_widget in self.gui_cavities.values():
-            cavity_widget.cavity.capture_acon()
+        self.settings.action_runner.run(
+            self.acon_button,
+            self.cryomodule_object.capture_acon,
+            on_done=partial(report_acon_capture, self.parent, f"CM{self.name}"),
+            busy_text="Capturing ACON...",
+        )
     
     def trigger_shutdown(self):
-        self.cryomodule_object.trigger_shutdown()
+        self.settings.action_runner.run(
+            self.turn_off_button,
+            self.cryomodule_object.trigger_shutdown,
+            on_done=partial(report_failure, self.parent, f"CM{self.name} shutdown"),
+            busy_text="Turning Off...",
+        )
     
     def request_stop(self):
-        self.cryomodule_object.request_abort()
+        self.settings.abort_runner.run(
+            self.abort_button,
+            self.cryomodule_object.request_abort,
+            on_done=partial(report_failure, self.parent, f"CM{self.name} abort"),
+            busy_text="Aborting...",
+        )
     
     @property
     def cryomodule_object(self) -> SetupCryomodule:
@@ -196,20 +334,12 @@ class GUICryomodule:
         return self._cryomodule
     
     def trigger_setup(self):
-        self.cryomodule_object.ssa_cal_requested = (
-            self.settings.ssa_cal_checkbox.isChecked()
-        )
-        self.cryomodule_object.auto_tune_requested = (
-            self.settings.auto_tune_checkbox.isChecked()
-        )
-        self.cryomodule_object.cav_char_requested = (
-            self.settings.cav_char_checkbox.isChecked()
+        self.settings.action_runner.run(
+            self.setup_button,
+            partial(start_setup, self.cryomodule_object, self.settings.setup_options()),
+            on_done=partial(report_failure, self.parent, f"CM{self.name} setup"),
+            busy_text="Starting...",
         )
-        self.cryomodule_object.rf_ramp_requested = (
-            self.settings.rf_ramp_checkbox.isChecked()
-        )
-        
-        self.cryomodule_object.trigger_setup()
 
 
 @dataclasses.dataclass
@@ -247,9 +377,13 @@ class Linac:
         self.cryomodules: List[GUICryomodule] = []
         self.cm_tab_widget: QTabWidget = QTabWidget()
         self.gui_cryomodules: Dict[str, GUICryomodule] = {}
+        self.cm_pages: Dict[str, QWidget] = {}
         
+        # Only empty pages are made here, the cryomodule widgets (and their
+        # channels) are built the first time a tab is shown
         for cm_name in self.cryomodule_names:
-            self.add_cm_tab(cm_name)
+            self.add_cm_page(cm_name)
+        self.cm_tab_widget.currentChanged.connect(self.show_cm_tab)
     
     @property
     def linac_object(self):
@@ -258,31 +392,71 @@ class Linac:
         return self._linac_object
     
     def request_stop(self):
-        self.linac_object.request_abort()
+        self.settings.abort_runner.run(
+            self.abort_button,
+            self.linac_object.request_abort,
+            on_done=partial(report_failure, self.parent, f"{self.name} abort"),
+            busy_text="Aborting...",
+        )
     
     def trigger_shutdown(self):
-        self.linac_object.trigger_shutdown()
+        # No button of its own
+        self.settings.action_runner.run(
+            None,
+            self.linac_object.trigger_shutdown,
+            on_done=partial(report_failure, self.parent, f"{self.name} shutdown"),
+        )
     
     def trigger_setup(self):
-        self.linac_object.ssa_cal_requested = self.settings.ssa_cal_checkbox.isChecked()
-        self.linac_object.auto_tune_requested = (
-            self.settings.auto_tune_checkbox.isChecked()
+        self.settings.action_runner.run(
+            self.setup_button,
+            partial(start_setup, self.linac_object, self.settings.setup_options()),
+            on_done=partial(report_failure, self.parent, f"{self.name} setup"),
+            busy_text="Starting...",
         )
-        self.linac_object.cav_char_requested = (
-            self.settings.cav_char_checkbox.isChecked()
-        )
-        self.linac_object.rf_ramp_requested = self.settings.rf_ramp_checkbox.isChecked()
-        self.linac_object.trigger_setup()
     
     def capture_acon(self):
-        for gui_cm in self.gui_cryomodules.values():
-            gui_cm.capture_acon()
+        # Cover cryomodules whose tabs have not been built yet, and only this
+        # tab's cryomodules (L1B and L1BHL share a SetupLinac)
+        self.settings.action_runner.run(
+            self.acon_button,
+            lambda: capture_acons(
+                cavity
+                for cm_name in self.cryomodule_names
+                for cavity in SETUP_MACHINE.cryomodules[cm_name].cavities.values()
+            ),
+            on_done=partial(report_acon_capture, self.parent, self.name),
+            busy_text="Capturing ACON...",
+        )
     
-    def add_cm_tab(self, cm_name: str):
+    def show(self):
+        self.show_cm_tab(self.cm_tab_widget.currentIndex())
+    
+    def hide(self):
+        if self.settings.pause_hidden_tabs:
+            for gui_cryomodule in self.gui_cryomodules.values():
+                gui_cryomodule.set_channels_connected(False)
+    
+    def show_cm_tab(self, index: int):
+        if index < 0:
+            return
+        
+        shown_cm_name = self.cryomodule_names[index]
+        if shown_cm_name not in self.gui_cryomodules:
+            self.add_cm_tab(shown_cm_name)
+        
+        if self.settings.pause_hidden_tabs:
+            for cm_name, gui_cryomodule in self.gui_cryomodules.items():
+                gui_cryomodule.set_channels_connected(cm_name == shown_cm_name)
+    
+    def add_cm_page(self, cm_name: str):
         page: QWidget = QWidget()
-        vlayout: QVBoxLayout = QVBoxLayout()
-        page.setLayout(vlayout)
+        page.setLayout(QVBoxLayout())
         self.cm_tab_widget.addTab(page, f"CM{cm_name}")
+        self.cm_pages[cm_name] = page
+    
+    def add_cm_tab(self, cm_name: str):
+        vlayout: QVBoxLayout = self.cm_pages[cm_name].layout()
         
         gui_cryomodule = GUICryomodule(
                 linac_idx=self.idx, name=cm_name, settings=self.settings, parent=self.parent
@@ -353,6 +527,9 @@ class SetupGUI(Display):
                 auto_tune_checkbox=self.ui.autotune_checkbox,
                 cav_char_checkbox=self.ui.cav_char_checkbox,
                 rf_ramp_checkbox=self.ui.rf_ramp_checkbox,
+                pause_hidden_tabs=PAUSE_HIDDEN_TABS_ARG in (args or []),
+                action_runner=ActionRunner(parent=self),
+                abort_runner=ActionRunner(parent=self),
         )
         self.linac_widgets: List[Linac] = []
         for linac_idx in range(0, 4):
@@ -373,13 +550,27 @@ class SetupGUI(Display):
                 ),
         )
         
-        self.linac_aact_pvs: List[PV] = [
-            PV(f"ACCL:L{i}B:1:AACTMEANSUM") for i in range(4)
-        ]
-        self.update_readback()
+        self.readback_aggregator = ReadbackAggregator(
+                [PV_REGISTRY.get_pv(f"ACCL:L{i}B:1:AACTMEANSUM") for i in range(4)],
+                parent=self,
+        )
+        self.readback_aggregator.updated.connect(self.update_readback)
+        self.readback_aggregator.start()
         
         linac_tab_widget: QTabWidget = self.ui.tabWidget_linac
         
+        # One widget showing every cavity, updated from monitors. Subscribing
+        # builds every cryomodule and opens ~1200 channels, so it is started
+        # from the event loop on a worker thread and never holds up the first
+        # frame
+        self.status_table = StatusTable(sc_linac_utils.ALL_CRYOMODULES)
+        self.status_subscription: Optional[Future] = None
+        QTimer.singleShot(0, self.subscribe_status_table)
+        self.status_summary = StatusSummaryWidget(self.status_table, parent=self)
+        self.ui.verticalLayout.insertWidget(
+                self.ui.verticalLayout.indexOf(linac_tab_widget), self.status_summary
+        )
+        
         for linac in self.linac_widgets:
             page: QWidget = QWidget()
             vlayout: QVBoxLayout = QVBoxLayout()
@@ -397,25 +588,47 @@ class SetupGUI(Display):
             
             vlayout.addLayout(hlayout)
             vlayout.addWidget(linac.cm_tab_widget)
-            camonitor(linac.aact_pv, callback=self.update_readback)
+        
+        linac_tab_widget.currentChanged.connect(self.show_linac_tab)
+        self.show_linac_tab(linac_tab_widget.currentIndex())
+    
+    def subscribe_status_table(self):
+        self.status_subscription = self.settings.action_runner.run(
+            None,
+            partial(self.status_table.subscribe, SETUP_MACHINE),
+            on_done=partial(report_failure, self, "Status table subscription"),
+        )
+    
+    def show_linac_tab(self, index: int):
+        for linac_idx, linac in enumerate(self.linac_widgets):
+            if linac_idx == index:
+                linac.show()
+            else:
+                linac.hide()
     
-    def update_readback(self, **kwargs):
-        readback = 0
-        for linac_aact_pv in self.linac_aact_pvs:
-            readback += linac_aact_pv.get()
+    def update_readback(self, readback: float):
         self.ui.machine_readback_label.setText(f"{readback:.2f} MV")
     
     def trigger_setup(self):
-        SETUP_MACHINE.ssa_cal_requested = self.settings.ssa_cal_checkbox.isChecked()
-        SETUP_MACHINE.auto_tune_requested = self.settings.auto_tune_checkbox.isChecked()
-        SETUP_MACHINE.cav_char_requested = self.settings.cav_char_checkbox.isChecked()
-        SETUP_MACHINE.rf_ramp_requested = self.settings.rf_ramp_checkbox.isChecked()
-        SETUP_MACHINE.trigger_setup()
-    
-    @staticmethod
-    def trigger_shutdown():
-        SETUP_MACHINE.trigger_shutdown()
-    
-    @staticmethod
-    def request_stop():
-        SETUP_MACHINE.request_abort()
+        self.settings.action_runner.run(
+            self.ui.machine_setup_button,
+            partial(start_setup, SETUP_MACHINE, self.settings.setup_options()),
+            on_done=partial(report_failure, self, "Machine setup"),
+            busy_text="Starting...",
+        )
+    
+    def trigger_shutdown(self):
+        self.settings.action_runner.run(
+            self.ui.machine_shutdown_button,
+            SETUP_MACHINE.trigger_shutdown,
+            on_done=partial(report_failure, self, "Machine shutdown"),
+            busy_text="Turning Off...",
+        )
+    
+    def request_stop(self):
+        self.settings.abort_runner.run(
+            self.ui.machine_abort_button,
+            SETUP_MACHINE.request_abort,
+            on_done=partial(report_failure, self, "Machine abort"),
+            busy_text="Aborting...",
+        )
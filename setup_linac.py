@@ -1,6 +1,12 @@
-from time import sleep
-from typing import Optional
-
+import asyncio
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from threading import RLock, local
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
 from epics.ca import CASeverityException
 
 from lcls_tools.common.controls.pyepics.utils import PV, PVInvalidError
@@ -13,70 +19,284 @@ from lcls_tools.superconducting.sc_linac import (
 )
 from lcls_tools.superconducting.sc_linac_utils import (RF_MODE_SELA, SCLinacObject)
 
+from auto_pv import AutoPV, AutoPVMeta, auto_pv_fields
+from calibration_cache import CalibrationCache
+from checkpoint import CavityCheckpoint
+from pv_registry import PV_REGISTRY
+from pv_wait import AbortToken, PVCondition, PVWaitAbortedError, PVWaitTimeoutError
+from stage_timer import StageTimer
+from status_publisher import StatusPublisher
+
 STATUS_READY_VALUE = 0
 STATUS_RUNNING_VALUE = 1
 STATUS_ERROR_VALUE = 2
 
+# Snapshot column and the cavity PV it is read from
+SNAPSHOT_PVS: Dict[str, str] = {
+    "status": "status_pv_obj",
+    "progress": "progress_pv_obj",
+    "status_message": "status_msg_pv_obj",
+    "ssa_cal_requested": "ssa_cal_requested_pv_obj",
+    "auto_tune_requested": "auto_tune_requested_pv_obj",
+    "cav_char_requested": "cav_char_requested_pv_obj",
+    "rf_ramp_requested": "rf_ramp_requested_pv_obj",
+}
+# Char waveforms, read as strings rather than arrays of char codes
+SNAPSHOT_STRINGS = {"status_message"}
+# One row per cavity; connected is False if any of its PVs could not be read,
+# in which case those columns keep NaN/None/False
+SNAPSHOT_DTYPE = np.dtype(
+    [
+        ("cryomodule", "U3"),
+        ("cavity", "i1"),
+        ("connected", "?"),
+        ("status", "f8"),
+        ("progress", "f8"),
+        ("status_message", "O"),
+        ("ssa_cal_requested", "?"),
+        ("auto_tune_requested", "?"),
+        ("cav_char_requested", "?"),
+        ("rf_ramp_requested", "?"),
+    ]
+)
+
+SHUTDOWN_ERRORS = (CASeverityException, sc_linac_utils.CavityAbortError)
+
+SETUP_ERRORS = (
+    sc_linac_utils.StepperError,
+    sc_linac_utils.DetuneError,
+    sc_linac_utils.SSACalibrationError,
+    PVInvalidError,
+    sc_linac_utils.QuenchError,
+    sc_linac_utils.CavityQLoadedCalibrationError,
+    sc_linac_utils.CavityScaleFactorCalibrationError,
+    sc_linac_utils.SSAFaultError,
+    sc_linac_utils.StepperAbortError,
+    sc_linac_utils.CavityHWModeError,
+    sc_linac_utils.CavityFaultError,
+    sc_linac_utils.CavityAbortError,
+    CASeverityException,
+    PVWaitAbortedError,
+    PVWaitTimeoutError,
+)
+
+# Setup stages timed by SetupCavity, each published to AUTO:TIME_<STAGE>
+TIMED_STAGES = (
+    "turn_off",
+    "ssa_on",
+    "reset_interlocks",
+    "ssa_cal",
+    "tune",
+    "characterize",
+    "ramp_start",
+    "sela_wait",
+    "ramp_finish",
+)
+TIMING_TOTAL = "total"
+
+# Checkpointed stages (see checkpoint.py), the request flag that makes each
+# one do any work and the progress it leaves the cavity at
+CHECKPOINT_REQUESTS = {
+    "ssa_cal": "ssa_cal_requested",
+    "tune": "auto_tune_requested",
+    "characterize": "cav_char_requested",
+}
+CHECKPOINT_PROGRESS = {"ssa_cal": 25, "tune": 50, "characterize": 75}
+
+# Threads running the blocking stages of async setups and shutdowns, each
+# running stage holds one. Enough for every cavity in the machine at once.
+STAGE_WORKERS = len(sc_linac_utils.ALL_CRYOMODULES) * 8
+
+_thread_loops = local()
+
+
+@lru_cache(maxsize=None)
+def stage_executor() -> ThreadPoolExecutor:
+    """
+    Executor shared by every SetupCavity._in_executor call (rather than each
+    event loop's default executor, which is capped at min(32, cpus + 4)
+    threads), so that STAGE_WORKERS cavities can be in a stage at once
+    """
+    return ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+
+def run_coroutine(coro):
+    """
+    Runs a coroutine to completion from synchronous code on an event loop
+    kept (and reused) per thread. When called from a coroutine the caller's
+    loop is busy, so it runs on a loop in a separate thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        with ThreadPoolExecutor(max_workers=1) as runner:
+            return runner.submit(asyncio.run, coro).result()
+
+    loop = getattr(_thread_loops, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _thread_loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
+
+
+class LazyDict(MutableMapping):
+    """
+    Mapping whose values are only built (and then cached) the first time
+    they are looked up. Iteration order follows the order of the builders.
+    """
+
+    def __init__(self, builders: Dict[Hashable, Callable[[], Any]]):
+        self._builders: Dict[Hashable, Optional[Callable[[], Any]]] = dict(builders)
+        self._values: Dict[Hashable, Any] = {}
+        self._lock = RLock()
+
+    def is_built(self, key) -> bool:
+        return key in self._values
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if key not in self._values:
+                builder = self._builders[key]
+                self._values[key] = builder()
+            return self._values[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._builders.setdefault(key, None)
+            self._values[key] = value
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._builders[key]
+            self._values.pop(key, None)
+
+    def __iter__(self):
+        return iter(self._builders)
+
+    def __len__(self):
+        return len(self._builders)
+
+    def __contains__(self, key):
+        return key in self._builders
+
+
+class AutoLinacObject(SCLinacObject, metaclass=AutoPVMeta):
+    # Slots rather than __dict__ entries for the per instance state (the
+    # AutoPV slots are added by AutoPVMeta); the lcls_tools base classes
+    # still give instances a __dict__ of their own
+    __slots__ = ("_abort_token",)
+
+    abort_pv_obj = AutoPV("ABORT")
+    off_stop_pv_obj = AutoPV("OFFSTOP")
+    shutoff_pv_obj = AutoPV("OFFSTRT")
+    start_pv_obj = AutoPV("SETUPSTRT")
+    stop_pv_obj = AutoPV("SETUPSTOP")
+    ssa_cal_requested_pv_obj = AutoPV("SETUP_SSAREQ", bool)
+    auto_tune_requested_pv_obj = AutoPV("SETUP_TUNEREQ", bool)
+    cav_char_requested_pv_obj = AutoPV("SETUP_CHARREQ", bool)
+    rf_ramp_requested_pv_obj = AutoPV("SETUP_RAMPREQ", bool)
 
-class AutoLinacObject(SCLinacObject):
     def auto_pv_addr(self, suffix: str):
         return self.pv_addr("AUTO:" + suffix)
 
     def __init__(self):
-        self.abort_pv: str = self.auto_pv_addr("ABORT")
-        self._abort_pv_obj: Optional[PV] = None
-
-        self.off_stop_pv: str = self.auto_pv_addr("OFFSTOP")
-        self._off_stop_pv_obj: Optional[PV] = None
-
-        self.shutoff_pv: str = self.auto_pv_addr("OFFSTRT")
-        self._shutoff_pv_obj: Optional[PV] = None
-
-        self.start_pv: str = self.auto_pv_addr("SETUPSTRT")
-        self._start_pv_obj: Optional[PV] = None
-
-        self.stop_pv: str = self.auto_pv_addr("SETUPSTOP")
-        self._stop_pv_obj: Optional[PV] = None
-
-        self.ssa_cal_requested_pv: str = self.auto_pv_addr("SETUP_SSAREQ")
-        self._ssa_cal_requested_pv_obj: Optional[PV] = None
-
-        self.auto_tune_requested_pv: str = self.auto_pv_addr("SETUP_TUNEREQ")
-        self._auto_tune_requested_pv_obj: Optional[PV] = None
-
-        self.cav_char_requested_pv: str = self.auto_pv_addr("SETUP_CHARREQ")
-        self._cav_char_requested_pv_obj: Optional[PV] = None
-
-        self.rf_ramp_requested_pv: str = self.auto_pv_addr("SETUP_RAMPREQ")
-        self._rf_ramp_requested_pv_obj: Optional[PV] = None
+        for field in auto_pv_fields(type(self)):
+            setattr(self, field, None)
+        self._abort_token: Optional[AbortToken] = None
 
     @property
-    def start_pv_obj(self) -> PV:
-        if not self._start_pv_obj:
-            self._start_pv_obj = PV(self.start_pv)
-        return self._start_pv_obj
+    def abort_token(self) -> AbortToken:
+        if not self._abort_token:
+            self._abort_token = AbortToken(self.abort_pv_obj)
+            self._abort_token.add_listener(self.on_abort_requested)
+        return self._abort_token
+
+    def on_abort_requested(self):
+        """
+        Called from the CA callback thread as soon as an abort comes in
+        """
+        pass
 
     @property
-    def stop_pv_obj(self) -> PV:
-        if not self._stop_pv_obj:
-            self._stop_pv_obj = PV(self.stop_pv)
-        return self._stop_pv_obj
-
-    @property
-    def shutoff_pv_obj(self) -> PV:
-        if not self._shutoff_pv_obj:
-            self._shutoff_pv_obj = PV(self.shutoff_pv)
-        return self._shutoff_pv_obj
+    def abort_requested(self):
+        return self.abort_token.is_set
 
     @property
-    def abort_pv_obj(self):
-        if not self._abort_pv_obj:
-            self._abort_pv_obj = PV(self.abort_pv)
-        return self._abort_pv_obj
+    def auto_pv_objs(self) -> List[PV]:
+        return [getattr(self, field) for field in auto_pv_fields(type(self))]
+
+    def connect_auto_pvs(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Connects all of this object's AUTO: PVs in one batch
+        :return: names of the PVs that did not connect in time
+        """
+        return PV_REGISTRY.connect(self.auto_pv_objs, timeout=timeout)
+
+    def snapshot_auto_pvs(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Reads all of this object's AUTO: PVs in one batch
+        :return: values keyed by the *_pv_obj attribute name
+        """
+        fields = auto_pv_fields(type(self))
+        values = PV_REGISTRY.get_many(
+            [getattr(self, field) for field in fields], timeout=timeout
+        )
+        return dict(zip(fields, values))
+
+    def put_auto_pvs(self, values: Dict[str, Any], wait: bool = True):
+        """
+        Writes several of this object's AUTO: PVs in one batch
+        :param values: keyed by the *_pv_obj attribute name
+        """
+        PV_REGISTRY.put_many(
+            {getattr(self, field): value for field, value in values.items()},
+            wait=wait,
+        )
 
     @property
-    def abort_requested(self):
-        return bool(self.abort_pv_obj.get())
+    def setup_option_pv_objs(self) -> List[PV]:
+        return [
+            self.ssa_cal_requested_pv_obj,
+            self.auto_tune_requested_pv_obj,
+            self.cav_char_requested_pv_obj,
+            self.rf_ramp_requested_pv_obj,
+        ]
+
+    def propagate_setup_options(
+        self, children: Iterable["AutoLinacObject"], trigger: bool = True
+    ):
+        """
+        Copies this object's setup request flags to every child with one batch
+        of gets and one batch of puts, then optionally triggers all of them
+        """
+        children = list(children)
+        options = PV_REGISTRY.get_many(self.setup_option_pv_objs)
+        PV_REGISTRY.put_many(
+            {
+                child_pv: option
+                for child in children
+                for child_pv, option in zip(child.setup_option_pv_objs, options)
+            }
+        )
+        if trigger:
+            self.trigger_setups(children)
+
+    @staticmethod
+    def trigger_setups(children: Iterable["AutoLinacObject"]):
+        # Like a button press, only the puts need to go out, not complete
+        PV_REGISTRY.put_many({child.start_pv_obj: 1 for child in children}, wait=False)
+
+    @staticmethod
+    def trigger_shutdowns(children: Iterable["AutoLinacObject"]):
+        PV_REGISTRY.put_many(
+            {child.shutoff_pv_obj: 1 for child in children}, wait=False
+        )
 
     def clear_abort(self):
         raise NotImplementedError
@@ -93,64 +313,24 @@ class AutoLinacObject(SCLinacObject):
     def kill_setup(self):
         self.stop_pv_obj.put(1)
 
-    @property
-    def ssa_cal_requested_pv_obj(self):
-        if not self._ssa_cal_requested_pv_obj:
-            self._ssa_cal_requested_pv_obj = PV(self.ssa_cal_requested_pv)
-        return self._ssa_cal_requested_pv_obj
-
-    @property
-    def ssa_cal_requested(self):
-        return bool(self.ssa_cal_requested_pv_obj.get())
-
-    @ssa_cal_requested.setter
-    def ssa_cal_requested(self, value: bool):
-        self.ssa_cal_requested_pv_obj.put(value)
-
-    @property
-    def auto_tune_requested_pv_obj(self):
-        if not self._auto_tune_requested_pv_obj:
-            self._auto_tune_requested_pv_obj = PV(self.auto_tune_requested_pv)
-        return self._auto_tune_requested_pv_obj
-
-    @property
-    def auto_tune_requested(self):
-        return bool(self.auto_tune_requested_pv_obj.get())
-
-    @auto_tune_requested.setter
-    def auto_tune_requested(self, value: bool):
-        self.auto_tune_requested_pv_obj.put(value)
-
-    @property
-    def cav_char_requested_pv_obj(self):
-        if not self._cav_char_requested_pv_obj:
-            self._cav_char_requested_pv_obj = PV(self.cav_char_requested_pv)
-        return self._cav_char_requested_pv_obj
-
-    @property
-    def cav_char_requested(self):
-        return bool(self.cav_char_requested_pv_obj.get())
-
-    @cav_char_requested.setter
-    def cav_char_requested(self, value: bool):
-        self.cav_char_requested_pv_obj.put(value)
-
-    @property
-    def rf_ramp_requested_pv_obj(self):
-        if not self._rf_ramp_requested_pv_obj:
-            self._rf_ramp_requested_pv_obj = PV(self.rf_ramp_requested_pv)
-        return self._rf_ramp_requested_pv_obj
-
-    @property
-    def rf_ramp_requested(self):
-        return bool(self.rf_ramp_requested_pv_obj.get())
-
-    @rf_ramp_requested.setter
-    def rf_ramp_requested(self, value: bool):
-        self.rf_ramp_requested_pv_obj.put(value)
-
 
 class SetupCavity(Cavity, AutoLinacObject):
+    __slots__ = (
+        "_timing_pv_objs",
+        "stage_timer",
+        "ramp_engine",
+        "resume",
+        "_checkpoint",
+        "_calibration_cache",
+        "_status_publisher",
+        "_publish_status",
+    )
+
+    progress_pv_obj = AutoPV("PROG")
+    status_pv_obj = AutoPV("STATUS")
+    status_msg_pv_obj = AutoPV("MSG")
+    note_pv_obj = AutoPV("NOTE")
+
     def __init__(
         self,
         cavity_num,
@@ -159,32 +339,40 @@ class SetupCavity(Cavity, AutoLinacObject):
         Cavity.__init__(self, cavity_num=cavity_num, rack_object=rack_object)
         AutoLinacObject.__init__(self)
 
-        self.progress_pv: str = self.auto_pv_addr("PROG")
-        self._progress_pv_obj: Optional[PV] = None
+        self._timing_pv_objs: Optional[Dict[str, PV]] = None
+        self.stage_timer: Optional[StageTimer] = None
+        # Shared RampEngine set by RampEngine.attach, ramps on its own if None
+        self.ramp_engine = None
 
-        self.status_pv: str = self.auto_pv_addr("STATUS")
-        self._status_pv_obj: Optional[PV] = None
+        # Skip checkpointed stages that are still valid
+        self.resume: bool = False
+        self._checkpoint: Optional[CavityCheckpoint] = None
+        self._calibration_cache: Optional[CalibrationCache] = None
 
-        self.status_msg_pv: str = self.auto_pv_addr("MSG")
-        self._status_msg_pv_obj: Optional[PV] = None
-        
-        self.note_pv: str = self.auto_pv_addr("NOTE")
-        self._note_pv_obj: Optional[PV] = None
+        self._status_publisher: Optional[StatusPublisher] = None
+        self._publish_status: bool = False
+
+    @property
+    def timing_pvs(self) -> Dict[str, str]:
+        return {
+            stage: self.auto_pv_addr(f"TIME_{stage.upper()}")
+            for stage in TIMED_STAGES + (TIMING_TOTAL,)
+        }
 
     def capture_acon(self):
         self.acon = self.ades
-        
-    @property
-    def note_pv_obj(self) -> PV:
-        if not self._note_pv_obj:
-            self._note_pv_obj = PV(self.note_pv)
-        return self._note_pv_obj
 
     @property
-    def status_pv_obj(self):
-        if not self._status_pv_obj:
-            self._status_pv_obj = PV(self.status_pv)
-        return self._status_pv_obj
+    def timing_pv_objs(self) -> Dict[str, PV]:
+        """
+        Not part of auto_pv_objs: nothing waits for these to connect, they
+        are created when a setup starts and written at its end if connected
+        """
+        if self._timing_pv_objs is None:
+            self._timing_pv_objs = {
+                stage: PV_REGISTRY.get_pv(pv) for stage, pv in self.timing_pvs.items()
+            }
+        return self._timing_pv_objs
 
     @property
     def status(self):
@@ -192,17 +380,34 @@ class SetupCavity(Cavity, AutoLinacObject):
 
     @status.setter
     def status(self, value: int):
+        # Status is written synchronously and after anything still queued so
+        # the final STATUS is never overtaken by a stale progress or message
+        if self._publish_status:
+            self.status_publisher.flush()
         self.status_pv_obj.put(value)
 
     @property
-    def script_is_running(self) -> bool:
-        return self.status == STATUS_RUNNING_VALUE
+    def status_publisher(self) -> StatusPublisher:
+        if not self._status_publisher:
+            self._status_publisher = StatusPublisher(f"{self} status publisher")
+        return self._status_publisher
+
+    @asynccontextmanager
+    async def publishing_status(self):
+        """
+        Queues progress and message updates on the status publisher for the
+        duration of a setup or shutdown sequence and flushes them at the end
+        """
+        self._publish_status = True
+        try:
+            yield
+        finally:
+            self._publish_status = False
+            await self._in_executor(self.status_publisher.flush)
 
     @property
-    def progress_pv_obj(self):
-        if not self._progress_pv_obj:
-            self._progress_pv_obj = PV(self.progress_pv)
-        return self._progress_pv_obj
+    def script_is_running(self) -> bool:
+        return self.status == STATUS_RUNNING_VALUE
 
     @property
     def progress(self) -> float:
@@ -210,13 +415,10 @@ class SetupCavity(Cavity, AutoLinacObject):
 
     @progress.setter
     def progress(self, value: float):
-        self.progress_pv_obj.put(value)
-
-    @property
-    def status_msg_pv_obj(self) -> PV:
-        if not self._status_msg_pv_obj:
-            self._status_msg_pv_obj = PV(self.status_msg_pv)
-        return self._status_msg_pv_obj
+        if self._publish_status:
+            self.status_publisher.publish(self.progress_pv_obj, value)
+        else:
+            self.progress_pv_obj.put(value)
 
     @property
     def status_message(self):
@@ -225,10 +427,26 @@ class SetupCavity(Cavity, AutoLinacObject):
     @status_message.setter
     def status_message(self, message):
         print(message)
-        self.status_msg_pv_obj.put(message)
+        if self._publish_status:
+            self.status_publisher.publish(self.status_msg_pv_obj, message)
+        else:
+            self.status_msg_pv_obj.put(message)
 
     def clear_abort(self):
+        # Subscribing here (at the start of every setup and shutdown) rather
+        # than at the first check_abort sets the abort flags as soon as an
+        # abort comes in, whatever stage is running
+        self.abort_token.subscribe()
         self.abort_pv_obj.put(0)
+        self.abort_token.clear()
+        self.abort_flag = False
+        self.stepper_tuner.abort_flag = False
+
+    def on_abort_requested(self):
+        # Lets lcls_tools routines that check these flags directly (e.g. the
+        # stepper moves in move_to_resonance) stop without another CA get
+        self.abort_flag = True
+        self.stepper_tuner.abort_flag = True
 
     def request_abort(self):
         if self.script_is_running:
@@ -242,141 +460,444 @@ class SetupCavity(Cavity, AutoLinacObject):
             self.clear_abort()
             raise sc_linac_utils.CavityAbortError(f"Abort requested for {self}")
 
-    def shut_down(self):
-        if self.script_is_running:
-            self.status_message = f"{self} script already running"
-            return
+    async def _in_executor(self, func, *args, **kwargs):
+        """
+        Runs a blocking call (PV I/O, lcls_tools hardware routines) on the
+        stage executor so that one event loop can drive many cavities, at most
+        STAGE_WORKERS of them in a blocking call at once
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            stage_executor(), partial(func, *args, **kwargs)
+        )
 
+    def _fail(self, error: Exception):
+        self.status = STATUS_ERROR_VALUE
         self.clear_abort()
+        self.status_message = str(error)
 
-        try:
-            self.status = STATUS_RUNNING_VALUE
-            self.progress = 0
-            self.status_message = f"Turning {self} RF off"
-            self.turn_off()
-            self.progress = 50
-            self.status_message = f"Turning {self} SSA off"
-            self.ssa.turn_off()
-            self.progress = 100
-            self.status = STATUS_READY_VALUE
-            self.status_message = f"{self} RF and SSA off"
-        except (CASeverityException, sc_linac_utils.CavityAbortError) as e:
-            self.status = STATUS_ERROR_VALUE
-            self.clear_abort()
-            self.status_message = str(e)
-
-    def setup(self):
-        try:
-            if self.script_is_running:
-                self.status_message = f"{self} script already running"
-                return
+    def _start_shut_down(self) -> bool:
+        if self.script_is_running:
+            self.status_message = f"{self} script already running"
+            return False
 
-            if not self.is_online:
-                self.status_message = f"{self} not online, not setting up"
-                self.status = STATUS_ERROR_VALUE
-                return
+        self.clear_abort()
+        return True
+
+    def rf_off_stage(self):
+        self.status = STATUS_RUNNING_VALUE
+        self.progress = 0
+        self.status_message = f"Turning {self} RF off"
+        self.turn_off()
+        self.progress = 50
+
+    def ssa_off_stage(self):
+        self.status_message = f"Turning {self} SSA off"
+        self.ssa.turn_off()
+        self.progress = 100
+        self.status = STATUS_READY_VALUE
+        self.status_message = f"{self} RF and SSA off"
+
+    async def async_shut_down(self):
+        if not await self._in_executor(self._start_shut_down):
+            return
 
-            self.clear_abort()
+        async with self.publishing_status():
+            try:
+                await self._in_executor(self.rf_off_stage)
+                await self._in_executor(self.ssa_off_stage)
+            except SHUTDOWN_ERRORS as e:
+                await self._in_executor(self._fail, e)
 
-            self.status = STATUS_RUNNING_VALUE
-            self.progress = 0
+    def shut_down(self):
+        run_coroutine(self.async_shut_down())
 
-            # Not turning it off can cause problems if an interlock is tripped
-            # but the requested RF state is on
-            self.status_message = f"Turning {self} off before starting setup"
-            self.turn_off()
-            self.progress = 5
+    def _start_setup(self) -> bool:
+        if self.script_is_running:
+            self.status_message = f"{self} script already running"
+            return False
 
-            self.status_message = f"Turning on {self} SSA if not on already"
-            self.ssa.turn_on()
-            self.progress = 10
+        if not self.is_online:
+            self.status_message = f"{self} not online, not setting up"
+            self.status = STATUS_ERROR_VALUE
+            return False
 
-            self.status_message = f"Resetting {self} interlocks"
-            self.reset_interlocks()
-            self.progress = 15
+        cache = self.calibration_cache
+        if cache is not None:
+            # Before reset_interlocks_stage clears the quench latch
+            cache.setup_started(self)
 
-            if self.ssa_cal_requested:
+        self.clear_abort()
+        # Only starts the searches so the timing PVs can connect by the end
+        self.timing_pv_objs
+
+        self.status = STATUS_RUNNING_VALUE
+        self.progress = 0
+        return True
+
+    def turn_off_stage(self):
+        # Not turning it off can cause problems if an interlock is tripped
+        # but the requested RF state is on
+        self.status_message = f"Turning {self} off before starting setup"
+        self.turn_off()
+        self.progress = 5
+
+    def ssa_on_stage(self):
+        self.status_message = f"Turning on {self} SSA if not on already"
+        self.ssa.turn_on()
+        self.progress = 10
+
+    def reset_interlocks_stage(self):
+        self.status_message = f"Resetting {self} interlocks"
+        self.reset_interlocks()
+        self.progress = 15
+
+    def ssa_cal_stage(self):
+        if self.ssa_cal_requested:
+            if self.cached_calibration("ssa_cal"):
+                self.status_message = f"{self} SSA Calibration still valid"
+            else:
                 self.status_message = f"Running {self} SSA Calibration"
                 self.turn_off()
                 self.progress = 20
                 self.ssa.calibrate(self.ssa.drive_max)
+                self.cache_calibration("ssa_cal")
                 self.status_message = f"{self} SSA Calibrated"
 
-            self.progress = 25
-            self.check_abort()
+        self.progress = 25
+        self.check_abort()
 
-            if self.auto_tune_requested:
-                self.status_message = f"Tuning {self} to Resonance"
-                self.move_to_resonance(use_sela=False)
-                self.status_message = f"{self} Tuned to Resonance"
+    def tune_stage(self):
+        if self.auto_tune_requested:
+            self.status_message = f"Tuning {self} to Resonance"
+            self.move_to_resonance(use_sela=False)
+            self.status_message = f"{self} Tuned to Resonance"
 
-            self.progress = 50
-            self.check_abort()
+        self.progress = 50
+        self.check_abort()
 
-            if self.cav_char_requested:
+    def characterize_stage(self):
+        if self.cav_char_requested:
+            if self.cached_calibration("characterize"):
+                self.status_message = f"{self} Characterization still valid"
+            else:
                 self.status_message = f"Running {self} Cavity Characterization"
                 self.characterize()
                 self.progress = 60
                 self.calc_probe_q_pv_obj.put(1)
                 self.progress = 70
+                self.cache_calibration("characterize")
                 self.status_message = f"{self} Characterized"
 
-            self.progress = 75
-            self.check_abort()
+        self.progress = 75
+        self.check_abort()
+
+    def ramp_start_stage(self):
+        self.status_message = f"Ramping {self} to {self.acon}"
+        self.piezo.enable_feedback()
+        self.progress = 80
+
+        if not self.is_on or (
+            self.is_on and self.rf_mode != sc_linac_utils.RF_MODE_SELAP
+        ):
+            self.ades = min(5, self.acon)
+
+        self.turn_on()
+        self.progress = 85
+
+        self.check_abort()
+
+        self.set_sela_mode()
+
+    def sela_condition(self) -> PVCondition:
+        return PVCondition(
+            self.rf_mode_pv_obj,
+            lambda rf_mode: rf_mode == RF_MODE_SELA,
+            abort_token=self.abort_token,
+            abort_check=self.check_abort,
+        )
+
+    async def wait_for_sela(self, timeout: Optional[float] = None):
+        sela = self.sela_condition()
+        if not await self._in_executor(lambda: sela.start().done()):
+            await self._in_executor(
+                setattr, self, "status_message", "Waiting for cavity to be in SELA"
+            )
+        await sela.wait_async(timeout=timeout)
+
+    def sela_wait_stage(self, timeout: Optional[float] = None):
+        """
+        Blocking wait_for_sela for stages run on a worker thread, still
+        driven by the RF mode monitor rather than polling
+        """
+        sela = self.sela_condition()
+        if not sela.start().done():
+            self.status_message = "Waiting for cavity to be in SELA"
+        sela.wait(timeout=timeout)
+
+    def ramp_finish_stage(self):
+        if self.ramp_engine:
+            self.ramp_engine.walk_amp(self, self.acon)
+        else:
+            self.walk_amp(self.acon, 0.1)
+        self.progress = 90
+
+        self.status_message = f"Centering {self} piezo"
+        self.move_to_resonance(use_sela=True)
+        self.progress = 95
+
+        self.set_selap_mode()
+
+        self.status_message = f"{self} Ramped Up to {self.acon} MV"
 
-            if self.rf_ramp_requested:
-                self.status_message = f"Ramping {self} to {self.acon}"
-                self.piezo.enable_feedback()
-                self.progress = 80
+    def _finish_setup(self):
+        self.progress = 100
+        self.status = STATUS_READY_VALUE
 
-                if not self.is_on or (
-                    self.is_on and self.rf_mode != sc_linac_utils.RF_MODE_SELAP
-                ):
-                    self.ades = min(5, self.acon)
+    @property
+    def checkpoint(self) -> CavityCheckpoint:
+        if not self._checkpoint:
+            self._checkpoint = CavityCheckpoint.for_cavity(self)
+        return self._checkpoint
+
+    def checkpoint_inputs(self, stage: str) -> Dict[str, Any]:
+        """
+        :return: what a checkpointed stage's result depends on besides the
+                 stages before it
+        """
+        if stage == "ssa_cal":
+            return {"drive_max": self.ssa.drive_max}
+        return {}
 
-                self.turn_on()
-                self.progress = 85
+    @property
+    def calibration_cache(self) -> Optional[CalibrationCache]:
+        """
+        None unless enabled through SRF_SETUP_CALIBRATION_CACHE_DIR
+        """
+        if not self._calibration_cache:
+            self._calibration_cache = CalibrationCache.for_cavity(self)
+        return self._calibration_cache
+
+    def calibration_results(self, calibration: str) -> Dict[str, Any]:
+        if calibration == "ssa_cal":
+            return {"slope": self.ssa.measured_slope}
+        return {
+            "loaded_q": self.measured_loaded_q,
+            "scale_factor": self.measured_scale_factor,
+        }
+
+    def cached_calibration(self, calibration: str) -> bool:
+        """
+        :return: whether the cache holds a still valid result, so the
+                 calibration can be skipped
+        """
+        cache = self.calibration_cache
+        return cache is not None and cache.lookup(self, calibration) is not None
+
+    def cache_calibration(self, calibration: str):
+        cache = self.calibration_cache
+        if cache is not None:
+            cache.store(self, calibration, self.calibration_results(calibration))
+
+    def checkpointed_stage(
+        self, name: str, stage: Callable[[], None]
+    ) -> Callable[[], None]:
+        """
+        Wraps a stage so that it is checkpointed once it has done its work
+        and, when resuming, skipped while its checkpoint is still valid
+        """
+        if name not in CHECKPOINT_REQUESTS:
+            return stage
+
+        def run():
+            if not getattr(self, CHECKPOINT_REQUESTS[name]):
+                stage()
+                return
 
+            inputs = self.checkpoint_inputs(name)
+            if self.resume and self.checkpoint.is_valid(name, inputs):
+                self.status_message = f"Skipping {self} {name}, still valid"
+                self.progress = CHECKPOINT_PROGRESS[name]
                 self.check_abort()
+                return
 
-                self.set_sela_mode()
-
-                while self.rf_mode != RF_MODE_SELA:
-                    self.check_abort()
-                    self.status_message = "Waiting for cavity to be in SELA"
-                    sleep(0.5)
-
-                self.walk_amp(self.acon, 0.1)
-                self.progress = 90
-
-                self.status_message = f"Centering {self} piezo"
-                self.move_to_resonance(use_sela=True)
-                self.progress = 95
-
-                self.set_selap_mode()
-
-                self.status_message = f"{self} Ramped Up to {self.acon} MV"
-
-            self.progress = 100
-            self.status = STATUS_READY_VALUE
-        except (
-            sc_linac_utils.StepperError,
-            sc_linac_utils.DetuneError,
-            sc_linac_utils.SSACalibrationError,
-            PVInvalidError,
-            sc_linac_utils.QuenchError,
-            sc_linac_utils.CavityQLoadedCalibrationError,
-            sc_linac_utils.CavityScaleFactorCalibrationError,
-            sc_linac_utils.SSAFaultError,
-            sc_linac_utils.StepperAbortError,
-            sc_linac_utils.CavityHWModeError,
-            sc_linac_utils.CavityFaultError,
-            sc_linac_utils.CavityAbortError,
-            CASeverityException,
-        ) as e:
-            self.status = STATUS_ERROR_VALUE
-            self.clear_abort()
-            self.status_message = str(e)
+            stage()
+            self.checkpoint.record(name, inputs)
+
+        return run
+
+    def _report_timing(self):
+        """
+        Publishes the stage durations to the AUTO:TIME_ PVs (skipping any
+        that are not connected) and appends them to the timing log
+        """
+        durations = self.stage_timer.stage_durations
+        durations[TIMING_TOTAL] = self.stage_timer.duration
+        for stage, duration in durations.items():
+            pv = self.timing_pv_objs.get(stage)
+            if pv is not None and pv.connected:
+                self.status_publisher.publish(pv, duration)
+        self.stage_timer.write_log()
+
+    def begin_setup(self) -> bool:
+        """
+        Starts a setup that is then driven stage by stage, e.g. by the setup
+        scheduler: run_setup_stage for each stage, then complete_setup (or
+        fail_setup on an error)
+        :return: False if the cavity can not be set up, the setup is then
+                 already ended
+        """
+        self.stage_timer = StageTimer(str(self))
+        self._publish_status = True
+        if not self._start_setup():
+            self.end_setup(report_timing=False)
+            return False
+        return True
+
+    def run_setup_stage(self, name: str):
+        """
+        Runs one of TIMED_STAGES, timed and checkpointed where that applies
+        """
+        stage = getattr(self, f"{name}_stage")
+        self.stage_timer.timed(name, self.checkpointed_stage(name, stage))()
+
+    def complete_setup(self):
+        self._finish_setup()
+        self.stage_timer.finish()
+        self.end_setup()
+
+    def fail_setup(self, error: Exception):
+        self.stage_timer.finish(error=error)
+        try:
+            self._fail(error)
+        finally:
+            self.end_setup()
+
+    def end_setup(self, report_timing: bool = True):
+        """
+        Publishes and logs the stage timing, then flushes the queued status
+        and timing updates so none are lost if the process exits right after
+        """
+        try:
+            if report_timing:
+                self._report_timing()
+        finally:
+            self._publish_status = False
+            self.status_publisher.flush()
+
+    async def async_setup(self):
+        try:
+            if not await self._in_executor(self.begin_setup):
+                return
+
+            for name in (
+                "turn_off",
+                "ssa_on",
+                "reset_interlocks",
+                "ssa_cal",
+                "tune",
+                "characterize",
+            ):
+                await self._in_executor(self.run_setup_stage, name)
+
+            if await self._in_executor(lambda: self.rf_ramp_requested):
+                await self._in_executor(self.run_setup_stage, "ramp_start")
+                # Runs on the event loop, so PV calls are not attributed
+                with self.stage_timer.stage("sela_wait", track_round_trips=False):
+                    await self.wait_for_sela()
+                await self._in_executor(self.run_setup_stage, "ramp_finish")
+
+            await self._in_executor(self.complete_setup)
+        except SETUP_ERRORS as e:
+            await self._in_executor(self.fail_setup, e)
+        finally:
+            # Already done on every path above except an unexpected error
+            self._publish_status = False
+            await self._in_executor(self.status_publisher.flush)
+
+    def setup(self):
+        run_coroutine(self.async_setup())
+
+
+def snapshot_cavities(
+    cavities: Iterable[SetupCavity], timeout: Optional[float] = None
+) -> np.ndarray:
+    """
+    Reads the automation state of every cavity in one batch: all the
+    connections are made at once against one deadline and the values then
+    come from the monitor cache
+    :return: SNAPSHOT_DTYPE array with one row per cavity, in the given order
+    """
+    cavities = list(cavities)
+    pvs = [
+        getattr(cavity, attr) for cavity in cavities for attr in SNAPSHOT_PVS.values()
+    ]
+    unconnected = set(PV_REGISTRY.connect(pvs, timeout=timeout))
+
+    snapshot = np.zeros(len(cavities), dtype=SNAPSHOT_DTYPE)
+    snapshot["status"] = np.nan
+    snapshot["progress"] = np.nan
+    snapshot["status_message"] = None
+
+    for row, cavity in enumerate(cavities):
+        record = snapshot[row]
+        record["cryomodule"] = cavity.cryomodule.name
+        record["cavity"] = cavity.number
+        record["connected"] = True
+        for field, attr in SNAPSHOT_PVS.items():
+            pv = getattr(cavity, attr)
+            # lcls_tools PVs raise PVInvalidError on a failed get where
+            # pyepics returns None, either only marks this row
+            try:
+                if pv.pvname in unconnected:
+                    value = None
+                elif field in SNAPSHOT_STRINGS:
+                    value = pv.get(as_string=True)
+                else:
+                    value = pv.get()
+            except Exception:
+                value = None
+            if value is None:
+                record["connected"] = False
+            else:
+                record[field] = value
+    return snapshot
+
+
+def capture_acons(cavities: Iterable[SetupCavity]) -> Dict[SetupCavity, str]:
+    """
+    Copies ADES to ACON for every cavity: one batch of ADES reads, then all
+    the ACON puts in flight at once
+    :return: why the capture failed per cavity, empty if every cavity's ACON
+             was captured
+    """
+    failures: Dict[SetupCavity, str] = {}
+    cavities = list(cavities)
+    ades_pvs = [cavity.ades_pv_obj for cavity in cavities]
+    unconnected = set(PV_REGISTRY.connect(ades_pvs))
+
+    acons: Dict[SetupCavity, float] = {}
+    for cavity, pv in zip(cavities, ades_pvs):
+        # lcls_tools PVs raise PVInvalidError on a failed get where pyepics
+        # returns None, either only fails this cavity
+        try:
+            ades = None if pv.pvname in unconnected else pv.get()
+        except Exception as e:
+            failures[cavity] = f"{pv.pvname} {e}"
+            continue
+        if ades is None:
+            failures[cavity] = f"{pv.pvname} not connected"
+        else:
+            acons[cavity] = ades
+
+    put_failures = PV_REGISTRY.try_put_many(
+        {cavity.acon_pv_obj: ades for cavity, ades in acons.items()}
+    )
+    for cavity in acons:
+        pvname = cavity.acon_pv_obj.pvname
+        if pvname in put_failures:
+            failures[cavity] = f"{pvname} {put_failures[pvname]}"
+    return failures
 
 
 class SetupCryomodule(Cryomodule, AutoLinacObject):
@@ -396,6 +917,12 @@ class SetupCryomodule(Cryomodule, AutoLinacObject):
         for cavity in self.cavities.values():
             cavity.clear_abort()
 
+    def capture_acon(self) -> Dict[SetupCavity, str]:
+        """
+        :return: per cavity failures, see capture_acons
+        """
+        return capture_acons(self.cavities.values())
+
 
 class SetupLinac(Linac, AutoLinacObject):
     @property
@@ -422,24 +949,105 @@ class SetupLinac(Linac, AutoLinacObject):
         for cm in self.cryomodules.values():
             cm.clear_abort()
 
+    def capture_acon(self) -> Dict[SetupCavity, str]:
+        """
+        :return: per cavity failures, see capture_acons
+        """
+        return capture_acons(
+            cavity
+            for cm in self.cryomodules.values()
+            for cavity in cm.cavities.values()
+        )
+
+
+class _DeferredCryomodule:
+    """
+    Stand-in handed to Machine.__init__ so that it only records the arguments
+    each cryomodule would have been built with
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        self.name = kwargs.get("cryo_name", args[0] if args else None)
+
+    def build(self) -> SetupCryomodule:
+        return SetupCryomodule(*self.args, **self.kwargs)
+
 
 class SetupMachine(Machine, AutoLinacObject):
     @property
     def pv_prefix(self):
         return "ACCL:SYS0:SC:"
 
-    def __init__(self):
+    def __init__(self, lazy: bool = True):
+        """
+        :param lazy: only build cryomodules (and their cavities) the first time
+                     they are looked up instead of building the whole machine
+        """
         Machine.__init__(
             self,
             cavity_class=SetupCavity,
-            cryomodule_class=SetupCryomodule,
+            cryomodule_class=_DeferredCryomodule if lazy else SetupCryomodule,
             linac_class=SetupLinac,
         )
         AutoLinacObject.__init__(self)
 
+        if lazy:
+            self.cryomodule_class = SetupCryomodule
+            self._defer_cryomodules()
+
+    def _defer_cryomodules(self):
+        cm_builders: Dict[str, Callable[[], SetupCryomodule]] = {}
+        for linac in self.linacs:
+            deferred: Dict[str, _DeferredCryomodule] = linac.cryomodules
+            linac.cryomodules = LazyDict(
+                {cm_name: cm.build for cm_name, cm in deferred.items()}
+            )
+            for cm_name in deferred.keys():
+                # Share the linac's cache so both lookups return the same object
+                cm_builders[cm_name] = partial(linac.cryomodules.__getitem__, cm_name)
+        self.cryomodules = LazyDict(cm_builders)
+
     def clear_abort(self):
         for cm in self.cryomodules.values():
             cm.clear_abort()
 
+    def capture_acon(self) -> Dict[SetupCavity, str]:
+        """
+        :return: per cavity failures, see capture_acons
+        """
+        return capture_acons(
+            cavity
+            for cm in self.cryomodules.values()
+            for cavity in cm.cavities.values()
+        )
+
+    def snapshot(
+        self,
+        linac: Optional[int] = None,
+        status: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> np.ndarray:
+        """
+        Automation state of every cavity, see snapshot_cavities
+        :param linac: only the cavities of this linac (0-3)
+        :param status: only the cavities with this status
+        :return: SNAPSHOT_DTYPE array ordered by cryomodule and cavity
+        """
+        linacs = self.linacs if linac is None else [self.linacs[linac]]
+        snapshot = snapshot_cavities(
+            (
+                cavity
+                for linac_obj in linacs
+                for cm in linac_obj.cryomodules.values()
+                for cavity in cm.cavities.values()
+            ),
+            timeout=timeout,
+        )
+        if status is not None:
+            snapshot = snapshot[snapshot["status"] == status]
+        return snapshot
+
 
 SETUP_MACHINE = SetupMachine()
@@ -0,0 +1,550 @@
+import argparse
+import dataclasses
+import heapq
+import json
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from statistics import median
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from lcls_tools.superconducting import sc_linac_utils
+from lcls_tools.superconducting.sc_linac_utils import (
+    ALL_CRYOMODULES,
+    ALL_CRYOMODULES_NO_HL,
+    LINAC_CM_DICT,
+)
+
+from pv_registry import PV_REGISTRY
+from ramp_engine import RampEngine
+from setup_engine import DEFAULT_MAX_WORKERS, CavityResult, SetupReport
+from setup_linac import SETUP_MACHINE, STATUS_ERROR_VALUE, SetupCavity
+
+# Setup work per cavity, in the order it has to run
+TASK_KINDS = ("start", "prepare", "ssa_cal", "tune", "characterize", "ramp", "finish")
+
+# Timed stages (see SetupCavity.async_setup) making up each kind of task
+TASK_STAGES: Dict[str, Tuple[str, ...]] = {
+    "prepare": ("turn_off", "ssa_on", "reset_interlocks"),
+    "ssa_cal": ("ssa_cal",),
+    "tune": ("tune",),
+    "characterize": ("characterize",),
+    "ramp": ("ramp_start", "sela_wait", "ramp_finish"),
+}
+
+# Rough seconds per task, used to plan when no timing log is given
+DEFAULT_DURATIONS: Dict[str, float] = {
+    "start": 1,
+    "prepare": 15,
+    "ssa_cal": 60,
+    "tune": 60,
+    "characterize": 30,
+    "ramp": 60,
+    "finish": 1,
+}
+
+# Request flag that decides whether a task does any work
+TASK_REQUESTS: Dict[str, str] = {
+    "ssa_cal": "ssa_cal_requested",
+    "tune": "auto_tune_requested",
+    "characterize": "cav_char_requested",
+    "ramp": "rf_ramp_requested",
+}
+
+
+@dataclasses.dataclass(eq=False)
+class SetupTask:
+    cavity: Optional[SetupCavity]
+    kind: str
+    duration: float
+    dependencies: List["SetupTask"] = dataclasses.field(default_factory=list)
+    dependents: List["SetupTask"] = dataclasses.field(default_factory=list)
+    # Predicted time from the start of this task to the end of the schedule
+    priority: float = 0.0
+
+    def __str__(self):
+        if self.cavity is None:
+            return self.kind
+        return f"{self.cavity} {self.kind}"
+
+    @property
+    def cm_name(self) -> Optional[str]:
+        return self.cavity.cryomodule.name if self.cavity else None
+
+    def depends_on(self, task: "SetupTask"):
+        self.dependencies.append(task)
+        task.dependents.append(self)
+
+
+class Constraint:
+    """
+    Base for scheduling constraints. A constraint can add edges to the DAG
+    (add_dependencies) and/or cap how many tasks sharing a resource run at
+    once (resource).
+    """
+
+    def add_dependencies(self, tasks: List["SetupTask"]) -> List["SetupTask"]:
+        """
+        :return: any extra (e.g. barrier) tasks it created
+        """
+        return []
+
+    def resource(self, task: SetupTask) -> Optional[Tuple[Tuple, int]]:
+        """
+        :return: (resource key, capacity) the task needs a slot of, or None
+        """
+        return None
+
+
+@dataclasses.dataclass
+class MaxPerCryomodule(Constraint):
+    """
+    At most limit tasks of the given kinds run at once in one cryomodule
+    """
+
+    limit: int
+    kinds: Tuple[str, ...] = ("ramp",)
+
+    def resource(self, task: SetupTask) -> Optional[Tuple[Tuple, int]]:
+        if task.kind in self.kinds:
+            return ("max_per_cm", self.kinds, task.cm_name), self.limit
+        return None
+
+
+@dataclasses.dataclass
+class RunAfter(Constraint):
+    """
+    Cavities in the after cryomodules only start once every cavity in the
+    before cryomodules has finished (or failed)
+    """
+
+    before: Tuple[str, ...]
+    after: Tuple[str, ...]
+    name: str = "barrier"
+
+    def add_dependencies(self, tasks: List[SetupTask]) -> List[SetupTask]:
+        before = [t for t in tasks if t.kind == "finish" and t.cm_name in self.before]
+        after = [t for t in tasks if t.kind == "start" and t.cm_name in self.after]
+        if not before or not after:
+            return []
+
+        barrier = SetupTask(cavity=None, kind=self.name, duration=0)
+        for task in before:
+            barrier.depends_on(task)
+        for task in after:
+            task.depends_on(barrier)
+        return [barrier]
+
+
+def hl_after_l1b() -> RunAfter:
+    return RunAfter(
+        before=tuple(sc_linac_utils.LINAC_TUPLES[1][1]),
+        after=tuple(sc_linac_utils.L1BHL),
+        name="L1B done",
+    )
+
+
+def durations_from_log(path: str) -> Dict[str, float]:
+    """
+    Median duration of each task kind from a stage timing log (see
+    stage_timer.TIMING_LOG_ENV), kinds missing from the log keep their
+    default
+    """
+    stage_samples: Dict[str, List[float]] = defaultdict(list)
+    with open(path) as log:
+        for line in log:
+            for stage in json.loads(line)["stages"]:
+                if stage["duration"] is not None:
+                    stage_samples[stage["name"]].append(stage["duration"])
+
+    durations = dict(DEFAULT_DURATIONS)
+    for kind, stages in TASK_STAGES.items():
+        if all(stage_samples.get(stage) for stage in stages):
+            durations[kind] = sum(median(stage_samples[stage]) for stage in stages)
+    return durations
+
+
+@dataclasses.dataclass
+class PlannedTask:
+    start: float
+    end: float
+    task: SetupTask
+
+
+class SetupScheduler:
+    """
+    Builds a DAG of the setup work for a set of cavities (start, prepare,
+    SSA calibration, tuning, characterization, ramp, finish per cavity) and
+    runs it on a thread pool under the given constraints.
+
+    Ready tasks are started longest-remaining-path first (critical path list
+    scheduling), which keeps the workers on whatever holds up the end of the
+    schedule. plan() simulates the same policy with predicted durations.
+    """
+
+    def __init__(
+        self,
+        cavities: Iterable[SetupCavity],
+        constraints: Iterable[Constraint] = (),
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        durations: Optional[Dict[str, float]] = None,
+        resume: bool = False,
+    ):
+        self.cavities: List[SetupCavity] = list(cavities)
+        self.constraints: List[Constraint] = list(constraints)
+        self.max_workers = max_workers
+        self.durations: Dict[str, float] = durations or dict(DEFAULT_DURATIONS)
+        self.resume = resume
+        self.tasks: List[SetupTask] = []
+
+    def build(self, requests: Optional[Dict[SetupCavity, Dict[str, bool]]] = None):
+        """
+        :param requests: request flags per cavity for the duration estimate,
+                         read from the AUTO: PVs (in one batch) if not given
+        """
+        if requests is None:
+            requests = self._read_requests()
+
+        self.tasks = []
+        for cavity in self.cavities:
+            previous: Optional[SetupTask] = None
+            for kind in TASK_KINDS:
+                requested = requests[cavity].get(TASK_REQUESTS.get(kind), True)
+                task = SetupTask(
+                    cavity=cavity,
+                    kind=kind,
+                    duration=self.durations[kind] if requested else 0,
+                )
+                if previous:
+                    task.depends_on(previous)
+                self.tasks.append(task)
+                previous = task
+
+        for constraint in self.constraints:
+            self.tasks.extend(constraint.add_dependencies(self.tasks))
+        self._prioritize()
+
+    def _read_requests(self) -> Dict[SetupCavity, Dict[str, bool]]:
+        flags = list(TASK_REQUESTS.values())
+        values = PV_REGISTRY.get_many(
+            [pv for cavity in self.cavities for pv in cavity.setup_option_pv_objs]
+        )
+        return {
+            cavity: dict(zip(flags, values[idx * len(flags) : (idx + 1) * len(flags)]))
+            for idx, cavity in enumerate(self.cavities)
+        }
+
+    def _prioritize(self):
+        # Reverse topological order so dependents are done first
+        for task in reversed(self._topological_order()):
+            task.priority = task.duration + max(
+                (dependent.priority for dependent in task.dependents), default=0
+            )
+
+    def _topological_order(self) -> List[SetupTask]:
+        remaining = {id(task): len(task.dependencies) for task in self.tasks}
+        ready = [task for task in self.tasks if not task.dependencies]
+        order: List[SetupTask] = []
+        while ready:
+            task = ready.pop()
+            order.append(task)
+            for dependent in task.dependents:
+                remaining[id(dependent)] -= 1
+                if not remaining[id(dependent)]:
+                    ready.append(dependent)
+        if len(order) != len(self.tasks):
+            raise ValueError("Setup constraints form a cycle")
+        return order
+
+    def _resources(self, task: SetupTask) -> List[Tuple[Tuple, int]]:
+        return [
+            resource
+            for resource in map(lambda c: c.resource(task), self.constraints)
+            if resource is not None
+        ]
+
+    def _dispatchable(
+        self, ready: List[SetupTask], in_use: Dict[Tuple, int], free_workers: int
+    ) -> List[SetupTask]:
+        """
+        Picks which ready tasks to start now and claims their resources
+        """
+        chosen: List[SetupTask] = []
+        for task in sorted(ready, key=lambda t: -t.priority):
+            # Zero length bookkeeping tasks do not need a worker
+            if task.cavity is not None and len(chosen) >= free_workers:
+                break
+            resources = self._resources(task)
+            if all(in_use[key] < capacity for key, capacity in resources):
+                for key, _ in resources:
+                    in_use[key] += 1
+                chosen.append(task)
+        return chosen
+
+    def _release(self, task: SetupTask, in_use: Dict[Tuple, int]):
+        for key, _ in self._resources(task):
+            in_use[key] -= 1
+
+    def plan(self) -> List[PlannedTask]:
+        """
+        Simulates the schedule with the predicted durations
+        """
+        if not self.tasks:
+            self.build()
+
+        remaining = {id(task): len(task.dependencies) for task in self.tasks}
+        ready = [task for task in self.tasks if not task.dependencies]
+        in_use: Dict[Tuple, int] = defaultdict(int)
+        running: List[Tuple[float, int, SetupTask]] = []
+        planned: List[PlannedTask] = []
+        now = 0.0
+        counter = 0
+
+        while ready or running:
+            busy = sum(1 for _, _, task in running if task.cavity is not None)
+            for task in self._dispatchable(ready, in_use, self.max_workers - busy):
+                ready.remove(task)
+                planned.append(PlannedTask(now, now + task.duration, task))
+                counter += 1
+                heapq.heappush(running, (now + task.duration, counter, task))
+
+            if not running:
+                raise RuntimeError("Schedule is stuck, check the constraints")
+            now, _, done = heapq.heappop(running)
+            self._release(done, in_use)
+            for dependent in done.dependents:
+                remaining[id(dependent)] -= 1
+                if not remaining[id(dependent)]:
+                    ready.append(dependent)
+
+        return planned
+
+    @property
+    def predicted_duration(self) -> float:
+        return max((planned.end for planned in self.plan()), default=0.0)
+
+    def print_plan(self):
+        planned = self.plan()
+        for entry in sorted(planned, key=lambda p: (p.start, p.end)):
+            if entry.task.duration or entry.task.cavity is None:
+                print(f"{entry.start:8.0f} s - {entry.end:8.0f} s  {entry.task}")
+        end = max((entry.end for entry in planned), default=0.0)
+        print(
+            f"Predicted time to completion: {end / 60:.1f} min"
+            f" for {len(self.cavities)} cavities on {self.max_workers} workers"
+        )
+
+    def run(self) -> SetupReport:
+        if not self.tasks:
+            self.build()
+
+        start = perf_counter()
+        remaining = {id(task): len(task.dependencies) for task in self.tasks}
+        ready = [task for task in self.tasks if not task.dependencies]
+        in_use: Dict[Tuple, int] = defaultdict(int)
+        stopped: Set[int] = set()
+        started: Dict[int, float] = {}
+        results: Dict[int, CavityResult] = {}
+        running: Dict[Future, SetupTask] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while ready or running:
+                busy = sum(1 for task in running.values() if task.cavity is not None)
+                for task in self._dispatchable(ready, in_use, self.max_workers - busy):
+                    ready.remove(task)
+                    if task.cavity is not None:
+                        started.setdefault(id(task.cavity), perf_counter())
+                    running[executor.submit(self._run_task, task, stopped)] = task
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    self._release(task, in_use)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # e.g. the status could not be read back after a
+                        # failure, the rest of the schedule still runs
+                        stopped.add(id(task.cavity))
+                        result = self._error_result(task.cavity, e)
+                    if result is not None:
+                        results[id(task.cavity)] = dataclasses.replace(
+                            result, duration=perf_counter() - started[id(task.cavity)]
+                        )
+                    for dependent in task.dependents:
+                        remaining[id(dependent)] -= 1
+                        if not remaining[id(dependent)]:
+                            ready.append(dependent)
+
+        return SetupReport(
+            results=[results[id(c)] for c in self.cavities if id(c) in results],
+            duration=perf_counter() - start,
+        )
+
+    @staticmethod
+    def _stages(task: SetupTask) -> Tuple[str, ...]:
+        if task.kind == "ramp" and not task.cavity.rf_ramp_requested:
+            return ()
+        return TASK_STAGES[task.kind]
+
+    def _run_task(self, task: SetupTask, stopped: Set[int]) -> Optional[CavityResult]:
+        """
+        Runs one task on a worker thread. Once a cavity fails or is skipped,
+        the rest of its tasks only pass through so the DAG still completes.
+        :return: the cavity's result once it has one
+        """
+        cavity = task.cavity
+        if cavity is None or id(cavity) in stopped:
+            return None
+
+        try:
+            if task.kind == "start":
+                cavity.resume = self.resume
+                if cavity.begin_setup():
+                    return None
+                stopped.add(id(cavity))
+
+            elif task.kind == "finish":
+                cavity.complete_setup()
+
+            else:
+                for name in self._stages(task):
+                    cavity.run_setup_stage(name)
+                return None
+
+        # Anything a stage raises fails only this cavity, the rest of the
+        # schedule carries on
+        except Exception as e:
+            stopped.add(id(cavity))
+            cavity.fail_setup(e)
+            return self._cavity_result(cavity, error=e)
+
+        return self._cavity_result(cavity)
+
+    @staticmethod
+    def _cavity_result(cavity: SetupCavity, error: Exception = None) -> CavityResult:
+        return CavityResult(
+            cm_name=cavity.cryomodule.name,
+            cav_num=cavity.number,
+            status=cavity.status,
+            message=cavity.status_msg_pv_obj.get(as_string=True),
+            duration=0.0,
+            error=error,
+        )
+
+    @staticmethod
+    def _error_result(cavity: SetupCavity, error: Exception) -> CavityResult:
+        """
+        Result for a cavity whose status can not be read back
+        """
+        return CavityResult(
+            cm_name=cavity.cryomodule.name,
+            cav_num=cavity.number,
+            status=STATUS_ERROR_VALUE,
+            message=str(error),
+            duration=0.0,
+            error=error,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    scope = parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument(
+        "--cryomodule",
+        "-cm",
+        choices=ALL_CRYOMODULES,
+        help=f"Cryomodule name as a string",
+    )
+    scope.add_argument(
+        "--linac", "-l", choices=range(4), type=int, help=f"Linac number as an int"
+    )
+    scope.add_argument(
+        "--machine", "-m", action="store_true", help="Set up the whole machine"
+    )
+    parser.add_argument(
+        "--no_hl", "-no_hl", action="store_true", help="Exclude HLs from setup script"
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=DEFAULT_MAX_WORKERS, help="Pool size"
+    )
+    parser.add_argument(
+        "--max_ramping_per_cm",
+        type=int,
+        default=None,
+        help="Maximum number of cavities ramping at once per cryomodule",
+    )
+    parser.add_argument(
+        "--hl_after_l1b",
+        action="store_true",
+        help="Only start the HL cryomodules once L1B is done",
+    )
+    parser.add_argument(
+        "--max_ramp_rate",
+        type=float,
+        default=None,
+        help="Ramp cavities together, limiting the summed ramp rate to this MV/s",
+    )
+    parser.add_argument(
+        "--max_ramping",
+        type=int,
+        default=None,
+        help="Ramp cavities together, at most this many at once",
+    )
+    parser.add_argument(
+        "--timing_log",
+        default=None,
+        help="Stage timing log (JSON lines) to predict task durations from",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip setup stages still valid from an earlier (failed) run",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Print the planned schedule and predicted time instead of running",
+    )
+
+    args = parser.parse_args()
+    print(args)
+
+    if args.cryomodule:
+        cryomodules = [args.cryomodule]
+    elif args.linac is not None:
+        cryomodules = LINAC_CM_DICT[args.linac]
+    else:
+        cryomodules = ALL_CRYOMODULES_NO_HL if args.no_hl else ALL_CRYOMODULES
+
+    constraints: List[Constraint] = []
+    if args.max_ramping_per_cm:
+        constraints.append(MaxPerCryomodule(limit=args.max_ramping_per_cm))
+    if args.hl_after_l1b:
+        constraints.append(hl_after_l1b())
+
+    cavities = [
+        cavity
+        for cm_name in cryomodules
+        for cavity in SETUP_MACHINE.cryomodules[cm_name].cavities.values()
+    ]
+    if args.max_ramp_rate or args.max_ramping:
+        RampEngine(max_rate=args.max_ramp_rate, max_active=args.max_ramping).attach(
+            cavities
+        )
+
+    scheduler = SetupScheduler(
+        cavities,
+        constraints=constraints,
+        max_workers=args.workers,
+        durations=durations_from_log(args.timing_log) if args.timing_log else None,
+        resume=args.resume,
+    )
+    scheduler.build()
+
+    if args.dry_run:
+        scheduler.print_plan()
+    else:
+        predicted = scheduler.predicted_duration
+        print(f"Predicted time to completion: {predicted / 60:.1f} min")
+        print(scheduler.run().summary())
@@ -2,6 +2,7 @@ import argparse
 
 from lcls_tools.superconducting.sc_linac_utils import ALL_CRYOMODULES
 
+from daemon_lock import daemon_running
 from setup_linac import SetupCavity, SETUP_MACHINE
 
 
@@ -16,6 +17,7 @@ def main():
         cavity_object.shut_down()
 
     else:
+        cavity_object.resume = args.resume
         cavity_object.setup()
 
 
@@ -39,12 +41,22 @@ if __name__ == "__main__":
     parser.add_argument(
         "--shutdown", "-off", action="store_true", help="Turn off cavity and SSA"
     )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip setup stages still valid from an earlier (failed) run",
+    )
 
     args = parser.parse_args()
     print(args)
     cm_name = args.cryomodule
     cav_num = args.cavity
 
-    cavity_object: SetupCavity = SETUP_MACHINE.cryomodules[cm_name].cavities[cav_num]
+    # srf_setup_daemon.py monitors the same request PVs the IOC starts this on
+    if daemon_running():
+        print("Setup daemon is running and serves this request, exiting")
+    else:
+        cavity_object: SetupCavity = SETUP_MACHINE.cryomodules[cm_name].cavities[cav_num]
+        cavity_object.connect_auto_pvs()
 
-    main()
+        main()
@@ -1,26 +1,34 @@
 import argparse
-from time import sleep
+from typing import List
 
 from lcls_tools.superconducting.sc_linac_utils import ALL_CRYOMODULES
 
-from setup_linac import SETUP_MACHINE, SetupCryomodule, SetupCavity
+from pv_registry import PV_REGISTRY
+from setup_linac import (
+    SETUP_MACHINE,
+    STATUS_RUNNING_VALUE,
+    SetupCavity,
+    SetupCryomodule,
+)
 
 
-def setup_cavity(cavity_object: SetupCavity):
-    if cavity_object.script_is_running:
-        cavity_object.status_message = f"{cavity_object} script already running"
-        return
+def setup_cavities(cavity_objects: List[SetupCavity]):
+    statuses = PV_REGISTRY.get_many(
+        [cavity_object.status_pv_obj for cavity_object in cavity_objects]
+    )
+
+    idle_cavities: List[SetupCavity] = []
+    for cavity_object, status in zip(cavity_objects, statuses):
+        if status == STATUS_RUNNING_VALUE:
+            cavity_object.status_message = f"{cavity_object} script already running"
+        else:
+            idle_cavities.append(cavity_object)
 
     if args.shutdown:
-        cavity_object.trigger_shutdown()
+        cm_object.trigger_shutdowns(idle_cavities)
 
     else:
-        cavity_object.ssa_cal_requested = cm_object.ssa_cal_requested
-        cavity_object.auto_tune_requested = cm_object.auto_tune_requested
-        cavity_object.cav_char_requested = cm_object.cav_char_requested
-        cavity_object.rf_ramp_requested = cm_object.rf_ramp_requested
-
-        cavity_object.trigger_setup()
+        cm_object.propagate_setup_options(idle_cavities)
 
 
 if __name__ == "__main__":
@@ -42,7 +50,13 @@ if __name__ == "__main__":
     cm_name = args.cryomodule
 
     cm_object: SetupCryomodule = SETUP_MACHINE.cryomodules[cm_name]
+    PV_REGISTRY.connect(
+        cm_object.auto_pv_objs
+        + [
+            pv
+            for cavity in cm_object.cavities.values()
+            for pv in cavity.auto_pv_objs
+        ]
+    )
 
-    for cavity in cm_object.cavities.values():
-        setup_cavity(cavity)
-        sleep(0.1)
+    setup_cavities(list(cm_object.cavities.values()))
@@ -1,4 +1,5 @@
 import argparse
+from typing import List, Optional
 
 from lcls_tools.superconducting.sc_linac_utils import (
     ALL_CRYOMODULES,
@@ -8,20 +9,27 @@ from lcls_tools.superconducting.sc_linac_utils import (
 from setup_linac import SETUP_MACHINE, SetupCryomodule, SetupMachine
 
 
-def setup_cryomodule(cryomodule_object: SetupCryomodule):
-    if args.shutdown:
-        cryomodule_object.trigger_shutdown()
+def setup_machine(
+    no_hl: bool = False, shutdown: bool = False, machine: SetupMachine = SETUP_MACHINE
+):
+    """
+    Propagates the machine level setup options to every cryomodule and
+    triggers them (or triggers their shutdown). Uses the shared machine model
+    so it can be called in-process without rebuilding anything.
+    """
+    cm_objects: List[SetupCryomodule] = [
+        machine.cryomodules[cm_name]
+        for cm_name in (ALL_CRYOMODULES_NO_HL if no_hl else ALL_CRYOMODULES)
+    ]
 
-    else:
-        cryomodule_object.ssa_cal_requested = machine.ssa_cal_requested
-        cryomodule_object.auto_tune_requested = machine.auto_tune_requested
-        cryomodule_object.cav_char_requested = machine.cav_char_requested
-        cryomodule_object.rf_ramp_requested = machine.rf_ramp_requested
+    if shutdown:
+        machine.trigger_shutdowns(cm_objects)
 
-        cryomodule_object.trigger_setup()
+    else:
+        machine.propagate_setup_options(cm_objects)
 
 
-if __name__ == "__main__":
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--no_hl", "-no_hl", action="store_true", help="Exclude HLs from setup script"
@@ -31,16 +39,11 @@ if __name__ == "__main__":
         "--shutdown", "-off", action="store_true", help="Turn off cavity and SSA"
     )
 
-    args = parser.parse_args()
-    machine: SetupMachine = SetupMachine()
+    args = parser.parse_args(argv)
     print(args)
 
-    if args.no_hl:
-        for cm_name in ALL_CRYOMODULES_NO_HL:
-            cm_object: SetupCryomodule = SETUP_MACHINE.cryomodules[cm_name]
-            setup_cryomodule(cm_object)
+    setup_machine(no_hl=args.no_hl, shutdown=args.shutdown)
 
-    else:
-        for cm_name in ALL_CRYOMODULES:
-            cm_object: SetupCryomodule = SETUP_MACHINE.cryomodules[cm_name]
-            setup_cryomodule(cm_object)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,9 @@
 import argparse
-from time import sleep
+from typing import List
 
 from lcls_tools.superconducting.sc_linac_utils import LINAC_CM_DICT
 
-from setup_linac import SETUP_MACHINE, SetupCryomodule
-
-
-def setup_cryomodule(cryomodule_object: SetupCryomodule):
-    if args.shutdown:
-        cryomodule_object.trigger_shutdown()
-
-    else:
-        cryomodule_object.ssa_cal_requested = cryomodule_object.linac.ssa_cal_requested
-        cryomodule_object.auto_tune_requested = (
-            cryomodule_object.linac.auto_tune_requested
-        )
-        cryomodule_object.cav_char_requested = (
-            cryomodule_object.linac.cav_char_requested
-        )
-        cryomodule_object.rf_ramp_requested = cryomodule_object.linac.rf_ramp_requested
-
-        cryomodule_object.trigger_setup()
-
+from setup_linac import SETUP_MACHINE, SetupCryomodule, SetupLinac
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -41,8 +23,14 @@ if __name__ == "__main__":
     args = parser.parse_args()
     print(args)
     linac_number: int = args.linac
+    linac_object: SetupLinac = SETUP_MACHINE.linacs[linac_number]
+
+    cm_objects: List[SetupCryomodule] = [
+        SETUP_MACHINE.cryomodules[cm_name] for cm_name in LINAC_CM_DICT[linac_number]
+    ]
 
-    for cm_name in LINAC_CM_DICT[linac_number]:
-        cm_object: SetupCryomodule = SETUP_MACHINE.cryomodules[cm_name]
-        setup_cryomodule(cm_object)
-        sleep(0.5)
+    if args.shutdown:
+        linac_object.trigger_shutdowns(cm_objects)
+
+    else:
+        linac_object.propagate_setup_options(cm_objects)
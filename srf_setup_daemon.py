@@ -0,0 +1,237 @@
+"""
+Serves the per cavity setup and shutdown requests (SETUPSTRT/OFFSTRT) from
+one long running process.
+
+The IOC still starts srf_cavity_setup_launcher.py on the same PVs, so while
+this daemon runs it holds a lock file (SRF_SETUP_DAEMON_LOCK, by default
+~/.srf_auto_setup/daemon.lock) and launchers started on the same host exit
+without doing anything. If the daemon runs on another host than the one the
+IOC starts the launchers on, the lock can not be seen there and the
+launcher has to be disabled in the IOC instead, or every request runs twice.
+"""
+import argparse
+import dataclasses
+import signal
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Condition, Event
+from time import perf_counter
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from lcls_tools.superconducting.sc_linac_utils import ALL_CRYOMODULES
+
+from daemon_lock import DaemonLock
+from pv_registry import PV_REGISTRY
+from setup_engine import DEFAULT_MAX_WORKERS, run_cavity
+from setup_linac import SETUP_MACHINE, STATUS_ERROR_VALUE, SetupCavity, SetupMachine
+
+CavityKey = Tuple[str, int]
+
+
+@dataclasses.dataclass
+class DaemonStats:
+    admitted: int = 0
+    queued: int = 0
+    rejected: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class SetupDaemon:
+    """
+    Long running replacement for starting srf_cavity_setup_launcher.py once
+    per request. Monitors every cavity's SETUPSTRT and OFFSTRT PVs and runs
+    the setup/shutdown on a worker pool inside this (already warm) process.
+
+    A request for a cavity that already has one in flight is rejected, and
+    at most max_per_cryomodule cavities per cryomodule run at once; the rest
+    wait in a per cryomodule queue.
+    """
+
+    def __init__(
+        self,
+        cm_names: Iterable[str] = ALL_CRYOMODULES,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_per_cryomodule: Optional[int] = None,
+        machine: SetupMachine = SETUP_MACHINE,
+        lock: Optional[DaemonLock] = None,
+    ):
+        """
+        :param lock: held while the daemon runs so launchers on this host
+                     leave the requests to it, the default lock file if None
+        """
+        self.cm_names: List[str] = list(cm_names)
+        self.max_per_cryomodule = max_per_cryomodule
+        self.machine = machine
+        self.stats = DaemonStats()
+        self.lock = lock or DaemonLock()
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = Condition()
+        self._in_flight: Set[CavityKey] = set()
+        self._running_per_cm: Dict[str, int] = defaultdict(int)
+        self._queues: Dict[str, Deque[Tuple[SetupCavity, bool]]] = defaultdict(deque)
+        self._subscriptions: List[Tuple] = []
+        self._stopped = Event()
+
+    @property
+    def cavities(self) -> List[SetupCavity]:
+        return [
+            cavity
+            for cm_name in self.cm_names
+            for cavity in self.machine.cryomodules[cm_name].cavities.values()
+        ]
+
+    @property
+    def in_flight(self) -> List[CavityKey]:
+        with self._lock:
+            return sorted(self._in_flight)
+
+    def wait_idle(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until no request is running or queued
+        :return: False if the timeout ran out first
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: not self._in_flight, timeout=timeout)
+
+    def start(self):
+        """
+        :raise DaemonLockError: if another daemon is already running
+        """
+        self.lock.acquire()
+        cavities = self.cavities
+        PV_REGISTRY.connect([pv for cavity in cavities for pv in cavity.auto_pv_objs])
+
+        request_pvs = [
+            (cavity, pv, shutdown)
+            for cavity in cavities
+            for pv, shutdown in (
+                (cavity.start_pv_obj, False),
+                (cavity.shutoff_pv_obj, True),
+            )
+        ]
+        # Callbacks only see monitor events after they are added, so waiting
+        # for the current values first keeps a stale start value (the one
+        # delivered on connection) from launching a setup
+        PV_REGISTRY.get_many([pv for _, pv, _ in request_pvs])
+
+        for cavity, pv, shutdown in request_pvs:
+            index = pv.add_callback(self._make_callback(cavity, shutdown))
+            self._subscriptions.append((pv, index))
+
+        print(f"Monitoring setup requests for {len(cavities)} cavities")
+
+    def stop(self):
+        for pv, index in self._subscriptions:
+            pv.remove_callback(index)
+        self._subscriptions = []
+
+        # Requests that have not started yet are dropped, running ones finish
+        with self._lock:
+            for queue in self._queues.values():
+                for cavity, _ in queue:
+                    self._in_flight.discard((cavity.cryomodule.name, cavity.number))
+                queue.clear()
+            self._lock.notify_all()
+        self._executor.shutdown(wait=True)
+        self.lock.release()
+        self._stopped.set()
+
+    def run_forever(self):
+        self.start()
+        self._stopped.wait()
+
+    def _make_callback(self, cavity: SetupCavity, shutdown: bool):
+        def on_request(value=None, **kwargs):
+            if value:
+                self.submit(cavity, shutdown)
+
+        return on_request
+
+    def submit(self, cavity: SetupCavity, shutdown: bool = False) -> bool:
+        """
+        Admits a request. Only bookkeeping happens here since this runs on
+        the CA callback thread; all PV I/O happens in the workers.
+        :return: False if the cavity already has a request in flight
+        """
+        key: CavityKey = (cavity.cryomodule.name, cavity.number)
+        with self._lock:
+            if key in self._in_flight:
+                self.stats.rejected += 1
+                print(f"{cavity} already has a request in flight, ignoring")
+                return False
+
+            self._in_flight.add(key)
+            self.stats.admitted += 1
+
+            cm_name = key[0]
+            if (
+                self.max_per_cryomodule
+                and self._running_per_cm[cm_name] >= self.max_per_cryomodule
+            ):
+                self.stats.queued += 1
+                self._queues[cm_name].append((cavity, shutdown))
+            else:
+                self._dispatch(cavity, shutdown)
+        return True
+
+    def _dispatch(self, cavity: SetupCavity, shutdown: bool):
+        self._running_per_cm[cavity.cryomodule.name] += 1
+        started = perf_counter()
+        future = self._executor.submit(run_cavity, cavity, shutdown)
+        future.add_done_callback(lambda f: self._on_done(cavity, started, f))
+
+    def _on_done(self, cavity: SetupCavity, started: float, future: Future):
+        cm_name = cavity.cryomodule.name
+        try:
+            status, message = future.result()
+            print(f"{cavity} finished in {perf_counter() - started:.1f} s: {message}")
+            failed = status == STATUS_ERROR_VALUE
+        except Exception as e:
+            print(f"{cavity} failed: {e}")
+            failed = True
+
+        with self._lock:
+            self._in_flight.discard((cm_name, cavity.number))
+            self._running_per_cm[cm_name] -= 1
+            self.stats.completed += 1
+            self.stats.failed += failed
+            if self._queues[cm_name]:
+                self._dispatch(*self._queues[cm_name].popleft())
+            self._lock.notify_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cryomodules",
+        "-cm",
+        nargs="+",
+        choices=ALL_CRYOMODULES,
+        default=ALL_CRYOMODULES,
+        help="Cryomodules to serve, all by default",
+    )
+    parser.add_argument(
+        "--workers", "-w", type=int, default=DEFAULT_MAX_WORKERS, help="Pool size"
+    )
+    parser.add_argument(
+        "--max_per_cm",
+        type=int,
+        default=None,
+        help="Maximum number of cavities per cryomodule running at once",
+    )
+
+    args = parser.parse_args()
+    print(args)
+
+    daemon = SetupDaemon(
+        cm_names=args.cryomodules,
+        max_workers=args.workers,
+        max_per_cryomodule=args.max_per_cm,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
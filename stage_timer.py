@@ -0,0 +1,155 @@
+import dataclasses
+import json
+import os
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock, local
+from time import perf_counter, time
+from typing import Any, Callable, Dict, List, Optional
+
+# File to append one JSON record per timed setup to, unset to disable
+TIMING_LOG_ENV = "SRF_SETUP_TIMING_LOG"
+
+_current = local()
+_log_lock = Lock()
+
+
+@dataclasses.dataclass
+class RoundTripStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+@dataclasses.dataclass
+class StageRecord:
+    name: str
+    start: float
+    duration: Optional[float] = None
+    error: Optional[str] = None
+    pv_round_trips: int = 0
+    pv_time: float = 0.0
+
+
+class StageTimer:
+    """
+    Wall clock timing of the stages of one cavity's setup, plus every PV
+    get/put made from a TimedPV (see pv_registry) on the thread running a
+    stage. One timer per setup run; to_record() gives the JSON-able result.
+    """
+
+    def __init__(self, name: str, action: str = "setup"):
+        self.name = name
+        self.action = action
+        self.start = time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.stages: List[StageRecord] = []
+        self.round_trips: Dict[str, Dict[str, RoundTripStats]] = {}
+
+        self._started = perf_counter()
+        self._lock = Lock()
+
+    def __str__(self):
+        return f"{self.name} {self.action} timer"
+
+    @contextmanager
+    def stage(self, name: str, track_round_trips: bool = True):
+        """
+        Times the enclosed block as one stage
+        :param track_round_trips: attribute PV calls made on this thread to
+                                  the stage, only for blocks that run on a
+                                  thread of their own (not the event loop)
+        """
+        record = StageRecord(name=name, start=time())
+        previous = getattr(_current, "stage", None)
+        if track_round_trips:
+            _current.stage = (self, record)
+
+        started = perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record.error = str(e)
+            raise
+        finally:
+            record.duration = perf_counter() - started
+            if track_round_trips:
+                _current.stage = previous
+            with self._lock:
+                self.stages.append(record)
+
+    def timed(self, name: str, func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def record_round_trip(
+        self, record: StageRecord, pvname: str, operation: str, duration: float
+    ):
+        with self._lock:
+            record.pv_round_trips += 1
+            record.pv_time += duration
+            stats = self.round_trips.setdefault(pvname, {})
+            stats.setdefault(operation, RoundTripStats()).add(duration)
+
+    def finish(self, error: Optional[Exception] = None):
+        self.duration = perf_counter() - self._started
+        if error is not None:
+            self.error = str(error)
+
+    @property
+    def stage_durations(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage.name: stage.duration for stage in self.stages}
+
+    def to_record(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "action": self.action,
+                "start": self.start,
+                "duration": self.duration,
+                "error": self.error,
+                "stages": [dataclasses.asdict(stage) for stage in self.stages],
+                "round_trips": {
+                    pvname: {
+                        operation: dataclasses.asdict(op_stats)
+                        for operation, op_stats in stats.items()
+                    }
+                    for pvname, stats in self.round_trips.items()
+                },
+            }
+
+    def write_log(self, path: Optional[str] = None):
+        """
+        Appends this timer's record as one JSON line
+        :param path: defaults to the SRF_SETUP_TIMING_LOG environment variable,
+                     nothing is written if neither is set
+        """
+        path = path or os.environ.get(TIMING_LOG_ENV)
+        if not path:
+            return
+        line = json.dumps(self.to_record())
+        with _log_lock:
+            with open(path, "a") as log:
+                log.write(line + "\n")
+
+
+def record_round_trip(pvname: str, operation: str, duration: float):
+    """
+    Called by TimedPV after every get/put; a no-op unless a stage is being
+    timed on the calling thread
+    """
+    current = getattr(_current, "stage", None)
+    if current is not None:
+        timer, record = current
+        timer.record_round_trip(record, pvname, operation, duration)
@@ -0,0 +1,70 @@
+from threading import Condition, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+from epics import PV
+
+
+class StatusPublisher:
+    """
+    Writes queued PV updates from a background thread so the caller does not
+    wait on a network round-trip for every progress or message update. Writes
+    to a PV that has not gone out yet are merged, only the latest value is put.
+    """
+
+    def __init__(self, name: str = "status publisher"):
+        self.name = name
+        self.errors: List[Exception] = []
+
+        self._pending: Dict[str, Tuple[PV, Any]] = {}
+        self._in_flight: int = 0
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._pending) + self._in_flight
+
+    def publish(self, pv: PV, value: Any):
+        with self._condition:
+            # Re-inserting keeps the order of the most recent writes
+            self._pending.pop(pv.pvname, None)
+            self._pending[pv.pvname] = (pv, value)
+            self._start()
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until everything published so far has been written
+        :return: False if the timeout ran out first
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._in_flight, timeout=timeout
+            )
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending)
+                pvname = next(iter(self._pending))
+                pv, value = self._pending.pop(pvname)
+                self._in_flight += 1
+
+            try:
+                pv.put(value)
+            except Exception as e:
+                print(f"{self} failed to write {value} to {pvname}: {e}")
+                self.errors.append(e)
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    self._condition.notify_all()
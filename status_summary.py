@@ -0,0 +1,131 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PyQt5.QtCore import QEvent, QRectF, Qt, QTimer
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QSizePolicy, QToolTip, QWidget
+
+from setup_linac import STATUS_ERROR_VALUE, STATUS_READY_VALUE, STATUS_RUNNING_VALUE
+from status_table import CAVITIES_PER_CM, StatusTable
+
+STATUS_COLORS: Dict[int, QColor] = {
+    STATUS_READY_VALUE: QColor(46, 160, 67),
+    STATUS_RUNNING_VALUE: QColor(40, 110, 220),
+    STATUS_ERROR_VALUE: QColor(210, 45, 45),
+}
+STATUS_NAMES: Dict[int, str] = {
+    STATUS_READY_VALUE: "Ready",
+    STATUS_RUNNING_VALUE: "Running",
+    STATUS_ERROR_VALUE: "Error",
+}
+UNKNOWN_COLOR = QColor(150, 150, 150)
+BACKGROUND_COLOR = QColor(230, 230, 230)
+
+LABEL_HEIGHT = 16
+CELL_SIZE = 14
+DEFAULT_REFRESH_RATE = 2.0
+
+
+class StatusSummaryWidget(QWidget):
+    """
+    Heatmap of a StatusTable: one column per cryomodule, one row per cavity,
+    colored by setup status with running cavities filled up to their
+    progress. Repaints on a timer and only when the table changed.
+    """
+
+    def __init__(
+        self,
+        table: StatusTable,
+        refresh_rate: float = DEFAULT_REFRESH_RATE,
+        parent: QWidget = None,
+    ):
+        super().__init__(parent)
+        self.table = table
+        self._painted_version: Optional[int] = None
+
+        self.setMinimumSize(
+            len(table.cm_names) * CELL_SIZE, CAVITIES_PER_CM * CELL_SIZE + LABEL_HEIGHT
+        )
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(1000 / refresh_rate))
+        self._timer.timeout.connect(self.update_if_changed)
+        self._timer.start()
+
+    def update_if_changed(self):
+        if self.table.version != self._painted_version:
+            self.update()
+
+    def cell_size(self) -> Tuple[float, float]:
+        return (
+            self.width() / max(len(self.table.cm_names), 1),
+            (self.height() - LABEL_HEIGHT) / CAVITIES_PER_CM,
+        )
+
+    def cell_at(self, x: float, y: float) -> Optional[Tuple[str, int]]:
+        width, height = self.cell_size()
+        col, row = int(x // width), int((y - LABEL_HEIGHT) // height)
+        if y < LABEL_HEIGHT or not (0 <= col < len(self.table.cm_names)):
+            return None
+        if not (0 <= row < CAVITIES_PER_CM):
+            return None
+        return self.table.cm_names[col], row + 1
+
+    def paintEvent(self, event):
+        self._painted_version = self.table.version
+        # Copy so the monitors can keep writing while we paint
+        status = self.table["status"].copy()
+        progress = np.nan_to_num(self.table["progress"], nan=0.0) / 100
+
+        width, height = self.cell_size()
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), BACKGROUND_COLOR)
+
+        for col, cm_name in enumerate(self.table.cm_names):
+            painter.drawText(
+                QRectF(col * width, 0, width, LABEL_HEIGHT), Qt.AlignCenter, cm_name
+            )
+            for row in range(CAVITIES_PER_CM):
+                cell = QRectF(
+                    col * width + 1,
+                    LABEL_HEIGHT + row * height + 1,
+                    width - 2,
+                    height - 2,
+                )
+                value = status[col, row]
+                color = (
+                    UNKNOWN_COLOR
+                    if np.isnan(value)
+                    else STATUS_COLORS.get(int(value), UNKNOWN_COLOR)
+                )
+
+                if value == STATUS_RUNNING_VALUE:
+                    painter.fillRect(cell, color.lighter(170))
+                    filled = min(max(progress[col, row], 0), 1) * cell.width()
+                    cell.setWidth(filled)
+                painter.fillRect(cell, color)
+
+        painter.end()
+
+    def event(self, event) -> bool:
+        if event.type() == QEvent.ToolTip:
+            cell = self.cell_at(event.pos().x(), event.pos().y())
+            if cell is None:
+                QToolTip.hideText()
+            else:
+                QToolTip.showText(event.globalPos(), self.describe(*cell), self)
+            return True
+        return super().event(event)
+
+    def describe(self, cm_name: str, cav_num: int) -> str:
+        values = self.table.cavity_values(cm_name, cav_num)
+        status = values["status"]
+        status_name = (
+            "Unknown" if np.isnan(status) else STATUS_NAMES.get(int(status), "Unknown")
+        )
+        return (
+            f"CM{cm_name} Cavity {cav_num}: {status_name}"
+            f" ({values['progress']:.0f}%)\n"
+            f"AACT {values['aact']:.2f} MV / ACON {values['acon']:.2f} MV"
+        )
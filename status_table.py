@@ -0,0 +1,94 @@
+from functools import partial
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from epics import PV
+
+from pv_registry import PV_REGISTRY
+
+CAVITIES_PER_CM = 8
+
+# Field name and the cavity PV suffix it is monitored from
+FIELD_SUFFIXES: Dict[str, str] = {
+    "status": "AUTO:STATUS",
+    "progress": "AUTO:PROG",
+    "aact": "AACTMEAN",
+    "acon": "ACON",
+}
+FIELDS: Tuple[str, ...] = tuple(FIELD_SUFFIXES.keys())
+
+
+class StatusTable:
+    """
+    Setup state of every cavity held in one (field, cryomodule, cavity)
+    array. Monitor callbacks write single elements, so readers get the whole
+    machine as array views without touching any PVs. Missing values are NaN.
+    """
+
+    def __init__(self, cm_names: Iterable[str]):
+        self.cm_names: List[str] = list(cm_names)
+        self.cm_rows: Dict[str, int] = {
+            cm_name: row for row, cm_name in enumerate(self.cm_names)
+        }
+        self.data: np.ndarray = np.full(
+            (len(FIELDS), len(self.cm_names), CAVITIES_PER_CM), np.nan
+        )
+        # Bumped on every write so readers can tell if anything changed
+        self.version: int = 0
+
+        self._lock = Lock()
+        self._subscriptions: List[Tuple[PV, int]] = []
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """
+        :return: (cryomodule, cavity) view of one field
+        """
+        return self.data[FIELDS.index(field)]
+
+    def update(self, field: str, cm_name: str, cav_num: int, value: float):
+        self._write(FIELDS.index(field), self.cm_rows[cm_name], cav_num - 1, value)
+
+    def cavity_values(self, cm_name: str, cav_num: int) -> Dict[str, float]:
+        row = self.cm_rows[cm_name]
+        return {
+            field: self.data[idx, row, cav_num - 1] for idx, field in enumerate(FIELDS)
+        }
+
+    def status_counts(self) -> Dict[int, int]:
+        """
+        :return: number of cavities per status value, cavities without a
+                 status yet are left out
+        """
+        status = self["status"]
+        values, counts = np.unique(status[~np.isnan(status)], return_counts=True)
+        return {int(value): int(count) for value, count in zip(values, counts)}
+
+    def total_aact(self) -> float:
+        return float(np.nansum(self["aact"]))
+
+    def subscribe(self, machine):
+        """
+        Adds a monitor callback for every field of every cavity in the table
+        :param machine: SetupMachine the PV names are taken from
+        """
+        for cm_name in self.cm_names:
+            row = self.cm_rows[cm_name]
+            for cavity in machine.cryomodules[cm_name].cavities.values():
+                for idx, suffix in enumerate(FIELD_SUFFIXES.values()):
+                    pv = PV_REGISTRY.get_pv(cavity.pv_addr(suffix))
+                    callback = partial(self._on_value, idx, row, cavity.number - 1)
+                    self._subscriptions.append((pv, pv.add_callback(callback)))
+
+    def unsubscribe(self):
+        for pv, index in self._subscriptions:
+            pv.remove_callback(index)
+        self._subscriptions = []
+
+    def _on_value(self, field_idx: int, row: int, col: int, value=None, **kwargs):
+        self._write(field_idx, row, col, np.nan if value is None else value)
+
+    def _write(self, field_idx: int, row: int, col: int, value: float):
+        with self._lock:
+            self.data[field_idx, row, col] = value
+            self.version += 1
@@ -0,0 +1,71 @@
+from unittest import TestCase, mock
+
+from auto_pv import AutoPV, AutoPVMeta, auto_pv_fields
+
+
+class AutoObject(metaclass=AutoPVMeta):
+    __slots__ = ()
+
+    start_pv_obj = AutoPV("SETUPSTRT")
+    requested_pv_obj = AutoPV("SETUP_REQ", bool)
+
+    def __init__(self):
+        for field in auto_pv_fields(type(self)):
+            setattr(self, field, None)
+
+    def auto_pv_addr(self, suffix: str):
+        return "TEST:AUTO:" + suffix
+
+
+class ChildAutoObject(AutoObject):
+    __slots__ = ()
+
+    status_pv_obj = AutoPV("STATUS")
+
+
+class TestAutoPV(TestCase):
+    def test_names(self):
+        obj = AutoObject()
+        self.assertEqual(obj.start_pv, "TEST:AUTO:SETUPSTRT")
+        self.assertEqual(obj.requested_pv, "TEST:AUTO:SETUP_REQ")
+
+    @mock.patch("auto_pv.PV_REGISTRY")
+    def test_lazy_pv(self, registry):
+        obj = AutoObject()
+        registry.get_pv.assert_not_called()
+
+        pv = obj.start_pv_obj
+        self.assertIs(pv, obj.start_pv_obj)
+        registry.get_pv.assert_called_once_with("TEST:AUTO:SETUPSTRT")
+
+    def test_set_pv(self):
+        obj = AutoObject()
+        pv = mock.MagicMock()
+        obj.start_pv_obj = pv
+        self.assertIs(obj.start_pv_obj, pv)
+
+    def test_typed_value(self):
+        obj = AutoObject()
+        obj.requested_pv_obj = mock.MagicMock(get=mock.MagicMock(return_value=1))
+        self.assertIs(obj.requested, True)
+
+        obj.requested = False
+        obj.requested_pv_obj.put.assert_called_once_with(False)
+        self.assertFalse(hasattr(obj, "start"))
+
+    def test_fields(self):
+        self.assertEqual(
+            auto_pv_fields(ChildAutoObject),
+            ("start_pv_obj", "requested_pv_obj", "status_pv_obj"),
+        )
+
+    def test_slots(self):
+        self.assertEqual(AutoObject.__slots__, ("_start_pv_obj", "_requested_pv_obj"))
+        self.assertEqual(ChildAutoObject.__slots__, ("_status_pv_obj",))
+        self.assertFalse(hasattr(ChildAutoObject(), "__dict__"))
+
+    def test_bad_name(self):
+        with self.assertRaises((TypeError, RuntimeError)):
+
+            class BadObject:
+                start = AutoPV("SETUPSTRT")
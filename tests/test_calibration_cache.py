@@ -0,0 +1,125 @@
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from calibration_cache import (
+    CalibrationCache,
+    MaxAge,
+    NotWrittenSince,
+    cache_path,
+    hit_rates,
+)
+from pv_backends import InMemoryPV
+
+
+class TestCalibrationCache(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        self.cavity = mock.MagicMock(number=1)
+        self.cavity.cryomodule.name = "01"
+        self.cavity.hw_mode_pv_obj = InMemoryPV("HWMODE", 0)
+        self.cavity.quench_latch_pv_obj = InMemoryPV("QUENCH_LTCH", 0)
+
+        self.cache = CalibrationCache.for_cavity(self.cavity, self.directory)
+
+    def test_disabled(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(CalibrationCache.for_cavity(self.cavity))
+
+    def test_hit(self):
+        self.assertIsNone(self.cache.lookup(self.cavity, "ssa_cal"))
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+
+        reloaded = CalibrationCache(cache_path(self.directory, "01", 1))
+        self.assertEqual(
+            reloaded.lookup(self.cavity, "ssa_cal").results, {"slope": 1.5}
+        )
+        self.assertEqual(reloaded.hits["ssa_cal"], 1)
+        self.assertEqual(reloaded.misses["ssa_cal"], 1)
+
+    def test_expired(self):
+        cache = CalibrationCache(
+            self.cache.path, rules=[MaxAge({"characterize": 60})]
+        )
+        with mock.patch("calibration_cache.time", return_value=1000):
+            cache.store(self.cavity, "characterize", {"loaded_q": 4e7})
+        with mock.patch("calibration_cache.time", return_value=1061):
+            self.assertIsNone(cache.lookup(self.cavity, "characterize"))
+
+    def test_hw_mode_changed(self):
+        self.cache.store(self.cavity, "characterize", {"loaded_q": 4e7})
+        self.cavity.hw_mode_pv_obj.put(1)
+        self.assertIsNone(self.cache.lookup(self.cavity, "characterize"))
+
+    def test_hw_mode_back_online(self):
+        # e.g. to maintenance and back between two setups
+        self.cache.store(self.cavity, "characterize", {"loaded_q": 4e7})
+        self.cavity.hw_mode_pv_obj.put(1)
+        self.cavity.hw_mode_pv_obj.put(0)
+        self.assertIsNone(self.cache.lookup(self.cavity, "characterize"))
+
+    def test_record_processed(self):
+        # The latch record is scanned, processing with the same value
+        self.cache.store(self.cavity, "characterize", {"loaded_q": 4e7})
+        self.cavity.quench_latch_pv_obj.put(0)
+        self.assertIsNotNone(self.cache.lookup(self.cavity, "characterize"))
+
+    def test_waits_for_connection(self):
+        pv = self.cavity.quench_latch_pv_obj
+        pv.wait_for_connection = mock.MagicMock(return_value=True)
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        self.assertIsNotNone(self.cache.lookup(self.cavity, "ssa_cal"))
+        pv.wait_for_connection.assert_called_with(timeout=2.0)
+
+    def test_quench(self):
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        self.cavity.quench_latch_pv_obj.put(1)
+        self.assertIsNone(self.cache.lookup(self.cavity, "ssa_cal"))
+
+    def test_quench_reset_by_setup(self):
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        self.cavity.quench_latch_pv_obj.put(1)
+
+        self.cache.setup_started(self.cavity)
+        # The setup resets the interlocks before it looks the calibration up
+        self.cavity.quench_latch_pv_obj.put(0)
+        self.assertIsNone(self.cache.lookup(self.cavity, "ssa_cal"))
+
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.6})
+        self.cache.setup_started(self.cavity)
+        self.assertIsNotNone(self.cache.lookup(self.cavity, "ssa_cal"))
+
+    def test_disconnected(self):
+        rule = NotWrittenSince("HW mode", lambda cavity: cavity.hw_mode_pv_obj)
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        self.cavity.hw_mode_pv_obj.wait_for_connection = mock.MagicMock(
+            return_value=False
+        )
+        self.assertEqual(
+            rule.invalid_reason(
+                self.cavity, "ssa_cal", self.cache.entries["ssa_cal"], {}
+            ),
+            "HW mode unknown",
+        )
+
+    def test_invalidate(self):
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        self.cache.store(self.cavity, "characterize", {"loaded_q": 4e7})
+        self.cache.invalidate("ssa_cal")
+
+        self.assertIsNone(self.cache.lookup(self.cavity, "ssa_cal"))
+        self.assertIsNotNone(self.cache.lookup(self.cavity, "characterize"))
+
+    def test_hit_rates(self):
+        self.cache.store(self.cavity, "ssa_cal", {"slope": 1.5})
+        for _ in range(3):
+            self.cache.lookup(self.cavity, "ssa_cal")
+        self.cache.lookup(self.cavity, "characterize")
+
+        rates = hit_rates(self.directory)
+        self.assertEqual(rates["ssa_cal"]["hit_rate"], 1.0)
+        self.assertEqual(rates["characterize"]["misses"], 1)
+        self.assertEqual(rates["characterize"]["hit_rate"], 0.0)
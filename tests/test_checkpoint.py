@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from checkpoint import CHECKPOINT_MAX_AGES, CavityCheckpoint
+
+
+class TestCavityCheckpoint(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "checkpoints", "01_1.json")
+        self.checkpoint = CavityCheckpoint(self.path)
+
+    def test_persists(self):
+        self.checkpoint.record("ssa_cal", {"drive_max": 0.8})
+
+        reloaded = CavityCheckpoint(self.path)
+        self.assertTrue(reloaded.is_valid("ssa_cal", {"drive_max": 0.8}))
+        self.assertFalse(reloaded.is_valid("characterize", {}))
+
+    def test_inputs_changed(self):
+        self.checkpoint.record("ssa_cal", {"drive_max": 0.8})
+        self.assertFalse(self.checkpoint.is_valid("ssa_cal", {"drive_max": 0.7}))
+
+    def test_max_age(self):
+        with mock.patch("checkpoint.time", return_value=1000):
+            self.checkpoint.record("tune", {})
+        with mock.patch(
+            "checkpoint.time", return_value=1000 + CHECKPOINT_MAX_AGES["tune"] + 1
+        ):
+            self.assertFalse(self.checkpoint.is_valid("tune", {}))
+
+    def test_earlier_stage_redone(self):
+        with mock.patch("checkpoint.time", return_value=1000):
+            self.checkpoint.record("ssa_cal", {"drive_max": 0.8})
+            self.checkpoint.record("characterize", {})
+        with mock.patch("checkpoint.time", return_value=1001):
+            self.assertTrue(self.checkpoint.is_valid("characterize", {}))
+            self.checkpoint.record("ssa_cal", {"drive_max": 0.8})
+            self.assertFalse(self.checkpoint.is_valid("characterize", {}))
+
+    def test_clear(self):
+        self.checkpoint.record("tune", {})
+        self.checkpoint.clear()
+        self.assertFalse(CavityCheckpoint(self.path).is_valid("tune", {}))
+
+    def test_unreadable(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as file:
+            file.write("{not json")
+
+        checkpoint = CavityCheckpoint(self.path)
+        self.assertEqual(checkpoint.stages, {})
+        checkpoint.record("tune", {})
+        with open(self.path) as file:
+            self.assertIn("tune", json.load(file)["stages"])
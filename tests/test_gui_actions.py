@@ -0,0 +1,63 @@
+import os
+from threading import Event
+from time import monotonic
+from unittest import TestCase, mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from gui_actions import ActionRunner  # noqa: E402
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def make_button(text: str) -> mock.MagicMock:
+    return mock.MagicMock(text=mock.MagicMock(return_value=text))
+
+
+class TestActionRunner(TestCase):
+    def setUp(self):
+        self.runner = ActionRunner()
+        self.addCleanup(self.runner.shutdown)
+
+    def wait_for(self, outcomes, timeout=2.0):
+        deadline = monotonic() + timeout
+        while not outcomes and monotonic() < deadline:
+            app.processEvents()
+        self.assertTrue(outcomes, "on_done was not called")
+
+    def test_run(self):
+        button = make_button("Set Up")
+        release = Event()
+        outcomes = []
+
+        self.runner.run(
+            button, lambda: release.wait() and 42, outcomes.append, busy_text="Busy"
+        )
+        button.setEnabled.assert_called_once_with(False)
+        button.setText.assert_called_once_with("Busy")
+
+        release.set()
+        self.wait_for(outcomes)
+        self.assertEqual(outcomes, [42])
+        button.setText.assert_called_with("Set Up")
+        button.setEnabled.assert_called_with(True)
+
+    def test_run_error(self):
+        button = make_button("Set Up")
+        outcomes = []
+
+        def fail():
+            raise RuntimeError("IOC down")
+
+        self.runner.run(button, fail, outcomes.append)
+        self.wait_for(outcomes)
+        self.assertIsInstance(outcomes[0], RuntimeError)
+        button.setEnabled.assert_called_with(True)
+
+    def test_run_without_button(self):
+        outcomes = []
+        self.runner.run(None, lambda: "done", outcomes.append)
+        self.wait_for(outcomes)
+        self.assertEqual(outcomes, ["done"])
@@ -0,0 +1,79 @@
+import os
+from unittest import TestCase, mock
+
+from pv_backends import (
+    InMemoryBackend,
+    PV_BACKEND_ENV,
+    PyEpicsBackend,
+    backend_from_env,
+)
+from pv_registry import PVRegistry
+
+
+class TestInMemoryBackend(TestCase):
+    def setUp(self):
+        self.backend = InMemoryBackend({"TEST:STATUS": 1})
+
+    def test_initial_values(self):
+        self.assertEqual(self.backend.create_pv("TEST:STATUS").get(), 1)
+        self.assertEqual(self.backend.create_pv("TEST:OTHER").get(), 0)
+        self.assertIs(
+            self.backend.create_pv("TEST:STATUS"), self.backend.create_pv("TEST:STATUS")
+        )
+
+    def test_put_callbacks(self):
+        pv = self.backend.create_pv("TEST:PROG")
+        monitor = mock.MagicMock()
+        completion = mock.MagicMock()
+        index = pv.add_callback(monitor)
+
+        pv.put(50, wait=False, callback=completion)
+        monitor.assert_called_once_with(pvname="TEST:PROG", value=50)
+        completion.assert_called_once_with(pvname="TEST:PROG")
+
+        pv.remove_callback(index)
+        self.backend["TEST:PROG"] = 75
+        monitor.assert_called_once()
+        self.assertEqual(self.backend["TEST:PROG"], 75)
+
+    def test_as_string(self):
+        self.backend["TEST:MSG"] = "Ramping"
+        pv = self.backend.create_pv("TEST:MSG")
+        self.assertEqual(pv.get(as_string=True), "Ramping")
+
+
+class TestBackendFromEnv(TestCase):
+    def test_default(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsInstance(backend_from_env(), PyEpicsBackend)
+
+    def test_memory(self):
+        with mock.patch.dict(os.environ, {PV_BACKEND_ENV: "memory"}):
+            self.assertIsInstance(backend_from_env(), InMemoryBackend)
+
+    def test_unknown(self):
+        with mock.patch.dict(os.environ, {PV_BACKEND_ENV: "bogus"}):
+            self.assertRaises(ValueError, backend_from_env)
+
+
+class TestRegistryBackend(TestCase):
+    def setUp(self):
+        self.backend = InMemoryBackend()
+        self.registry = PVRegistry(backend=self.backend)
+
+    def test_get_pv(self):
+        self.assertIs(
+            self.registry.get_pv("TEST:PV"), self.backend.create_pv("TEST:PV")
+        )
+
+    def test_batches(self):
+        names = [f"TEST:PV{i}" for i in range(100)]
+        self.registry.put_many({name: i for i, name in enumerate(names)})
+        self.assertEqual(self.registry.get_many(names), list(range(100)))
+
+    def test_set_backend(self):
+        old_pv = self.registry.get_pv("TEST:PV")
+        self.registry.set_backend(InMemoryBackend({"TEST:PV": 5}))
+
+        self.assertIsNot(self.registry.get_pv("TEST:PV"), old_pv)
+        self.assertEqual(self.registry.get_pv("TEST:PV").get(), 5)
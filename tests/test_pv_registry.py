@@ -0,0 +1,78 @@
+from unittest import TestCase, mock
+
+from lcls_tools.common.controls.pyepics.utils import PVInvalidError
+
+from pv_registry import PVRegistry
+
+
+def mock_connected_pv(pvname, get_val=None, connected=True) -> mock.MagicMock:
+    def put(value, wait=False, callback=None, **kwargs):
+        if callback:
+            callback(pvname=pvname)
+
+    mock_pv = mock.MagicMock(pvname=pvname)
+    mock_pv.wait_for_connection = mock.MagicMock(return_value=connected)
+    mock_pv.get = mock.MagicMock(return_value=get_val)
+    mock_pv.put = mock.MagicMock(side_effect=put)
+    return mock_pv
+
+
+class TestPVRegistry(TestCase):
+    def setUp(self):
+        self.registry = PVRegistry(connection_timeout=0.1)
+
+    @mock.patch("pv_backends.TimedPV")
+    def test_get_pv_shared(self, mock_pv_class):
+        pv = self.registry.get_pv("TEST:PV")
+        self.assertIs(pv, self.registry.get_pv("TEST:PV"))
+        mock_pv_class.assert_called_once_with("TEST:PV")
+        self.assertIn("TEST:PV", self.registry)
+
+    def test_connect(self):
+        connected = mock_connected_pv("TEST:CONNECTED")
+        unconnected = mock_connected_pv("TEST:UNCONNECTED", connected=False)
+
+        self.assertEqual(
+            self.registry.connect([connected, unconnected]), ["TEST:UNCONNECTED"]
+        )
+        connected.wait_for_connection.assert_called()
+        unconnected.wait_for_connection.assert_called()
+
+    def test_get_many(self):
+        pvs = [mock_connected_pv(f"TEST:PV{i}", get_val=i) for i in range(3)]
+        self.assertEqual(self.registry.get_many(pvs), [0, 1, 2])
+
+    def test_get_many_unconnected(self):
+        pvs = [mock_connected_pv("TEST:PV", connected=False)]
+        self.assertRaises(PVInvalidError, self.registry.get_many, pvs)
+
+    def test_put_many(self):
+        pvs = [mock_connected_pv(f"TEST:PV{i}") for i in range(3)]
+        self.registry.put_many({pv: 1 for pv in pvs})
+        for pv in pvs:
+            pv.put.assert_called_once()
+            self.assertEqual(pv.put.call_args.args[0], 1)
+
+    def test_put_many_incomplete(self):
+        pv = mock_connected_pv("TEST:PV")
+        pv.put = mock.MagicMock()
+        self.assertRaises(PVInvalidError, self.registry.put_many, {pv: 1}, timeout=0.01)
+
+    def test_try_put_many(self):
+        completed = mock_connected_pv("TEST:COMPLETED")
+        incomplete = mock_connected_pv("TEST:INCOMPLETE")
+        incomplete.put = mock.MagicMock()
+        unconnected = mock_connected_pv("TEST:UNCONNECTED", connected=False)
+
+        failures = self.registry.try_put_many(
+            {completed: 1, incomplete: 2, unconnected: 3}, timeout=0.01
+        )
+        self.assertEqual(
+            failures,
+            {
+                "TEST:INCOMPLETE": "put did not complete",
+                "TEST:UNCONNECTED": "not connected",
+            },
+        )
+        completed.put.assert_called_once()
+        unconnected.put.assert_not_called()
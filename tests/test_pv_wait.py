@@ -0,0 +1,153 @@
+import asyncio
+from threading import Timer
+from unittest import TestCase, mock
+
+from pv_wait import (
+    AbortToken,
+    PVCondition,
+    PVWaitAbortedError,
+    PVWaitTimeoutError,
+    wait_for_pv,
+)
+
+
+class FakeMonitoredPV:
+    def __init__(self, pvname, value=None):
+        self.pvname = pvname
+        self.value = value
+        self.callbacks = {}
+
+    def get(self):
+        return self.value
+
+    def add_callback(self, callback):
+        index = len(self.callbacks) + 1
+        self.callbacks[index] = callback
+        return index
+
+    def remove_callback(self, index):
+        self.callbacks.pop(index, None)
+
+    def post(self, value):
+        self.value = value
+        for callback in list(self.callbacks.values()):
+            callback(pvname=self.pvname, value=value)
+
+
+class TestAbortToken(TestCase):
+    def setUp(self):
+        self.abort_pv = FakeMonitoredPV("TEST:ABORT", value=0)
+        self.token = AbortToken(self.abort_pv)
+
+    def test_initial_value(self):
+        self.abort_pv.value = 1
+        self.assertTrue(self.token.is_set)
+
+    def test_monitor_updates(self):
+        self.assertFalse(self.token.is_set)
+        self.abort_pv.post(1)
+        self.assertTrue(self.token.is_set)
+        self.abort_pv.post(0)
+        self.assertFalse(self.token.is_set)
+
+    def test_single_subscription(self):
+        self.token.subscribe()
+        self.token.subscribe()
+        self.assertEqual(len(self.abort_pv.callbacks), 1)
+
+        self.token.unsubscribe()
+        self.assertEqual(self.abort_pv.callbacks, {})
+
+    def test_clear(self):
+        self.abort_pv.post(1)
+        self.token.subscribe()
+        self.token.clear()
+        self.assertFalse(self.token.is_set)
+
+    def test_listeners(self):
+        listener = mock.MagicMock()
+        listener_id = self.token.add_listener(listener)
+        self.token.subscribe()
+
+        self.abort_pv.post(1)
+        listener.assert_called_once()
+
+        self.token.remove_listener(listener_id)
+        self.abort_pv.post(1)
+        listener.assert_called_once()
+
+    def test_wait(self):
+        Timer(0.05, self.abort_pv.post, args=(1,)).start()
+        self.assertTrue(self.token.wait(timeout=1))
+
+
+class TestPVCondition(TestCase):
+    def setUp(self):
+        self.pv = FakeMonitoredPV("TEST:MODE", value=0)
+        self.abort_pv = FakeMonitoredPV("TEST:ABORT", value=0)
+
+    def test_already_satisfied(self):
+        self.pv.value = 4
+        self.assertEqual(wait_for_pv(self.pv, lambda value: value == 4, timeout=1), 4)
+        self.assertEqual(self.pv.callbacks, {})
+
+    def test_monitor_update(self):
+        Timer(0.05, self.pv.post, args=(4,)).start()
+        self.assertEqual(wait_for_pv(self.pv, lambda value: value == 4, timeout=1), 4)
+        self.assertEqual(self.pv.callbacks, {})
+
+    def test_timeout(self):
+        self.assertRaises(
+            PVWaitTimeoutError,
+            wait_for_pv,
+            self.pv,
+            lambda value: value == 4,
+            timeout=0.05,
+        )
+        self.assertEqual(self.pv.callbacks, {})
+
+    def test_abort(self):
+        abort_check = mock.MagicMock()
+        Timer(0.05, self.abort_pv.post, args=(1,)).start()
+
+        condition = PVCondition(
+            self.pv,
+            lambda value: value == 4,
+            abort_token=AbortToken(self.abort_pv),
+            abort_check=abort_check,
+        )
+        self.assertRaises(PVWaitAbortedError, condition.wait, timeout=1)
+        abort_check.assert_called_once()
+        self.assertEqual(self.pv.callbacks, {})
+
+    def test_abort_check_error(self):
+        abort_check = mock.MagicMock(side_effect=ValueError("aborted"))
+        self.abort_pv.value = 1
+
+        self.assertRaises(
+            ValueError,
+            wait_for_pv,
+            self.pv,
+            lambda value: value == 4,
+            timeout=1,
+            abort_token=AbortToken(self.abort_pv),
+            abort_check=abort_check,
+        )
+
+    def test_done_callback(self):
+        done = mock.MagicMock()
+        condition = PVCondition(self.pv, lambda value: value == 4)
+        condition.add_done_callback(done)
+        done.assert_not_called()
+
+        self.pv.post(4)
+        done.assert_called_once_with(condition.future)
+
+    def test_wait_async(self):
+        async def run():
+            asyncio.get_running_loop().call_later(0.05, self.pv.post, 4)
+            return await PVCondition(self.pv, lambda value: value == 4).wait_async(
+                timeout=1
+            )
+
+        self.assertEqual(asyncio.run(run()), 4)
@@ -0,0 +1,101 @@
+from threading import Lock
+from unittest import TestCase, mock
+
+from lcls_tools.superconducting.sc_linac_utils import CavityAbortError
+
+from pv_backends import InMemoryPV
+from ramp_engine import RampEngine
+
+
+def make_cavity(name: str, ades: float) -> mock.MagicMock:
+    cavity = mock.MagicMock(ades=ades, is_quenched=False)
+    cavity.__str__.return_value = name
+    cavity.ades_pv_obj = InMemoryPV(f"{name}:ADES", ades)
+    return cavity
+
+
+class ActiveTracker:
+    """
+    Counts how many cavities change ADES in each tick
+    """
+
+    def __init__(self, engine: RampEngine, cavities):
+        self.engine = engine
+        self.lock = Lock()
+        self.per_tick = {}
+        for cavity in cavities:
+            cavity.ades_pv_obj.add_callback(self.on_put)
+
+    def on_put(self, **kwargs):
+        with self.lock:
+            tick = self.engine.ticks
+            self.per_tick[tick] = self.per_tick.get(tick, 0) + 1
+
+
+class TestRampEngine(TestCase):
+    def setUp(self):
+        self.cavities = [make_cavity(f"CAV{num}", 5) for num in range(8)]
+
+    def test_ramp_all(self):
+        engine = RampEngine(tick=0.001)
+        errors = engine.ramp_all({cavity: 5.5 for cavity in self.cavities})
+
+        self.assertEqual(set(errors.values()), {None})
+        for cavity in self.cavities:
+            self.assertEqual(cavity.ades_pv_obj.get(), 5.5)
+        # Lockstep: eight cavities take as many ticks as one
+        self.assertEqual(engine.ticks, 5)
+        self.assertAlmostEqual(engine.peak_rate, 8 * 0.1 / 0.001)
+
+    def test_ramp_down(self):
+        engine = RampEngine(tick=0.001)
+        engine.walk_amp(self.cavities[0], 4.75)
+        self.assertEqual(self.cavities[0].ades_pv_obj.get(), 4.75)
+        self.assertEqual(engine.ticks, 3)
+
+    def test_max_rate(self):
+        engine = RampEngine(max_rate=200, tick=0.001)
+        errors = engine.ramp_all({cavity: 5.5 for cavity in self.cavities})
+
+        self.assertEqual(set(errors.values()), {None})
+        self.assertLessEqual(engine.peak_rate, 200 + 1e-9)
+        # 4 MV in total at 0.2 MV per tick
+        self.assertGreaterEqual(engine.ticks, 20)
+        for cavity in self.cavities:
+            self.assertEqual(cavity.ades_pv_obj.get(), 5.5)
+
+    def test_max_active(self):
+        engine = RampEngine(max_active=3, tick=0.001)
+        tracker = ActiveTracker(engine, self.cavities)
+        errors = engine.ramp_all({cavity: 5.3 for cavity in self.cavities})
+
+        self.assertEqual(set(errors.values()), {None})
+        self.assertLessEqual(max(tracker.per_tick.values()), 3)
+        self.assertEqual(engine.active, 0)
+        self.assertEqual(engine.queued, 0)
+
+    def test_abort(self):
+        aborted = self.cavities[0]
+        aborted.check_abort.side_effect = CavityAbortError("Abort requested")
+
+        engine = RampEngine(tick=0.001)
+        errors = engine.ramp_all({cavity: 5.5 for cavity in self.cavities})
+
+        self.assertIsInstance(errors[aborted], CavityAbortError)
+        self.assertEqual(aborted.ades_pv_obj.get(), 5)
+        for cavity in self.cavities[1:]:
+            self.assertIsNone(errors[cavity])
+
+    def test_quench(self):
+        self.cavities[0].is_quenched = True
+        engine = RampEngine(tick=0.001)
+        errors = engine.ramp_all({cavity: 5.5 for cavity in self.cavities[:2]})
+
+        self.assertIsNotNone(errors[self.cavities[0]])
+        self.assertIsNone(errors[self.cavities[1]])
+
+    def test_attach(self):
+        engine = RampEngine()
+        engine.attach(self.cavities)
+        for cavity in self.cavities:
+            self.assertIs(cavity.ramp_engine, engine)
@@ -0,0 +1,56 @@
+import os
+from unittest import TestCase, mock
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from readback_aggregator import ReadbackAggregator  # noqa: E402
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def make_pv(pvname: str, value: float) -> mock.MagicMock:
+    pv = mock.MagicMock(pvname=pvname, connected=True)
+    pv.get = mock.MagicMock(return_value=value)
+    return pv
+
+
+class TestReadbackAggregator(TestCase):
+    def setUp(self):
+        self.pvs = [make_pv(f"ACCL:L{i}B:1:AACTMEANSUM", 10.0 * i) for i in range(4)]
+        self.aggregator = ReadbackAggregator(self.pvs)
+        self.totals = []
+        self.aggregator.updated.connect(self.totals.append)
+
+    def tearDown(self):
+        self.aggregator.stop()
+
+    def test_start(self):
+        self.aggregator.start()
+        for pv in self.pvs:
+            pv.add_callback.assert_called_once_with(self.aggregator.on_value)
+        self.assertEqual(self.aggregator.total, 60)
+
+    def test_on_value(self):
+        self.aggregator.start()
+        self.aggregator.on_value(pvname="ACCL:L2B:1:AACTMEANSUM", value=25.0)
+        self.assertEqual(self.aggregator.total, 65)
+
+        # No blocking reads after the initial values
+        for pv in self.pvs:
+            pv.get.assert_called_once()
+
+    def test_ignores_none(self):
+        self.aggregator.start()
+        self.aggregator.on_value(pvname="ACCL:L2B:1:AACTMEANSUM", value=None)
+        self.assertEqual(self.aggregator.total, 60)
+
+    def test_emit_coalesced(self):
+        self.aggregator.start()
+        for value in range(100):
+            self.aggregator.on_value(pvname="ACCL:L1B:1:AACTMEANSUM", value=value)
+
+        self.aggregator.emit_if_changed()
+        self.aggregator.emit_if_changed()
+        self.assertEqual(self.totals, [50 + 99])
@@ -0,0 +1,102 @@
+import asyncio
+from collections import defaultdict
+from threading import Lock
+from time import sleep
+from unittest import TestCase, mock
+
+from lcls_tools.superconducting.sc_linac_utils import DetuneError
+
+from setup_engine import SetupEngine
+from setup_linac import STATUS_ERROR_VALUE, STATUS_READY_VALUE
+
+
+class ConcurrencyTracker:
+    def __init__(self):
+        self.lock = Lock()
+        self.running = defaultdict(int)
+        self.max_running = defaultdict(int)
+
+    def make_cavity(self, cm_name: str, cav_num: int) -> mock.MagicMock:
+        def setup():
+            with self.lock:
+                self.running[cm_name] += 1
+                self.max_running[cm_name] = max(
+                    self.max_running[cm_name], self.running[cm_name]
+                )
+            sleep(0.01)
+            with self.lock:
+                self.running[cm_name] -= 1
+
+        cavity = mock.MagicMock(number=cav_num, status=STATUS_READY_VALUE)
+        cavity.cryomodule.name = cm_name
+        cavity.setup = mock.MagicMock(side_effect=setup)
+        cavity.async_setup = mock.AsyncMock(side_effect=setup)
+        cavity.status_msg_pv_obj.get = mock.MagicMock(return_value="done")
+        return cavity
+
+
+class TestSetupEngine(TestCase):
+    def setUp(self):
+        self.tracker = ConcurrencyTracker()
+        self.cavities = [
+            self.tracker.make_cavity(cm_name, cav_num)
+            for cm_name in ["01", "02"]
+            for cav_num in range(1, 9)
+        ]
+
+    def test_run_all(self):
+        report = SetupEngine(max_workers=16).run(self.cavities)
+
+        self.assertEqual(len(report.results), 16)
+        self.assertEqual(len(report.succeeded), 16)
+        for cavity in self.cavities:
+            cavity.setup.assert_called_once()
+
+    def test_shutdown(self):
+        SetupEngine(max_workers=4).run(self.cavities, shutdown=True)
+        for cavity in self.cavities:
+            cavity.shut_down.assert_called_once()
+            cavity.setup.assert_not_called()
+
+    def test_max_per_cryomodule(self):
+        SetupEngine(max_workers=16, max_per_cryomodule=2).run(self.cavities)
+        self.assertLessEqual(self.tracker.max_running["01"], 2)
+        self.assertLessEqual(self.tracker.max_running["02"], 2)
+
+    def test_failures_reported(self):
+        self.cavities[0].setup = mock.MagicMock(side_effect=DetuneError("detuned"))
+        self.cavities[1].status = STATUS_ERROR_VALUE
+
+        report = SetupEngine(max_workers=4).run(self.cavities)
+        self.assertEqual(len(report.failed), 2)
+        self.assertIn("detuned", report.summary())
+
+    def test_submit_failure(self):
+        engine = SetupEngine(max_workers=4, max_per_cryomodule=1)
+        submit = engine._submit
+
+        def failing_submit(executor, cavity, shutdown):
+            if cavity.number == 3:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            return submit(executor, cavity, shutdown)
+
+        engine._submit = failing_submit
+        report = engine.run(self.cavities)
+
+        self.assertEqual(len(report.results), 16)
+        self.assertEqual(len(report.failed), 2)
+        self.assertTrue(all(r.cav_num == 3 for r in report.failed))
+        self.assertEqual(len(report.succeeded), 14)
+
+    def test_empty(self):
+        report = SetupEngine().run([])
+        self.assertEqual(report.results, [])
+
+    def test_run_async(self):
+        report = asyncio.run(
+            SetupEngine(max_per_cryomodule=2).run_async(self.cavities)
+        )
+
+        self.assertEqual(len(report.succeeded), 16)
+        for cavity in self.cavities:
+            cavity.async_setup.assert_awaited_once()
@@ -1,13 +1,24 @@
+import asyncio
+import tempfile
+import threading
 from unittest import TestCase, mock
 
+import numpy as np
+from lcls_tools.common.controls.pyepics.utils import PVInvalidError
 from lcls_tools.superconducting.sc_linac import MACHINE
 from lcls_tools.superconducting.sc_linac_utils import (
     CavityAbortError,
     HW_MODE_MAINTENANCE_VALUE,
     HW_MODE_ONLINE_VALUE,
     RF_MODE_SELA,
+    RF_MODE_SELAP,
 )
+from calibration_cache import CalibrationCache
+from checkpoint import CavityCheckpoint
+from pv_backends import InMemoryBackend, InMemoryPV
+from pv_registry import PVRegistry
 from setup_linac import (
+    LazyDict,
     SETUP_MACHINE,
     SetupCavity,
     STATUS_RUNNING_VALUE,
@@ -16,6 +27,7 @@ from setup_linac import (
     SetupCryomodule,
     SetupLinac,
     SetupMachine,
+    run_coroutine,
 )
 
 
@@ -38,6 +50,7 @@ class TestSetupCavity(TestCase):
 
         self.mock_abort_pv_obj = mock_pv_obj(self.setup_cavity.abort_pv)
         self.setup_cavity._abort_pv_obj = self.mock_abort_pv_obj
+        self.setup_cavity._abort_token = None
 
         self.mock_start_pv_obj = mock_pv_obj(pvname=self.setup_cavity.start_pv)
         self.setup_cavity._start_pv_obj = self.mock_start_pv_obj
@@ -88,6 +101,15 @@ class TestSetupCavity(TestCase):
         )
         self.setup_cavity._rf_ramp_requested_pv_obj = self.mock_rf_ramp_pv_obj
 
+        self.setup_cavity._timing_pv_objs = {}
+
+        checkpoint_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(checkpoint_dir.cleanup)
+        self.setup_cavity._checkpoint = CavityCheckpoint.for_cavity(
+            self.setup_cavity, checkpoint_dir.name
+        )
+        self.setup_cavity.resume = False
+
     def test_auto_pv_addr(self):
         suffix = "suffix"
         self.assertEqual(
@@ -95,6 +117,30 @@ class TestSetupCavity(TestCase):
             self.setup_cavity.auto_pv_addr(suffix),
         )
 
+    def test_auto_pv_objs_skip_timing(self):
+        timing_pv = mock_pv_obj(self.setup_cavity.timing_pvs["total"])
+        self.setup_cavity._timing_pv_objs = {"total": timing_pv}
+        auto_pv_objs = self.setup_cavity.auto_pv_objs
+        self.assertNotIn(timing_pv, auto_pv_objs)
+        self.assertIn(self.mock_status_pv_obj, auto_pv_objs)
+
+    @mock.patch("setup_linac.PV_REGISTRY")
+    def test_snapshot_auto_pvs(self, mock_registry):
+        mock_registry.get_many = mock.MagicMock(
+            side_effect=lambda pvs, timeout=None: [pv.pvname for pv in pvs]
+        )
+        snapshot = self.setup_cavity.snapshot_auto_pvs()
+        self.assertEqual(
+            snapshot["ssa_cal_requested_pv_obj"],
+            self.setup_cavity.ssa_cal_requested_pv,
+        )
+        self.assertEqual(snapshot["progress_pv_obj"], self.setup_cavity.progress_pv)
+
+        self.setup_cavity.put_auto_pvs({"status_msg_pv_obj": "msg"}, wait=False)
+        mock_registry.put_many.assert_called_once_with(
+            {self.mock_status_msg_pv_obj: "msg"}, wait=False
+        )
+
     def test_ssa_cal_requested(self):
         self.mock_ssa_cal_pv_obj.get = mock.MagicMock(return_value=True)
         self.assertTrue(self.setup_cavity.ssa_cal_requested)
@@ -125,17 +171,60 @@ class TestSetupCavity(TestCase):
 
     def test_abort_requested(self):
         """
-        Assert that abort_requested returns the boolean value of the abort PV
+        Assert that abort_requested follows the abort PV's monitor without
+        issuing a get for every check
         :return: None
         """
-        attrs = {"get.return_value": True}
+        attrs = {"get.return_value": False}
         self.mock_abort_pv_obj.configure_mock(**attrs)
+        self.assertFalse(self.setup_cavity.abort_requested)
+
+        monitor_callback = self.mock_abort_pv_obj.add_callback.call_args.args[0]
+        monitor_callback(value=1)
         self.assertTrue(self.setup_cavity.abort_requested)
 
-        attrs = {"get.return_value": False}
-        self.mock_abort_pv_obj.configure_mock(**attrs)
+        monitor_callback(value=0)
+        self.assertFalse(self.setup_cavity.abort_requested)
+        self.mock_abort_pv_obj.get.assert_called_once()
+
+    def test_abort_sets_flags(self):
+        self.mock_abort_pv_obj.get = mock.MagicMock(return_value=False)
+        self.setup_cavity.abort_token.subscribe()
+
+        monitor_callback = self.mock_abort_pv_obj.add_callback.call_args.args[0]
+        monitor_callback(value=1)
+        self.assertTrue(self.setup_cavity.abort_flag)
+        self.assertTrue(self.setup_cavity.stepper_tuner.abort_flag)
+
+        self.setup_cavity.clear_abort()
+        self.assertFalse(self.setup_cavity.abort_flag)
+        self.assertFalse(self.setup_cavity.stepper_tuner.abort_flag)
         self.assertFalse(self.setup_cavity.abort_requested)
 
+    def test_abort_before_first_check(self):
+        self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(
+            return_value=HW_MODE_ONLINE_VALUE
+        )
+        self.mock_abort_pv_obj.get = mock.MagicMock(return_value=False)
+        flags = []
+
+        def turn_off():
+            monitor_callback = self.mock_abort_pv_obj.add_callback.call_args.args[0]
+            monitor_callback(value=1)
+            flags.append(
+                (
+                    self.setup_cavity.abort_flag,
+                    self.setup_cavity.stepper_tuner.abort_flag,
+                )
+            )
+
+        self.setup_cavity.turn_off.side_effect = turn_off
+        self.setup_cavity.setup()
+
+        self.assertEqual(flags, [(True, True)])
+        self.mock_status_pv_obj.put.assert_called_with(STATUS_ERROR_VALUE)
+
     def test_clear_abort(self):
         """
         Assert that clearing the abort means writing 0 to the abort PV
@@ -280,6 +369,64 @@ class TestSetupCavity(TestCase):
             f"{self.setup_cavity} SSA Calibrated"
         )
 
+    def test_setup_calibrations_cached(self):
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
+        self.mock_ssa_cal_pv_obj.get = mock.MagicMock(return_value=True)
+        self.mock_cav_char_pv_obj.get = mock.MagicMock(return_value=True)
+        self.setup_cavity.ssa.calibrate = mock.MagicMock()
+        self.setup_cavity.characterize = mock.MagicMock()
+        self.setup_cavity._calibration_cache = mock.MagicMock()
+        self.addCleanup(setattr, self.setup_cavity, "_calibration_cache", None)
+
+        self.setup_cavity.setup()
+
+        self.setup_cavity.ssa.calibrate.assert_not_called()
+        self.setup_cavity.characterize.assert_not_called()
+        self.setup_cavity._calibration_cache.store.assert_not_called()
+        self.mock_status_msg_pv_obj.put.assert_any_call(
+            f"{self.setup_cavity} SSA Calibration still valid"
+        )
+
+    def test_setup_calibration_after_quench(self):
+        self.setup_cavity._hw_mode_pv_obj = InMemoryPV(
+            self.setup_cavity.hw_mode_pv, HW_MODE_ONLINE_VALUE
+        )
+        quench_latch = InMemoryPV(self.setup_cavity.pv_addr("QUENCH_LTCH"), 0)
+        self.setup_cavity._quench_latch_pv_obj = quench_latch
+        self.addCleanup(setattr, self.setup_cavity, "_quench_latch_pv_obj", None)
+        self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
+        self.mock_cav_char_pv_obj.get = mock.MagicMock(return_value=True)
+        self.setup_cavity._calc_probe_q_pv_obj = mock_pv_obj(
+            self.setup_cavity.calc_probe_q_pv
+        )
+        self.setup_cavity.characterize = mock.MagicMock()
+        self.setup_cavity.calibration_results = mock.MagicMock(
+            return_value={"loaded_q": 4e7, "scale_factor": 50.0}
+        )
+        self.addCleanup(delattr, self.setup_cavity, "calibration_results")
+        self.setup_cavity.reset_interlocks = mock.MagicMock(
+            side_effect=lambda: quench_latch.put(0)
+        )
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache = CalibrationCache.for_cavity(self.setup_cavity, cache_dir.name)
+        self.setup_cavity._calibration_cache = cache
+        self.addCleanup(setattr, self.setup_cavity, "_calibration_cache", None)
+
+        self.setup_cavity.setup()
+        self.setup_cavity.setup()
+        self.assertEqual(self.setup_cavity.characterize.call_count, 1)
+        self.assertEqual(cache.hits["characterize"], 1)
+
+        # Quenches between setups; the next setup resets the latch before it
+        # looks the characterization up
+        quench_latch.put(1)
+        self.setup_cavity.setup()
+        self.assertEqual(self.setup_cavity.characterize.call_count, 2)
+        self.assertEqual(cache.misses["characterize"], 2)
+        self.assertEqual(quench_latch.get(), 0)
+
     def test_setup_tune(self):
         self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
         self.mock_ssa_cal_pv_obj.get = mock.MagicMock(return_value=False)
@@ -294,6 +441,24 @@ class TestSetupCavity(TestCase):
         )
         self.setup_cavity.move_to_resonance.assert_called_with(use_sela=False)
 
+    def test_setup_resume(self):
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
+        self.mock_tune_pv_obj.get = mock.MagicMock(return_value=True)
+
+        self.setup_cavity.setup()
+        self.assertIn("tune", self.setup_cavity.checkpoint.stages)
+
+        self.setup_cavity.resume = True
+        self.setup_cavity.setup()
+        self.setup_cavity.move_to_resonance.assert_called_once_with(use_sela=False)
+        self.mock_status_msg_pv_obj.put.assert_any_call(
+            f"Skipping {self.setup_cavity} tune, still valid"
+        )
+
+        self.setup_cavity.resume = False
+        self.setup_cavity.setup()
+        self.assertEqual(self.setup_cavity.move_to_resonance.call_count, 2)
+
     def test_setup_cav_char(self):
         self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
         self.mock_ssa_cal_pv_obj.get = mock.MagicMock(return_value=False)
@@ -346,6 +511,111 @@ class TestSetupCavity(TestCase):
         self.setup_cavity.move_to_resonance.assert_called_with(use_sela=True)
         self.setup_cavity.set_selap_mode.assert_called()
 
+    def test_ramp_finish_with_engine(self):
+        ramp_engine = mock.MagicMock()
+        self.setup_cavity.ramp_engine = ramp_engine
+        self.addCleanup(setattr, self.setup_cavity, "ramp_engine", None)
+        self.setup_cavity.walk_amp = mock.MagicMock()
+        self.setup_cavity.set_selap_mode = mock.MagicMock()
+
+        self.setup_cavity.ramp_finish_stage()
+
+        ramp_engine.walk_amp.assert_called_with(self.setup_cavity, 16.6)
+        self.setup_cavity.walk_amp.assert_not_called()
+
+    def test_async_setup_all_false(self):
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
+
+        asyncio.run(self.setup_cavity.async_setup())
+
+        self.setup_cavity.turn_off.assert_called()
+        self.setup_cavity.ssa.turn_on.assert_called()
+        self.setup_cavity.reset_interlocks.assert_called()
+        self.mock_progress_pv_obj.put.assert_called_with(100)
+        self.mock_status_pv_obj.put.assert_called_with(STATUS_READY_VALUE)
+
+    def test_setup_timing(self):
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
+        mock_total_pv_obj = mock_pv_obj(self.setup_cavity.timing_pvs["total"])
+        mock_ssa_on_pv_obj = mock_pv_obj(self.setup_cavity.timing_pvs["ssa_on"])
+        self.setup_cavity._timing_pv_objs = {
+            "total": mock_total_pv_obj,
+            "ssa_on": mock_ssa_on_pv_obj,
+        }
+
+        self.setup_cavity.setup()
+
+        self.assertEqual(
+            list(self.setup_cavity.stage_timer.stage_durations.keys()),
+            [
+                "turn_off",
+                "ssa_on",
+                "reset_interlocks",
+                "ssa_cal",
+                "tune",
+                "characterize",
+            ],
+        )
+        self.assertIsNone(self.setup_cavity.stage_timer.error)
+        mock_total_pv_obj.put.assert_called_once_with(
+            self.setup_cavity.stage_timer.duration
+        )
+        mock_ssa_on_pv_obj.put.assert_called_once()
+
+    def test_setup_error(self):
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(return_value=HW_MODE_ONLINE_VALUE)
+        self.setup_cavity.ssa.turn_on = mock.MagicMock(
+            side_effect=CavityAbortError("test abort")
+        )
+
+        self.setup_cavity.setup()
+
+        self.mock_status_pv_obj.put.assert_called_with(STATUS_ERROR_VALUE)
+        self.mock_status_msg_pv_obj.put.assert_called_with("test abort")
+
+    def test_wait_for_sela(self):
+        callbacks = []
+        rf_mode_pv_obj = mock_pv_obj("RF_MODE", get_val=RF_MODE_SELAP)
+        rf_mode_pv_obj.add_callback = mock.MagicMock(
+            side_effect=lambda callback: callbacks.append(callback) or 1
+        )
+        self.setup_cavity._rf_mode_pv_obj = rf_mode_pv_obj
+        self.mock_abort_pv_obj.get = mock.MagicMock(return_value=False)
+
+        async def switch_to_sela():
+            await asyncio.sleep(0.05)
+            rf_mode_pv_obj.get.return_value = RF_MODE_SELA
+            callbacks[0](value=RF_MODE_SELA)
+
+        async def run():
+            await asyncio.gather(self.setup_cavity.wait_for_sela(), switch_to_sela())
+
+        asyncio.run(asyncio.wait_for(run(), timeout=2))
+        rf_mode_pv_obj.remove_callback.assert_called_with(1)
+
+    def test_sela_wait_stage(self):
+        callbacks = []
+        rf_mode_pv_obj = mock_pv_obj("RF_MODE", get_val=RF_MODE_SELAP)
+        rf_mode_pv_obj.add_callback = mock.MagicMock(
+            side_effect=lambda callback: callbacks.append(callback) or 1
+        )
+        self.setup_cavity._rf_mode_pv_obj = rf_mode_pv_obj
+        self.mock_abort_pv_obj.get = mock.MagicMock(return_value=False)
+
+        def switch_to_sela():
+            rf_mode_pv_obj.get.return_value = RF_MODE_SELA
+            callbacks[0](value=RF_MODE_SELA)
+
+        timer = threading.Timer(0.05, switch_to_sela)
+        timer.start()
+        self.setup_cavity.sela_wait_stage(timeout=2)
+        timer.join()
+
+        self.mock_status_msg_pv_obj.put.assert_called_with(
+            "Waiting for cavity to be in SELA"
+        )
+        rf_mode_pv_obj.remove_callback.assert_called_with(1)
+
     def test_setup_not_online(self):
         self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
         self.mock_hw_mode_pv_obj.get = mock.MagicMock(
@@ -357,6 +627,43 @@ class TestSetupCavity(TestCase):
         )
         self.mock_status_pv_obj.put.assert_called_with(STATUS_ERROR_VALUE)
 
+    def test_setup_start_check_fails(self):
+        self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(
+            side_effect=PVInvalidError("HW mode not connected")
+        )
+        self.setup_cavity.setup()
+
+        self.mock_status_pv_obj.put.assert_called_with(STATUS_ERROR_VALUE)
+        self.mock_status_msg_pv_obj.put.assert_called_with("HW mode not connected")
+        self.assertFalse(self.setup_cavity._publish_status)
+
+    def test_setup_unexpected_error(self):
+        self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(
+            return_value=HW_MODE_ONLINE_VALUE
+        )
+        self.setup_cavity.turn_off.side_effect = RuntimeError("bug")
+
+        with self.assertRaises(RuntimeError):
+            self.setup_cavity.setup()
+        self.assertFalse(self.setup_cavity._publish_status)
+        self.mock_progress_pv_obj.put.assert_called_with(0)
+
+    def test_setup_in_running_loop(self):
+        self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_READY_VALUE)
+        self.mock_hw_mode_pv_obj.get = mock.MagicMock(
+            return_value=HW_MODE_MAINTENANCE_VALUE
+        )
+
+        async def from_coroutine():
+            self.setup_cavity.setup()
+
+        asyncio.run(from_coroutine())
+        self.mock_status_msg_pv_obj.put.assert_called_with(
+            f"{self.setup_cavity} not online, not setting up"
+        )
+
     def test_setup_running(self):
         self.mock_status_pv_obj.get = mock.MagicMock(return_value=STATUS_RUNNING_VALUE)
         self.setup_cavity.setup()
@@ -369,6 +676,89 @@ class TestSetupCryomodule(TestCase):
     def setUp(self):
         self.setup_cm: SetupCryomodule = SETUP_MACHINE.cryomodules["02"]
 
+    @staticmethod
+    def mock_setup_option_pvs(auto_linac_object, get_vals=(None,) * 4):
+        for attr, get_val in zip(
+            [
+                "ssa_cal_requested",
+                "auto_tune_requested",
+                "cav_char_requested",
+                "rf_ramp_requested",
+            ],
+            get_vals,
+        ):
+            setattr(
+                auto_linac_object,
+                f"_{attr}_pv_obj",
+                mock_pv_obj(getattr(auto_linac_object, f"{attr}_pv"), get_val),
+            )
+        auto_linac_object._start_pv_obj = mock_pv_obj(auto_linac_object.start_pv)
+        auto_linac_object._shutoff_pv_obj = mock_pv_obj(auto_linac_object.shutoff_pv)
+
+    @mock.patch("setup_linac.PV_REGISTRY")
+    def test_propagate_setup_options(self, mock_registry):
+        options = [True, False, True, False]
+        mock_registry.get_many = mock.MagicMock(return_value=options)
+        self.mock_setup_option_pvs(self.setup_cm, options)
+        children = list(self.setup_cm.cavities.values())[:2]
+        for child in children:
+            self.mock_setup_option_pvs(child)
+
+        self.setup_cm.propagate_setup_options(children)
+
+        mock_registry.get_many.assert_called_once_with(
+            self.setup_cm.setup_option_pv_objs
+        )
+        option_puts = mock_registry.put_many.call_args_list[0].args[0]
+        self.assertEqual(len(option_puts), 8)
+        for child in children:
+            for child_pv, option in zip(child.setup_option_pv_objs, options):
+                self.assertEqual(option_puts[child_pv], option)
+
+        mock_registry.put_many.assert_called_with(
+            {child.start_pv_obj: 1 for child in children}, wait=False
+        )
+
+    @mock.patch("setup_linac.PV_REGISTRY")
+    def test_trigger_shutdowns(self, mock_registry):
+        children = list(self.setup_cm.cavities.values())[:2]
+        for child in children:
+            self.mock_setup_option_pvs(child)
+
+        self.setup_cm.trigger_shutdowns(children)
+        mock_registry.put_many.assert_called_once_with(
+            {child.shutoff_pv_obj: 1 for child in children}, wait=False
+        )
+
+    def test_capture_acon(self):
+        registry = PVRegistry(connection_timeout=0.1, backend=InMemoryBackend())
+        with mock.patch("setup_linac.PV_REGISTRY", registry):
+            cryomodule = SetupMachine().cryomodules["02"]
+            for cavity in cryomodule.cavities.values():
+                cavity._ades_pv_obj = registry.get_pv(cavity.ades_pv)
+                cavity._acon_pv_obj = registry.get_pv(cavity.acon_pv)
+                cavity.ades_pv_obj.value = 10.0 + cavity.number
+
+            offline = cryomodule.cavities[5]
+            offline.ades_pv_obj.wait_for_connection = mock.MagicMock(
+                return_value=False
+            )
+            invalid = cryomodule.cavities[6]
+            invalid.ades_pv_obj.get = mock.MagicMock(
+                side_effect=PVInvalidError("get failed")
+            )
+
+            failures = cryomodule.capture_acon()
+
+        self.assertEqual(list(failures), [offline, invalid])
+        self.assertIn(offline.ades_pv, failures[offline])
+        self.assertIn("get failed", failures[invalid])
+        for cavity in cryomodule.cavities.values():
+            if cavity not in (offline, invalid):
+                self.assertEqual(cavity.acon_pv_obj.get(), 10.0 + cavity.number)
+        self.assertEqual(offline.acon_pv_obj.get(), 0)
+        self.assertEqual(invalid.acon_pv_obj.get(), 0)
+
     def test_clear_abort(self):
         for setup_cavity in self.setup_cm.cavities.values():
             setup_cavity.clear_abort = mock.MagicMock()
@@ -396,6 +786,50 @@ class TestSetupLinac(TestCase):
             cm.clear_abort.assert_called()
 
 
+class TestRunCoroutine(TestCase):
+    def test_reuses_loop(self):
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        loop = run_coroutine(current_loop())
+        self.assertIs(run_coroutine(current_loop()), loop)
+        self.assertFalse(loop.is_closed())
+
+    def test_stage_executor(self):
+        cavity = SETUP_MACHINE.cryomodules["01"].cavities[1]
+
+        async def thread_name():
+            return await cavity._in_executor(lambda: threading.current_thread().name)
+
+        self.assertTrue(run_coroutine(thread_name()).startswith("stage"))
+
+
+class TestLazyDict(TestCase):
+    def test_builds_on_first_lookup(self):
+        builder = mock.MagicMock(return_value="built")
+        lazy_dict = LazyDict({"key": builder})
+
+        self.assertFalse(lazy_dict.is_built("key"))
+        builder.assert_not_called()
+
+        self.assertEqual(lazy_dict["key"], "built")
+        self.assertEqual(lazy_dict["key"], "built")
+        builder.assert_called_once()
+        self.assertTrue(lazy_dict.is_built("key"))
+
+    def test_keys_do_not_build(self):
+        builder = mock.MagicMock()
+        lazy_dict = LazyDict({"a": builder, "b": builder})
+
+        self.assertEqual(list(lazy_dict.keys()), ["a", "b"])
+        self.assertIn("a", lazy_dict)
+        self.assertEqual(len(lazy_dict), 2)
+        builder.assert_not_called()
+
+    def test_missing_key(self):
+        self.assertRaises(KeyError, LazyDict({}).__getitem__, "missing")
+
+
 class TestSetupMachine(TestCase):
     def setUp(self):
         self.setup_machine: SetupMachine = SETUP_MACHINE
@@ -403,6 +837,20 @@ class TestSetupMachine(TestCase):
     def test_pv_prefix(self):
         self.assertEqual(self.setup_machine.pv_prefix, "ACCL:SYS0:SC:")
 
+    def test_lazy_cryomodules(self):
+        machine = SetupMachine()
+        self.assertFalse(machine.cryomodules.is_built("03"))
+
+        cryomodule = machine.cryomodules["03"]
+        self.assertIsInstance(cryomodule, SetupCryomodule)
+        self.assertIs(cryomodule, machine.linacs[1].cryomodules["03"])
+        self.assertIsInstance(cryomodule.cavities[1], SetupCavity)
+        self.assertFalse(machine.cryomodules.is_built("04"))
+
+    def test_eager_cryomodules(self):
+        machine = SetupMachine(lazy=False)
+        self.assertIsInstance(machine.cryomodules["03"], SetupCryomodule)
+
     def test_clear_abort(self):
         for cm in self.setup_machine.cryomodules.values():
             cm.clear_abort = mock.MagicMock()
@@ -411,3 +859,55 @@ class TestSetupMachine(TestCase):
 
         for cm in self.setup_machine.cryomodules.values():
             cm.clear_abort.assert_called()
+
+    def test_snapshot(self):
+        registry = PVRegistry(connection_timeout=0.1, backend=InMemoryBackend())
+        with mock.patch("setup_linac.PV_REGISTRY", registry), mock.patch(
+            "auto_pv.PV_REGISTRY", registry
+        ):
+            machine = SetupMachine()
+            running = machine.cryomodules["02"].cavities[3]
+            running.status_pv_obj.value = STATUS_RUNNING_VALUE
+            # MSG is a char waveform, a plain get returns the char codes
+            running.status_msg_pv_obj.get = mock.MagicMock(
+                side_effect=lambda as_string=False, **kwargs: (
+                    "Tuning" if as_string else np.frombuffer(b"Tuning", np.uint8)
+                )
+            )
+            running.ssa_cal_requested_pv_obj.value = 1
+            offline = machine.cryomodules["02"].cavities[4]
+            offline.progress_pv_obj.wait_for_connection = mock.MagicMock(
+                return_value=False
+            )
+            invalid = machine.cryomodules["02"].cavities[5]
+            invalid.progress_pv_obj.value = 40
+            invalid.status_pv_obj.get = mock.MagicMock(
+                side_effect=PVInvalidError("get failed")
+            )
+
+            snapshot = machine.snapshot(linac=1)
+            self.assertEqual(
+                len(snapshot),
+                sum(len(cm.cavities) for cm in machine.linacs[1].cryomodules.values()),
+            )
+            self.assertNotIn("15", snapshot["cryomodule"])
+
+            cm02 = snapshot[snapshot["cryomodule"] == "02"]
+            row = cm02[cm02["cavity"] == 3]
+            self.assertEqual(row["status_message"][0], "Tuning")
+            self.assertTrue(row["ssa_cal_requested"][0])
+            self.assertFalse(row["auto_tune_requested"][0])
+
+            row = cm02[cm02["cavity"] == 4]
+            self.assertFalse(row["connected"][0])
+            self.assertTrue(np.isnan(row["progress"][0]))
+            self.assertEqual(row["status"][0], 0)
+
+            row = cm02[cm02["cavity"] == 5]
+            self.assertFalse(row["connected"][0])
+            self.assertTrue(np.isnan(row["status"][0]))
+            self.assertEqual(row["progress"][0], 40)
+
+            running_only = machine.snapshot(status=STATUS_RUNNING_VALUE)
+            self.assertEqual(list(running_only["cryomodule"]), ["02"])
+            self.assertEqual(list(running_only["cavity"]), [3])
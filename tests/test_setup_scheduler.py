@@ -0,0 +1,260 @@
+import json
+import os
+import tempfile
+from collections import defaultdict
+from functools import partial
+from threading import Lock
+from time import sleep
+from unittest import TestCase, mock
+
+from lcls_tools.superconducting.sc_linac_utils import DetuneError
+
+from setup_linac import STATUS_READY_VALUE, SetupCavity
+from setup_scheduler import (
+    DEFAULT_DURATIONS,
+    MaxPerCryomodule,
+    RunAfter,
+    SetupScheduler,
+    TASK_REQUESTS,
+    durations_from_log,
+)
+
+ALL_REQUESTED = defaultdict(dict)
+
+
+class StageRecorder:
+    def __init__(self):
+        self.lock = Lock()
+        self.events = []
+        self.ramping = defaultdict(int)
+        self.max_ramping = defaultdict(int)
+
+    def make_cavity(self, cm_name: str, cav_num: int) -> mock.MagicMock:
+        cavity = mock.MagicMock(number=cav_num, status=STATUS_READY_VALUE)
+        cavity.cryomodule.name = cm_name
+        cavity.__str__.return_value = f"CM{cm_name} Cavity {cav_num}"
+        cavity.status_msg_pv_obj.get = mock.MagicMock(return_value="done")
+        cavity.checkpointed_stage = lambda name, stage: stage
+        # The per-stage setup API the scheduler drives, around the mocks
+        for method in (
+            "begin_setup",
+            "run_setup_stage",
+            "complete_setup",
+            "fail_setup",
+            "end_setup",
+        ):
+            setattr(cavity, method, partial(getattr(SetupCavity, method), cavity))
+
+        for stage in (
+            "turn_off",
+            "ssa_on",
+            "reset_interlocks",
+            "ssa_cal",
+            "tune",
+            "characterize",
+            "sela_wait",
+            "ramp_finish",
+        ):
+            setattr(cavity, f"{stage}_stage", self.recording(cavity, stage))
+
+        def ramp_start():
+            with self.lock:
+                self.ramping[cm_name] += 1
+                self.max_ramping[cm_name] = max(
+                    self.max_ramping[cm_name], self.ramping[cm_name]
+                )
+            sleep(0.01)
+            with self.lock:
+                self.ramping[cm_name] -= 1
+            self.record(cavity, "ramp_start")
+
+        cavity.ramp_start_stage = mock.MagicMock(side_effect=ramp_start)
+        cavity._finish_setup = self.recording(cavity, "finish")
+        return cavity
+
+    def record(self, cavity, stage: str):
+        with self.lock:
+            self.events.append((cavity.cryomodule.name, cavity.number, stage))
+
+    def recording(self, cavity, stage: str) -> mock.MagicMock:
+        return mock.MagicMock(side_effect=lambda: self.record(cavity, stage))
+
+    def index(self, cm_name: str, cav_num: int, stage: str) -> int:
+        return self.events.index((cm_name, cav_num, stage))
+
+
+class TestSetupScheduler(TestCase):
+    def setUp(self):
+        self.recorder = StageRecorder()
+        self.cavities = [
+            self.recorder.make_cavity(cm_name, cav_num)
+            for cm_name in ["01", "02"]
+            for cav_num in range(1, 9)
+        ]
+
+    def test_plan(self):
+        cavity_time = sum(DEFAULT_DURATIONS.values())
+
+        scheduler = SetupScheduler(self.cavities, max_workers=16)
+        scheduler.build(ALL_REQUESTED)
+        self.assertEqual(len(scheduler.tasks), 16 * len(DEFAULT_DURATIONS))
+        self.assertEqual(scheduler.predicted_duration, cavity_time)
+
+        scheduler = SetupScheduler(self.cavities[:2], max_workers=1)
+        scheduler.build(ALL_REQUESTED)
+        self.assertEqual(scheduler.predicted_duration, 2 * cavity_time)
+
+    def test_plan_requests(self):
+        scheduler = SetupScheduler(self.cavities[:1])
+        scheduler.build(
+            {self.cavities[0]: {flag: False for flag in TASK_REQUESTS.values()}}
+        )
+        self.assertEqual(
+            scheduler.predicted_duration,
+            sum(DEFAULT_DURATIONS[kind] for kind in ("start", "prepare", "finish")),
+        )
+
+    def test_plan_constraints(self):
+        scheduler = SetupScheduler(
+            self.cavities,
+            constraints=[
+                MaxPerCryomodule(limit=1),
+                RunAfter(before=("01",), after=("02",)),
+            ],
+            max_workers=16,
+        )
+        scheduler.build(ALL_REQUESTED)
+        planned = scheduler.plan()
+
+        ramps = sorted(
+            (p.start, p.end)
+            for p in planned
+            if p.task.kind == "ramp" and p.task.cm_name == "01"
+        )
+        for (_, end), (start, _) in zip(ramps, ramps[1:]):
+            self.assertLessEqual(end, start)
+
+        cm1_end = max(p.end for p in planned if p.task.cm_name == "01")
+        cm2_start = min(p.start for p in planned if p.task.cm_name == "02")
+        self.assertLessEqual(cm1_end, cm2_start)
+
+    def test_run(self):
+        report = SetupScheduler(self.cavities, max_workers=8).run()
+
+        self.assertEqual(len(report.results), 16)
+        self.assertEqual(len(report.succeeded), 16)
+        for cavity in self.cavities:
+            self.assertLess(
+                self.recorder.index(cavity.cryomodule.name, cavity.number, "tune"),
+                self.recorder.index(cavity.cryomodule.name, cavity.number, "finish"),
+            )
+            cavity._report_timing.assert_called_once()
+            self.assertIsNone(cavity.stage_timer.error)
+            self.assertIn("sela_wait", cavity.stage_timer.stage_durations)
+
+    def test_max_ramping_per_cm(self):
+        SetupScheduler(
+            self.cavities, constraints=[MaxPerCryomodule(limit=2)], max_workers=16
+        ).run()
+        self.assertEqual(self.recorder.max_ramping["01"], 2)
+        self.assertEqual(self.recorder.max_ramping["02"], 2)
+
+    def test_run_after(self):
+        SetupScheduler(
+            self.cavities,
+            constraints=[RunAfter(before=("01",), after=("02",))],
+            max_workers=16,
+        ).run()
+        last_cm1 = max(
+            self.recorder.index("01", num, "finish") for num in range(1, 9)
+        )
+        first_cm2 = min(
+            self.recorder.index("02", num, "turn_off") for num in range(1, 9)
+        )
+        self.assertLess(last_cm1, first_cm2)
+
+    def test_failure_skips_cavity(self):
+        failing = self.cavities[0]
+        failing.tune_stage.side_effect = DetuneError("Detuned")
+        failing.status = 2
+
+        report = SetupScheduler(self.cavities, max_workers=4).run()
+
+        self.assertEqual(len(report.failed), 1)
+        self.assertIsInstance(report.failed[0].error, DetuneError)
+        failing._fail.assert_called_once()
+        failing.characterize_stage.assert_not_called()
+        failing._finish_setup.assert_not_called()
+        self.assertEqual(failing.stage_timer.error, "Detuned")
+        self.assertEqual(len(report.succeeded), 15)
+
+    def test_unexpected_error_skips_cavity(self):
+        failing = self.cavities[0]
+        failing.sela_wait_stage.side_effect = RuntimeError("Lost the RF mode PV")
+        failing.status = 2
+
+        report = SetupScheduler(self.cavities, max_workers=4).run()
+
+        self.assertEqual(len(report.results), 16)
+        self.assertEqual(len(report.failed), 1)
+        self.assertIsInstance(report.failed[0].error, RuntimeError)
+        failing._fail.assert_called_once()
+        failing.ramp_finish_stage.assert_not_called()
+        failing._report_timing.assert_called_once()
+        self.assertFalse(failing._publish_status)
+        self.assertEqual(len(report.succeeded), 15)
+
+    def test_unreadable_result(self):
+        failing = self.cavities[0]
+        failing.tune_stage.side_effect = DetuneError("Detuned")
+        failing.status_msg_pv_obj.get.side_effect = RuntimeError("Disconnected")
+
+        report = SetupScheduler(self.cavities, max_workers=4).run()
+
+        self.assertEqual(len(report.results), 16)
+        self.assertIsInstance(report.failed[0].error, RuntimeError)
+        self.assertEqual(len(report.succeeded), 15)
+
+    def test_not_started(self):
+        cavity = self.cavities[0]
+        cavity._start_setup.return_value = False
+
+        report = SetupScheduler([cavity]).run()
+
+        self.assertEqual(len(report.results), 1)
+        cavity.turn_off_stage.assert_not_called()
+        cavity._report_timing.assert_not_called()
+
+    def test_cycle(self):
+        scheduler = SetupScheduler(
+            self.cavities,
+            constraints=[
+                RunAfter(before=("01",), after=("02",)),
+                RunAfter(before=("02",), after=("01",)),
+            ],
+        )
+        self.assertRaises(ValueError, scheduler.build, ALL_REQUESTED)
+
+
+class TestDurationsFromLog(TestCase):
+    def test_medians(self):
+        records = [
+            {
+                "stages": [
+                    {"name": "turn_off", "duration": 1},
+                    {"name": "ssa_on", "duration": 10},
+                    {"name": "reset_interlocks", "duration": duration},
+                    {"name": "tune", "duration": duration * 10},
+                ]
+            }
+            for duration in (1, 2, 9)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timing.jsonl")
+            with open(path, "w") as log:
+                log.writelines(json.dumps(record) + "\n" for record in records)
+            durations = durations_from_log(path)
+
+        self.assertEqual(durations["prepare"], 13)
+        self.assertEqual(durations["tune"], 20)
+        self.assertEqual(durations["ssa_cal"], DEFAULT_DURATIONS["ssa_cal"])
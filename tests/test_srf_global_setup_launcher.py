@@ -0,0 +1,43 @@
+from unittest import TestCase, mock
+
+from lcls_tools.superconducting.sc_linac_utils import (
+    ALL_CRYOMODULES,
+    ALL_CRYOMODULES_NO_HL,
+)
+
+import srf_global_setup_launcher
+from setup_linac import SETUP_MACHINE
+
+
+class TestGlobalSetupLauncher(TestCase):
+    def setUp(self):
+        self.machine = mock.MagicMock()
+        self.machine.cryomodules = {cm_name: cm_name for cm_name in ALL_CRYOMODULES}
+
+    def test_setup_machine(self):
+        srf_global_setup_launcher.setup_machine(machine=self.machine)
+        self.machine.propagate_setup_options.assert_called_once_with(
+            list(ALL_CRYOMODULES)
+        )
+        self.machine.trigger_shutdowns.assert_not_called()
+
+    def test_setup_machine_no_hl(self):
+        srf_global_setup_launcher.setup_machine(no_hl=True, machine=self.machine)
+        self.machine.propagate_setup_options.assert_called_once_with(
+            list(ALL_CRYOMODULES_NO_HL)
+        )
+
+    def test_shutdown(self):
+        srf_global_setup_launcher.setup_machine(shutdown=True, machine=self.machine)
+        self.machine.trigger_shutdowns.assert_called_once_with(list(ALL_CRYOMODULES))
+        self.machine.propagate_setup_options.assert_not_called()
+
+    @mock.patch("srf_global_setup_launcher.setup_machine")
+    def test_main(self, mock_setup_machine):
+        srf_global_setup_launcher.main(["--no_hl"])
+        mock_setup_machine.assert_called_once_with(no_hl=True, shutdown=False)
+
+    def test_default_machine_shared(self):
+        self.assertIs(
+            srf_global_setup_launcher.setup_machine.__defaults__[-1], SETUP_MACHINE
+        )
@@ -0,0 +1,111 @@
+import os
+import tempfile
+from threading import Event
+from unittest import TestCase, mock
+
+from lcls_tools.superconducting.sc_linac_utils import DetuneError
+
+from daemon_lock import DaemonLock, DaemonLockError, daemon_running
+from setup_linac import STATUS_READY_VALUE
+from srf_setup_daemon import SetupDaemon
+
+
+def make_cavity(cm_name: str, cav_num: int, release: Event) -> mock.MagicMock:
+    cavity = mock.MagicMock(number=cav_num, status=STATUS_READY_VALUE)
+    cavity.cryomodule.name = cm_name
+    cavity.setup = mock.MagicMock(side_effect=lambda: release.wait(timeout=5))
+    cavity.status_msg_pv_obj.get = mock.MagicMock(return_value="done")
+    return cavity
+
+
+class TestSetupDaemon(TestCase):
+    def setUp(self):
+        self.release = Event()
+        self.daemon = SetupDaemon(cm_names=[], max_workers=8, max_per_cryomodule=2)
+        self.cavities = [
+            make_cavity("01", cav_num, self.release) for cav_num in range(1, 5)
+        ]
+
+    def tearDown(self):
+        self.release.set()
+        self.daemon.stop()
+
+    def test_submit_runs_setup(self):
+        self.release.set()
+        self.assertTrue(self.daemon.submit(self.cavities[0]))
+        self.assertTrue(self.daemon.wait_idle(timeout=5))
+
+        self.cavities[0].setup.assert_called_once()
+        self.assertEqual(self.daemon.stats.completed, 1)
+        self.assertEqual(self.daemon.in_flight, [])
+
+    def test_shutdown(self):
+        self.release.set()
+        self.daemon.submit(self.cavities[0], shutdown=True)
+        self.assertTrue(self.daemon.wait_idle(timeout=5))
+
+        self.cavities[0].shut_down.assert_called_once()
+        self.cavities[0].setup.assert_not_called()
+
+    def test_duplicate_rejected(self):
+        self.assertTrue(self.daemon.submit(self.cavities[0]))
+        self.assertFalse(self.daemon.submit(self.cavities[0]))
+        self.assertEqual(self.daemon.stats.rejected, 1)
+        self.assertEqual(self.daemon.in_flight, [("01", 1)])
+
+    def test_max_per_cryomodule(self):
+        for cavity in self.cavities:
+            self.daemon.submit(cavity)
+
+        self.assertEqual(self.daemon.stats.queued, 2)
+        self.assertEqual(len(self.daemon.in_flight), 4)
+
+        self.release.set()
+        self.assertTrue(self.daemon.wait_idle(timeout=5))
+        for cavity in self.cavities:
+            cavity.setup.assert_called_once()
+        self.assertEqual(self.daemon.stats.completed, 4)
+
+    def test_failure_counted(self):
+        self.cavities[0].setup = mock.MagicMock(side_effect=DetuneError("detuned"))
+        self.daemon.submit(self.cavities[0])
+        self.assertTrue(self.daemon.wait_idle(timeout=5))
+
+        self.assertEqual(self.daemon.stats.failed, 1)
+        self.assertEqual(self.daemon.in_flight, [])
+
+    def test_request_callback(self):
+        self.release.set()
+        callback = self.daemon._make_callback(self.cavities[0], shutdown=False)
+
+        callback(pvname="ACCL:L0B:0110:AUTO:SETUPSTRT", value=0)
+        self.assertEqual(self.daemon.stats.admitted, 0)
+
+        callback(pvname="ACCL:L0B:0110:AUTO:SETUPSTRT", value=1)
+        self.assertEqual(self.daemon.stats.admitted, 1)
+
+    @mock.patch("srf_setup_daemon.PV_REGISTRY")
+    def test_start(self, mock_registry):
+        machine = mock.MagicMock()
+        machine.cryomodules = {
+            "01": mock.MagicMock(cavities=dict(enumerate(self.cavities, start=1)))
+        }
+        lock_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(lock_dir.cleanup)
+        lock_path = os.path.join(lock_dir.name, "daemon.lock")
+        daemon = SetupDaemon(
+            cm_names=["01"], machine=machine, lock=DaemonLock(lock_path)
+        )
+        daemon.start()
+
+        mock_registry.get_many.assert_called_once()
+        for cavity in self.cavities:
+            cavity.start_pv_obj.add_callback.assert_called_once()
+            cavity.shutoff_pv_obj.add_callback.assert_called_once()
+        self.assertTrue(daemon_running(lock_path))
+        with self.assertRaises(DaemonLockError):
+            SetupDaemon(cm_names=[], lock=DaemonLock(lock_path)).start()
+
+        daemon.stop()
+        self.cavities[0].start_pv_obj.remove_callback.assert_called_once()
+        self.assertFalse(daemon_running(lock_path))
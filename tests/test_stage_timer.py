@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+from threading import Thread
+from unittest import TestCase, mock
+
+from stage_timer import TIMING_LOG_ENV, StageTimer, record_round_trip
+
+
+class TestStageTimer(TestCase):
+    def setUp(self):
+        self.timer = StageTimer("CM01 Cavity 1")
+
+    def test_stage(self):
+        with self.timer.stage("ssa_on"):
+            pass
+        self.timer.finish()
+
+        self.assertEqual(list(self.timer.stage_durations.keys()), ["ssa_on"])
+        self.assertGreaterEqual(self.timer.duration, self.timer.stages[0].duration)
+
+    def test_stage_error(self):
+        with self.assertRaises(ValueError):
+            with self.timer.stage("tune"):
+                raise ValueError("detuned")
+
+        self.assertEqual(self.timer.stages[0].error, "detuned")
+        self.assertIsNotNone(self.timer.stages[0].duration)
+
+    def test_round_trips(self):
+        def stage():
+            record_round_trip("TEST:PV", "get", 0.01)
+            record_round_trip("TEST:PV", "get", 0.03)
+            record_round_trip("TEST:PV", "put", 0.02)
+
+        self.timer.timed("ssa_cal", stage)()
+
+        record = self.timer.stages[0]
+        self.assertEqual(record.pv_round_trips, 3)
+        self.assertAlmostEqual(record.pv_time, 0.06)
+        self.assertEqual(self.timer.round_trips["TEST:PV"]["get"].count, 2)
+        self.assertAlmostEqual(self.timer.round_trips["TEST:PV"]["get"].max, 0.03)
+
+    def test_round_trips_other_thread_ignored(self):
+        with self.timer.stage("ssa_cal"):
+            thread = Thread(target=record_round_trip, args=("TEST:PV", "get", 0.01))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(self.timer.stages[0].pv_round_trips, 0)
+
+    def test_no_stage(self):
+        record_round_trip("TEST:PV", "get", 0.01)
+        self.assertEqual(self.timer.round_trips, {})
+
+    def test_write_log(self):
+        with self.timer.stage("ssa_on"):
+            record_round_trip("TEST:PV", "put", 0.01)
+        self.timer.finish(error=ValueError("failed"))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timing.jsonl")
+            with mock.patch.dict(os.environ, {TIMING_LOG_ENV: path}):
+                self.timer.write_log()
+                self.timer.write_log()
+
+            with open(path) as log:
+                records = [json.loads(line) for line in log]
+
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["name"], "CM01 Cavity 1")
+        self.assertEqual(records[0]["error"], "failed")
+        self.assertEqual(records[0]["stages"][0]["name"], "ssa_on")
+        self.assertEqual(records[0]["round_trips"]["TEST:PV"]["put"]["count"], 1)
+
+    def test_write_log_disabled(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            with mock.patch("builtins.open") as mock_open:
+                self.timer.write_log()
+        mock_open.assert_not_called()
@@ -0,0 +1,50 @@
+from threading import Event
+from unittest import TestCase, mock
+
+from status_publisher import StatusPublisher
+
+
+def mock_pv_obj(pvname) -> mock.MagicMock:
+    return mock.MagicMock(pvname=pvname)
+
+
+class TestStatusPublisher(TestCase):
+    def setUp(self):
+        self.publisher = StatusPublisher()
+        self.progress_pv = mock_pv_obj("TEST:PROG")
+        self.msg_pv = mock_pv_obj("TEST:MSG")
+
+    def test_publish_and_flush(self):
+        self.publisher.publish(self.progress_pv, 50)
+        self.publisher.publish(self.msg_pv, "halfway")
+
+        self.assertTrue(self.publisher.flush(timeout=1))
+        self.progress_pv.put.assert_called_with(50)
+        self.msg_pv.put.assert_called_with("halfway")
+        self.assertEqual(self.publisher.pending, 0)
+
+    def test_coalesce(self):
+        release = Event()
+        blocking_pv = mock_pv_obj("TEST:BLOCK")
+        blocking_pv.put = mock.MagicMock(side_effect=lambda value: release.wait(1))
+
+        # Holds the writer thread so the next writes pile up behind it
+        self.publisher.publish(blocking_pv, 1)
+        for progress in range(10):
+            self.publisher.publish(self.progress_pv, progress)
+        release.set()
+
+        self.assertTrue(self.publisher.flush(timeout=1))
+        self.progress_pv.put.assert_called_once_with(9)
+
+    def test_put_error(self):
+        self.progress_pv.put = mock.MagicMock(side_effect=ValueError("bad put"))
+        self.publisher.publish(self.progress_pv, 50)
+        self.publisher.publish(self.msg_pv, "still written")
+
+        self.assertTrue(self.publisher.flush(timeout=1))
+        self.assertEqual(len(self.publisher.errors), 1)
+        self.msg_pv.put.assert_called_with("still written")
+
+    def test_flush_nothing_pending(self):
+        self.assertTrue(self.publisher.flush(timeout=0))
@@ -0,0 +1,58 @@
+from unittest import TestCase, mock
+
+import numpy as np
+
+from setup_linac import STATUS_ERROR_VALUE, STATUS_READY_VALUE, STATUS_RUNNING_VALUE
+from status_table import FIELDS, StatusTable
+
+
+class TestStatusTable(TestCase):
+    def setUp(self):
+        self.table = StatusTable(["01", "02", "H1"])
+
+    def test_shape(self):
+        self.assertEqual(self.table.data.shape, (len(FIELDS), 3, 8))
+        self.assertTrue(np.isnan(self.table["status"]).all())
+
+    def test_update(self):
+        self.table.update("aact", "02", 3, 16.5)
+        self.assertEqual(self.table["aact"][1, 2], 16.5)
+        self.assertEqual(self.table.cavity_values("02", 3)["aact"], 16.5)
+        self.assertEqual(self.table.version, 1)
+
+    def test_status_counts(self):
+        self.table.update("status", "01", 1, STATUS_READY_VALUE)
+        self.table.update("status", "01", 2, STATUS_READY_VALUE)
+        self.table.update("status", "H1", 8, STATUS_ERROR_VALUE)
+        self.assertEqual(
+            self.table.status_counts(), {STATUS_READY_VALUE: 2, STATUS_ERROR_VALUE: 1}
+        )
+
+    def test_total_aact(self):
+        self.table.update("aact", "01", 1, 10)
+        self.table.update("aact", "H1", 4, 5)
+        self.assertEqual(self.table.total_aact(), 15)
+
+    def test_subscribe(self):
+        pvs = {}
+
+        def get_pv(pvname):
+            return pvs.setdefault(pvname, mock.MagicMock(pvname=pvname))
+
+        cavity = mock.MagicMock(number=4)
+        cavity.pv_addr = lambda suffix: f"ACCL:L0B:0140:{suffix}"
+        machine = mock.MagicMock()
+        machine.cryomodules = {"01": mock.MagicMock(cavities={4: cavity})}
+
+        table = StatusTable(["01"])
+        with mock.patch("status_table.PV_REGISTRY") as registry:
+            registry.get_pv = get_pv
+            table.subscribe(machine)
+
+        self.assertEqual(len(pvs), len(FIELDS))
+        callback = pvs["ACCL:L0B:0140:AUTO:STATUS"].add_callback.call_args[0][0]
+        callback(pvname="ACCL:L0B:0140:AUTO:STATUS", value=STATUS_RUNNING_VALUE)
+        self.assertEqual(table["status"][0, 3], STATUS_RUNNING_VALUE)
+
+        callback(pvname="ACCL:L0B:0140:AUTO:STATUS", value=None)
+        self.assertTrue(np.isnan(table["status"][0, 3]))